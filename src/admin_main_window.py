@@ -2,6 +2,7 @@
 from tkinter import ttk
 import customtkinter as ctk
 import db_manager as db
+from tree_sync import TableBinding
 
 # Перевикористаємо ту ж вкладку "Довідники" з HR-вікна
 # (там має бути оголошений клас DirectoriesTab)
@@ -62,6 +63,7 @@ class UsersTab(ctk.CTkFrame):
         self.columns = ("username", "role", "full_name", "department", "position", "is_active", "created_at")
 
         self.tree = ttk.Treeview(table_wrap, columns=self.columns, show="headings", height=20)
+        self.tree_binding = TableBinding(self.tree)
         self.tree.pack(fill="both", expand=True, padx=6, pady=6)
 
         self.tree.configure(yscrollcommand=self.scroll_y.set, xscrollcommand=self.scroll_x.set)
@@ -87,17 +89,13 @@ class UsersTab(ctk.CTkFrame):
         self.refresh()
 
     def refresh(self):
-        q = (self.search_var.get() or "").strip().lower()
+        q = (self.search_var.get() or "").strip()
         role_filter = self.role_var.get()
 
-        users = db.get_users()
+        # пошук (FTS) і фільтр ролі виконує БД
+        users = db.get_users(search=q or None, role=None if role_filter == "Усі" else role_filter)
         rows = []
         for u in users:
-            if role_filter != "Усі" and (u.get("role") or "") != role_filter:
-                continue
-            hay = f"{u.get('username','')} {u.get('role','')} {u.get('full_name','')}".lower()
-            if q and q not in hay:
-                continue
             rows.append({
                 "id": u["id"],
                 "username": u.get("username") or "",
@@ -109,13 +107,10 @@ class UsersTab(ctk.CTkFrame):
                 "created_at": (u.get("created_at") or "")[:19],
             })
 
-        for iid in self.tree.get_children():
-            self.tree.delete(iid)
-        for r in rows:
-            self.tree.insert(
-                "", "end", iid=str(r["id"]),
-                values=(r["username"], r["role"], r["full_name"], r["department"], r["position"], r["is_active"], r["created_at"])
-            )
+        self.tree_binding.sync(
+            (r["id"], (r["username"], r["role"], r["full_name"], r["department"], r["position"], r["is_active"], r["created_at"]))
+            for r in rows
+        )
 
 
 
@@ -0,0 +1,186 @@
+# src/batch_orders.py
+"""
+Пакетне створення наказів (сезонні відпустки, навчання тощо).
+
+Вхід — список записів {employee_id, doc_type, payload[, title]}:
+  1) номери наказів без order_number видаються одним оновленням лічильника,
+     і разом з INSERT у documents / document_payloads (executemany) — в одній транзакції;
+  2) DOCX рендеряться паралельно у пулі процесів (по ядрах CPU);
+  3) для кожного запису повертається результат (doc_id, номер, файл або помилка).
+
+CLI:
+    python batch_orders.py orders.json [--status sent] [--created-by hr]
+                           [--workers N] [--out-dir data/documents] [--no-render] [--db шлях]
+
+orders.json — JSON-масив або JSON Lines з тими ж полями.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import db_manager as db
+from doc_render import TEMPLATES_MAP, director_full_name, render_document
+
+DOCS_DIR = Path("data/documents")
+
+TITLES = {
+    "P1": "Наказ П-1",
+    "P4": "Наказ П-4",
+    "TRAINING": "Направлення на підвищення кваліфікації",
+    "VACATION": "Надання відпустки",
+    "INTERNSHIP_REFERRAL": "Направлення на стажування",
+}
+
+
+# ==================== Рендер у дочірніх процесах ====================
+
+def _init_worker(db_path: str, cwd: str):
+    # шаблони в TEMPLATES_MAP задані відносно кореня проєкту
+    os.chdir(cwd)
+    db.DB_PATH = db_path
+
+
+def _render_one(task):
+    """(index, doc_type, context, out_path) -> (index, path, error)."""
+    index, doc_type, context, out_path = task
+    try:
+        return index, render_document(doc_type, context, out_path), None
+    except Exception as e:
+        return index, None, f"{type(e).__name__}: {e}"
+
+
+# ==================== Основний API ====================
+
+def create_documents_batch(items, status: str = "sent", created_by: str | None = None,
+                           out_dir=DOCS_DIR, workers: int | None = None, render: bool = True) -> dict:
+    """
+    items — [{employee_id, doc_type, payload[, title]}, ...].
+    Повертає {"results": [...], "created": n, "failed": n, "seconds": ..., "docs_per_sec": ...}.
+    Невалідні записи не зупиняють пакет — вони лише отримують помилку в результатах.
+    """
+    started = time.perf_counter()
+    items = list(items)
+    results = [{"index": i, "employee_id": it.get("employee_id"), "doc_type": it.get("doc_type"),
+                "doc_id": None, "order_number": None, "file": None, "error": None}
+               for i, it in enumerate(items)]
+
+    # --- перевірка та підготовка payload ---
+    employees = db.get_employees_min(
+        it["employee_id"] for it in items if str(it.get("employee_id", "")).isdigit()
+    )
+    director = director_full_name()
+    valid = []   # індекси записів, що йдуть у вставку
+    for i, it in enumerate(items):
+        doc_type = it.get("doc_type")
+        emp = employees.get(int(it["employee_id"])) if str(it.get("employee_id", "")).isdigit() else None
+        if doc_type not in TEMPLATES_MAP:
+            results[i]["error"] = f"Невідомий тип документа: {doc_type!r}"
+        elif not emp:
+            results[i]["error"] = "Працівника не знайдено"
+        else:
+            payload = dict(it.get("payload") or {})
+            payload.setdefault("employee", emp)
+            if not payload.get("director_full_name"):
+                payload["director_full_name"] = director
+            it["payload"] = payload
+            valid.append(i)
+
+    # --- номери + documents + document_payloads однією транзакцією ---
+    if valid:
+        with db.transaction():
+            by_type = {}
+            for i in valid:
+                if not str(items[i]["payload"].get("order_number") or "").strip():
+                    by_type.setdefault(items[i]["doc_type"], []).append(i)
+            for doc_type, idxs in by_type.items():
+                for i, number in zip(idxs, db.reserve_order_numbers(doc_type, len(idxs))):
+                    items[i]["payload"]["order_number"] = number
+
+            rows = []
+            for i in valid:
+                it = items[i]
+                emp = it["payload"]["employee"]
+                title = it.get("title") or f"{TITLES[it['doc_type']]}: {emp.get('last_name', '')} {emp.get('first_name', '')}"
+                rows.append((it["doc_type"], int(it["employee_id"]), title, it["payload"]))
+            doc_ids = db.insert_documents_many(rows, status=status, created_by=created_by)
+
+        for i, doc_id in zip(valid, doc_ids):
+            results[i]["doc_id"] = doc_id
+            results[i]["order_number"] = items[i]["payload"]["order_number"]
+
+    # --- паралельний рендер DOCX ---
+    if render and valid:
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        tasks = []
+        for i in valid:
+            r = results[i]
+            out_path = out_dir / f"emp_{int(r['employee_id']):04d}_doc_{r['doc_id']:06d}_draft.docx"
+            tasks.append((i, r["doc_type"], items[i]["payload"], str(out_path)))
+
+        workers = workers or os.cpu_count() or 1
+        chunk = max(1, len(tasks) // (workers * 4))
+        files = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(db.DB_PATH, os.getcwd())) as pool:
+            for i, path, error in pool.map(_render_one, tasks, chunksize=chunk):
+                if error:
+                    results[i]["error"] = f"Документ створено, але DOCX не згенеровано: {error}"
+                else:
+                    results[i]["file"] = path
+                    files.append((results[i]["doc_id"], path))
+        db.set_documents_files(files)
+
+    seconds = time.perf_counter() - started
+    created = sum(1 for r in results if r["doc_id"])
+    return {
+        "results": results,
+        "created": created,
+        "failed": sum(1 for r in results if r["error"]),
+        "seconds": seconds,
+        "docs_per_sec": created / seconds if seconds > 0 else 0.0,
+    }
+
+
+# ==================== CLI ====================
+
+def _load_items(path: str):
+    text = Path(path).read_text(encoding="utf-8").strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Пакетне створення наказів")
+    ap.add_argument("input", help="JSON-масив або JSON Lines з {employee_id, doc_type, payload}")
+    ap.add_argument("--status", default="sent")
+    ap.add_argument("--created-by", default="batch")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--out-dir", default=str(DOCS_DIR))
+    ap.add_argument("--no-render", action="store_true", help="лише записи в БД, без DOCX")
+    ap.add_argument("--db", default=None, help="шлях до БД (за замовчуванням db_manager.DB_PATH)")
+    args = ap.parse_args(argv)
+
+    if args.db:
+        db.DB_PATH = args.db
+
+    report = create_documents_batch(
+        _load_items(args.input), status=args.status, created_by=args.created_by,
+        out_dir=args.out_dir, workers=args.workers, render=not args.no_render,
+    )
+    for r in report["results"]:
+        mark = "!!" if r["error"] else "OK"
+        print(f"{mark} #{r['index']} {r['doc_type']} emp={r['employee_id']} doc={r['doc_id'] or '-'} "
+              f"№ {r['order_number'] or '-'} {r['error'] or r['file'] or ''}")
+    print(f"Створено: {report['created']}, з помилками: {report['failed']}, "
+          f"час: {report['seconds']:.2f} с, {report['docs_per_sec']:.1f} док/с")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+# src/change_bus.py
+"""
+Шина змін: вкладки підписуються на таблиці, які показують, і оновлюються
+лише тоді, коли в цих таблицях щось змінилось — з цього ПК чи з іншого.
+
+Кожні poll_ms головний потік робить PRAGMA data_version на окремому
+підключенні (без читання даних). Лише якщо хтось закомітив зміни, читаємо
+нові записи change_log (їх пишуть тригери) і викликаємо колбеки тих
+підписників, чиї таблиці зачеплено.
+
+    bus = ChangeBus(window)
+    bus.subscribe(("documents",), lambda changes: docs_tab.refresh())
+    bus.start()
+
+Колбек отримує {table_name: {row_id, ...}}; None серед row_id — «невідомо
+які рядки, перечитати все».
+"""
+import db_manager as db
+
+POLL_MS = 2000          # як часто перевіряти data_version
+
+
+class ChangeBus:
+    def __init__(self, widget, poll_ms: int = POLL_MS):
+        self._widget = widget
+        self._poll_ms = poll_ms
+        self._subscribers = []       # [(frozenset(tables), callback), ...]
+        self._conn = None
+        self._data_version = None
+        self._last_id = 0
+        self._after_id = None
+
+    def subscribe(self, tables, callback):
+        """Підписка на зміни в tables; повертає функцію відписки."""
+        entry = (frozenset(tables), callback)
+        self._subscribers.append(entry)
+
+        def unsubscribe():
+            if entry in self._subscribers:
+                self._subscribers.remove(entry)
+        return unsubscribe
+
+    def start(self):
+        if self._conn is not None:
+            return
+        self._conn = db.open_watch_connection()
+        self._data_version = db.get_data_version(self._conn)
+        self._last_id = db.get_change_cursor(self._conn)
+        self._schedule()
+
+    def stop(self):
+        if self._after_id is not None:
+            try:
+                self._widget.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def poll_now(self):
+        """Позачергова перевірка (напр. одразу після власного запису)."""
+        if self._conn is None:
+            return
+        try:
+            version = db.get_data_version(self._conn)
+            if version == self._data_version:
+                return
+            self._data_version = version
+            self._last_id, changes = db.get_changes_since(self._last_id, self._conn)
+        except Exception as e:
+            print("ChangeBus: помилка читання змін:", e)
+            return
+        if changes:
+            self._dispatch(changes)
+
+    # ---------- службове ----------
+    def _schedule(self):
+        self._after_id = self._widget.after(self._poll_ms, self._tick)
+
+    def _tick(self):
+        self._after_id = None
+        self.poll_now()
+        if self._conn is not None:
+            self._schedule()
+
+    def _dispatch(self, changes):
+        for tables, callback in list(self._subscribers):
+            relevant = {t: ids for t, ids in changes.items() if t in tables}
+            if not relevant:
+                continue
+            try:
+                callback(relevant)
+            except Exception as e:
+                print("Помилка у підписнику ChangeBus:", e)
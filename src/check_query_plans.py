@@ -0,0 +1,322 @@
+# src/check_query_plans.py
+"""
+Регресійна перевірка планів запитів (EXPLAIN QUERY PLAN).
+
+Скрипт робить тимчасову копію бази, наповнює її великою кількістю
+синтетичних записів, збирає SQL з модулів застосунку і з викликів
+функцій db_manager, і для кожного запиту перевіряє план: якщо запит
+повністю сканує велику таблицю (SCAN ...) і не внесений у ALLOWED_SCANS,
+перевірка провалюється (код виходу 1).
+
+Запуск:
+    python check_query_plans.py [шлях_до_бази] [--rows N] [-v]
+"""
+import ast
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+import db_manager as db
+
+SRC_DIR = Path(__file__).resolve().parent
+
+# Таблиці, що ростуть разом з даними — повний SCAN по них є регресією
+LARGE_TABLES = {"employees", "users", "documents", "document_payloads", "signatures", "internships",
+                "vacation_periods", "leave_ledger", "leave_balances", "training_events", "document_fields",
+                "payload_blobs"}
+
+# Свідомі повні проходи: місце запиту -> пояснення
+ALLOWED_SCANS = {
+    "probe:get_employees()": "повний список працівників для локального індексу вкладки «Працівники»",
+    "db_manager.get_employee_brief_list": "випадаючий список усіх працівників у формах",
+    "db_manager.get_users": "повний список користувачів для адмін-панелі",
+    "db_manager._m002_order_numbers": "одноразове заповнення order_sequences під час міграції",
+    "db_manager.rebuild_employee_counters": "повний перерахунок лічильників (міграція / відновлення)",
+    "probe:list_documents_page()": "перша сторінка: прохід по idx_documents_created, обмежений LIMIT",
+    "probe:list_documents_page(status)": "прохід по idx_documents_created з фільтром статусу, обмежений LIMIT",
+    "probe:get_employees_page()": "перша сторінка: прохід по idx_employees_name, обмежений LIMIT",
+    "probe:get_employees_page(sort)": "сортування за довільною колонкою — індексу під кожну не тримаємо",
+    "probe:list_documents()": "повний журнал документів без фільтра",
+    "probe:list_leave_balances": "звіт HR по всіх активних працівниках; баланс — пошук за PK leave_balances",
+    "probe:accrue_leave": "регламентне нарахування відпусток: прохід по працівниках з hire_date",
+    "probe:run_maintenance": "містить accrue_leave — прохід по працівниках з hire_date раз на добу",
+    "db_manager._m012_leave_ledger": "одноразове списання вже підписаних відпусток під час міграції",
+    "db_manager.rebuild_vacation_periods": "повна перебудова vacation_periods (міграція / відновлення)",
+    "db_manager.rebuild_training_events": "повна перебудова training_events (міграція / відновлення)",
+    "db_manager.rebuild_leave_balances": "повний перерахунок балансів з журналу (відновлення)",
+    "db_manager.rebuild_document_fields": "повна перебудова document_fields з context_json (міграція / відновлення)",
+    "db_manager._m015_payload_store": "одноразове перенесення document_payloads у payload_blobs під час міграції",
+    "db_manager.pack_document_payloads": "перенесення відкритого context_json у payload_blobs (міграція / відновлення)",
+    "db_manager.prune_payloads": "регламентне прибирання payload без посилань; посилання — по індексах payload_id",
+    "probe:prune_payloads": "регламентне прибирання payload без посилань; посилання — по індексах payload_id",
+    "probe:train_payload_dictionaries": "зразки для словника: прохід від найновіших doc_id, обмежений LIMIT",
+}
+
+# Службові команди, які не мають сенсу для EXPLAIN
+_SKIP_PREFIXES = ("PRAGMA", "BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE",
+                  "CREATE", "DROP", "ALTER", "ANALYZE", "VACUUM")
+_DB_CALLS = {"fetch_all", "fetch_one", "execute_query", "execute", "executemany"}
+
+
+# ==================== Тестова база ====================
+
+def make_test_db(src_path: str, rows: int) -> str:
+    """Копія бази у тимчасовому каталозі, наповнена синтетичними даними."""
+    tmp_dir = Path(tempfile.mkdtemp(prefix="hr_plans_"))
+    dst = str(tmp_dir / "hr_system.db")
+    with sqlite3.connect(src_path) as src, sqlite3.connect(dst) as out:
+        src.backup(out)
+
+    db.DB_PATH = dst
+    conn = db.get_connection()   # накатує схему та індекси застосунку
+    _seed(conn, rows)
+    conn.execute("ANALYZE")
+    conn.commit()
+    return dst
+
+
+def _seed(conn, rows: int):
+    dep_ids = [r[0] for r in conn.execute("SELECT id FROM departments")] or [None]
+    pos_ids = [r[0] for r in conn.execute("SELECT id FROM positions")] or [None]
+    statuses = ["активний", "активний", "активний", "відпустка", "звільнений"]
+    doc_types = ["P1", "P4", "TRAINING", "VACATION", "INTERNSHIP_REFERRAL"]
+    doc_statuses = ["sent", "signed", "signed", "rejected", "draft"]
+    base = date(2015, 1, 1)
+
+    start_id = (conn.execute("SELECT IFNULL(MAX(id), 0) FROM employees").fetchone()[0]) + 1
+    conn.executemany("""
+        INSERT INTO employees(id, last_name, first_name, middle_name, email, phone,
+                              department_id, position_id, hire_date, employment_status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (start_id + i, f"Прізвище{i}", f"Ім'я{i % 97}", f"Побатькові{i % 31}",
+         f"user{i}@example.com", f"+380{i:09d}",
+         dep_ids[i % len(dep_ids)], pos_ids[i % len(pos_ids)],
+         (base + timedelta(days=i % 3650)).isoformat(), statuses[i % len(statuses)])
+        for i in range(rows)
+    ])
+    emp_ids = list(range(start_id, start_id + rows))
+
+    conn.executemany("""
+        INSERT INTO users(username, password, role, is_active, employee_id)
+        VALUES (?, 'x', 'employee', ?, ?)
+    """, [(f"plan_user_{e}", 1 if e % 7 else 0, e) for e in emp_ids])
+
+    docs = []
+    for i in range(rows * 3):
+        t = doc_types[i % len(doc_types)]
+        d = base + timedelta(days=i % 3650)
+        # періоди навчань/відпусток — щоб rebuild_* наповнили похідні таблиці
+        period = f'{{"start_date": "{d.isoformat()}", "end_date": "{(d + timedelta(days=13)).isoformat()}"}}'
+        extra = {"TRAINING": f', "training": {period}', "VACATION": f', "vacation": {period}'}.get(t, "")
+        docs.append((emp_ids[i % rows], t, f"{t} документ {i}",
+                     f'{{"order_number": "{i + 1}/{d.year}"{extra}}}',
+                     doc_statuses[i % len(doc_statuses)], d.isoformat() + " 10:00:00"))
+    conn.executemany("""
+        INSERT INTO documents(employee_id, type, title, context_json, status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, docs)
+
+    conn.executemany("""
+        INSERT INTO internships(employee_id, start_date, months, planned_end_date, status)
+        VALUES (?, ?, 3, '', ?)
+    """, [(e, (base + timedelta(days=e % 3650)).isoformat(), "active" if e % 5 else "completed")
+          for e in emp_ids[: rows // 4]])
+    db.rebuild_vacation_periods(conn)
+    db.rebuild_training_events(conn)
+    db.rebuild_document_fields(conn)
+    db.pack_document_payloads(conn)   # як після міграції 15: вміст — у payload_blobs
+    conn.commit()
+
+
+# ==================== Збір запитів ====================
+
+def collect_static_queries():
+    """SQL-літерали з викликів fetch_all/fetch_one/execute_query/execute у модулях src/."""
+    found = []
+    for path in sorted(SRC_DIR.glob("*.py")):
+        if path.name in (Path(__file__).name, "test_render_doc.py"):
+            continue
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+        _walk(tree, path.stem, [], found)
+    return found
+
+
+def _walk(node, module, scope, found):
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            _walk(child, module, scope + [child.name], found)
+            continue
+        if isinstance(child, ast.Call) and child.args:
+            func = child.func
+            name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", "")
+            arg = child.args[0]
+            if name in _DB_CALLS and isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                where = ".".join([module] + scope)
+                found.append((where, f"{module}.py:{child.lineno}", arg.value))
+        _walk(child, module, scope, found)
+
+
+# Виклики з динамічно зібраним SQL — їх ловимо через trace callback
+PROBES = [
+    ("list_documents()",        lambda: db.list_documents()),
+    ("list_documents(status)",  lambda: db.list_documents(status="sent")),
+    ("list_documents(search)",  lambda: db.list_documents(search="П-1")),
+    ("list_documents_page()",   lambda: db.list_documents_page()),
+    ("list_documents_page(after)", lambda: db.list_documents_page(after=("2025-01-01 00:00:00", 10**9))),
+    ("list_documents_page(status)", lambda: db.list_documents_page(status="sent")),
+    ("get_employees()",         lambda: db.get_employees()),
+    ("get_employee_row",        lambda: db.get_employee_row(1)),
+    ("get_employees_page()",    lambda: db.get_employees_page()),
+    ("get_employees_page(after)", lambda: db.get_employees_page(after=("Я", "Я", 10**9))),
+    ("get_employees_page(sort)", lambda: db.get_employees_page(sort="hire_date", descending=True)),
+    ("get_employees_page(search)", lambda: db.get_employees_page(search="Іван")),
+    ("list_documents_page(search)", lambda: db.list_documents_page(search="наказ")),
+    ("get_users(search)",       lambda: db.get_users(search="adm")),
+    ("get_departments_with_counts", lambda: db.get_departments_with_counts()),
+    ("get_positions_with_counts(department)", lambda: db.get_positions_with_counts(1)),
+    ("list_employee_documents", lambda: db.list_employee_documents(1)),
+    ("list_employee_documents(status)", lambda: db.list_employee_documents(1, "signed")),
+    ("get_document",                lambda: db.get_document(1)),
+    ("train_payload_dictionaries",  lambda: db.train_payload_dictionaries(retrain=True)),
+    ("prune_payloads",              lambda: db.prune_payloads()),
+    ("find_vacation_overlaps",      lambda: db.find_vacation_overlaps(1, "2025-06-01", "2025-06-14")),
+    ("get_current_vacation",        lambda: db.get_current_vacation(1)),
+    ("find_documents(type, period)", lambda: db.find_documents(doc_type="VACATION", date_field="period_start", date_from="2020-01-01", sort="period_start")),
+    ("find_documents(order_date)",   lambda: db.find_documents(date_from="2020-01-01", date_to="2020-03-01")),
+    ("find_documents(order_number)", lambda: db.find_documents(doc_type="P1", order_number="1/2020")),
+    ("get_next_training",           lambda: db.get_next_training(1)),
+    ("list_upcoming_trainings",     lambda: db.list_upcoming_trainings()),
+    ("get_leave_balance",           lambda: db.get_leave_balance(1)),
+    ("list_leave_balances",         lambda: db.list_leave_balances()),
+    ("list_leave_balances(search)", lambda: db.list_leave_balances(search="Іван")),
+    ("accrue_leave",                lambda: db.accrue_leave()),
+    ("order_number_exists_p1",  lambda: db.order_number_exists_p1("1/2025")),
+    ("docs_sent_count",         lambda: db.docs_sent_count()),
+    ("internships_overdue_count", lambda: db.internships_overdue_count()),
+    ("internships_soon_count",  lambda: db.internships_soon_count()),
+    ("run_maintenance",         lambda: db.run_maintenance(force=True)),
+]
+
+
+def collect_probe_queries():
+    """Фактичний SQL (з підставленими значеннями), який виконують PROBES."""
+    found = []
+    conn = db.get_connection()
+    for name, fn in PROBES:
+        captured = []
+        conn.set_trace_callback(captured.append)
+        try:
+            fn()
+        finally:
+            conn.set_trace_callback(None)
+        # той самий запит трасується повторно — на кожен спрацьований тригер і на кожен
+        # виклик у циклі з іншими параметрами; план однаковий, лишаємо перший екземпляр
+        seen = set()
+        for sql in captured:
+            if sql.lstrip().startswith("--"):
+                continue   # вкладені запити (тригери, службові таблиці FTS5) трасуються з префіксом "--"
+            shape = _query_shape(sql)
+            if shape in seen:
+                continue
+            seen.add(shape)
+            found.append((f"probe:{name}", "runtime", sql))
+    return found
+
+
+# ==================== Аналіз планів ====================
+
+def _strip_literals(sql: str) -> str:
+    return re.sub(r"'(?:[^']|'')*'", "''", sql)
+
+
+def _query_shape(sql: str) -> str:
+    # трасування підставляє значення параметрів — прибираємо рядкові й числові літерали
+    return re.sub(r"\b\d+(?:\.\d+)?\b", "0", _strip_literals(sql))
+
+
+def _dummy_params(sql: str):
+    clean = _strip_literals(sql)
+    named = re.findall(r"(?<![:\w]):(\w+)", clean)
+    if named:
+        return {n: None for n in named}
+    return (None,) * clean.count("?")
+
+
+def _aliases(sql: str) -> dict:
+    """alias -> таблиця з FROM/JOIN (у т.ч. з визначень представлень)."""
+    out = {}
+    kw = {"WHERE", "JOIN", "LEFT", "INNER", "ON", "GROUP", "ORDER", "LIMIT", "SET", "USING", "AS"}
+    for table, alias in re.findall(r"(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", sql, re.I):
+        out[table.lower()] = table.lower()
+        if alias and alias.upper() not in kw:
+            out[alias.lower()] = table.lower()
+    return out
+
+
+def find_scans(conn, sql: str, view_sql: str):
+    """Список великих таблиць, які план запиту сканує повністю."""
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, _dummy_params(sql)).fetchall()
+    names = _aliases(view_sql)
+    names.update(_aliases(sql))   # псевдоніми самого запиту мають пріоритет
+    scans = []
+    for row in plan:
+        m = re.match(r"SCAN (\w+)", row[-1])
+        if not m:
+            continue
+        table = names.get(m.group(1).lower(), m.group(1).lower())
+        if table in LARGE_TABLES:
+            scans.append((table, row[-1]))
+    return scans
+
+
+def main(argv=None):
+    args = list(sys.argv[1:] if argv is None else argv)
+    verbose = "-v" in args
+    rows = 20000
+    if "--rows" in args:
+        i = args.index("--rows")
+        rows = int(args[i + 1])
+        del args[i:i + 2]
+    args = [a for a in args if a != "-v"]
+    src_path = args[0] if args else db.DB_PATH
+
+    test_db = make_test_db(src_path, rows)
+    conn = db.get_connection()
+    view_sql = "\n".join(r[0] for r in conn.execute("SELECT sql FROM sqlite_master WHERE type='view'"))
+
+    queries = collect_probe_queries() + collect_static_queries()
+    failures, allowed, checked = [], [], 0
+    for where, loc, sql in queries:
+        if sql.lstrip().upper().startswith(_SKIP_PREFIXES):
+            continue
+        try:
+            scans = find_scans(conn, sql, view_sql)
+        except sqlite3.Error as e:
+            # міграції можуть посилатися на схему, яку самі ж і змінюють (колонки/таблиці до перебудови)
+            if not re.match(r"db_manager\._m\d{3}_", where) or verbose:
+                print(f"?? {where} ({loc}): не вдалося отримати план: {e}")
+            continue
+        checked += 1
+        for table, detail in scans:
+            item = (where, loc, table, detail)
+            (allowed if where in ALLOWED_SCANS else failures).append(item)
+
+    if verbose:
+        for where, loc, table, detail in allowed:
+            print(f"ok  {where} ({loc}): {detail} — {ALLOWED_SCANS[where] or 'дозволено'}")
+    for where, loc, table, detail in failures:
+        print(f"!!  {where} ({loc}): повний прохід по {table}: {detail}")
+
+    print(f"Перевірено запитів: {checked}, дозволених сканів: {len(allowed)}, порушень: {len(failures)}")
+    db.close_all_connections()
+    shutil.rmtree(Path(test_db).parent, ignore_errors=True)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,1045 @@
 # src/db_manager.py
-from contextlib import closing
-import sqlite3, json
+from contextlib import closing, contextmanager
+import sqlite3, json, threading, os, re, hashlib, zlib
+from collections import Counter
 from pathlib import Path
-from docxtpl import DocxTemplate
-from datetime import date
+from datetime import date, datetime
 
 DB_PATH = r"D:/Projects/hr_is/data/hr_system.db"   # перевір, що шлях правильний під твою структуру
 
 
+# =============================
+# ПІДКЛЮЧЕННЯ (ПУЛ)
+# =============================
+# Кожен потік має одне довгоживуче підключення, яке перевикористовується всіма хелперами.
+# Фонові потоки можуть явно взяти підключення з невеликого пулу через checkout_connection().
+
+STATEMENT_CACHE_SIZE = 256   # кеш підготовлених запитів (prepared statements) на підключення
+POOL_SIZE = 4                # скільки вільних підключень тримаємо для фонових потоків
+
+_local = threading.local()
+_pool_lock = threading.Lock()
+_idle_pool = []              # [(db_path, conn), ...]
+
+
+def _open_connection():
+    """Відкриває нове підключення з кешем підготовлених запитів і застосовує профіль сесії."""
+    conn = sqlite3.connect(
+        DB_PATH,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,   # підключення з пулу можуть переходити між потоками
+    )
+    _apply_db_profile(conn)
+    _ensure_schema(conn)
+    return conn
+
+
+PAGE_SIZE = 200             # рядків на сторінку у посторінкових списках (keyset)
+
+
+# =============================
+# МІГРАЦІЇ СХЕМИ (PRAGMA user_version)
+# =============================
+# Кожна міграція має номер; PRAGMA user_version зберігає номер останньої застосованої.
+# При першому підключенні процесу незастосовані міграції виконуються по черзі,
+# кожна у власній транзакції разом з оновленням user_version. Міграції пишемо
+# ідемпотентними: бази, де частину змін вже внесено вручну (ALTER), мігрують так само.
+# Індекси будуються в режимі WAL — читачі (інші робочі місця) під час побудови не блокуються.
+# У міграціях лише conn.execute: executescript спершу комітить відкриту транзакцію —
+# міграція перестає бути атомарною і виконується вже без блокування BEGIN IMMEDIATE.
+
+_schema_lock = threading.Lock()
+_schema_ready = set()   # шляхи БД, для яких міграції вже перевірено
+
+
+def _table_columns(conn, table: str) -> set:
+    # table_xinfo бачить і generated-колонки (table_info — ні)
+    return {r[1] for r in conn.execute(f"PRAGMA table_xinfo({table})").fetchall()}
+
+
+def _m001_internships_links(conn):
+    # колонки, які раніше додавались вручну через ALTER
+    cols = _table_columns(conn, "internships")
+    if "mentor_employee_id" not in cols:
+        conn.execute("ALTER TABLE internships ADD COLUMN mentor_employee_id INTEGER REFERENCES employees(id)")
+    if "doc_id" not in cols:
+        conn.execute("ALTER TABLE internships ADD COLUMN doc_id INTEGER REFERENCES documents(id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_internships_mentor ON internships(mentor_employee_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_internships_doc    ON internships(doc_id)")
+
+
+def _m002_order_numbers(conn):
+    # лічильники номерів наказів: (тип, рік) → останній виданий номер
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS order_sequences (
+            doc_type    TEXT    NOT NULL,
+            year        INTEGER NOT NULL,
+            last_number INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (doc_type, year)
+        ) WITHOUT ROWID
+    """)
+    # наздоганяємо лічильники за вже наявними документами (повторний запуск нічого не змінює)
+    conn.execute("""
+        INSERT INTO order_sequences(doc_type, year, last_number)
+        SELECT type,
+               CAST(SUBSTR(n, INSTR(n, '/') + 1) AS INTEGER) AS y,
+               MAX(CAST(SUBSTR(n, 1, INSTR(n, '/') - 1) AS INTEGER))
+          FROM (SELECT type, json_extract(context_json, '$.order_number') AS n
+                  FROM documents
+                 WHERE json_valid(context_json))
+         WHERE n LIKE '%/%'
+         GROUP BY type, y
+        ON CONFLICT(doc_type, year) DO UPDATE
+           SET last_number = MAX(last_number, excluded.last_number)
+    """)
+
+
+def _m003_access_indexes(conn):
+    # list_documents(status=...) + ORDER BY created_at DESC, docs_sent_count
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_status_created ON documents(status, created_at)")
+    # кабінет працівника: список документів (employee_id [+ status]) за датою
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_employee_status_created ON documents(employee_id, status, created_at)")
+    # нагадування про навчання / відпустку, перевірка перетину відпусток (employee_id + type + status)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_employee_type_status ON documents(employee_id, type, status)")
+    # users.employee_id: вибірка/деактивація акаунта працівника та перевірка FK при видаленні
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_employee ON users(employee_id)")
+    # пошук працівника за e-mail (створення акаунта з форми П-1)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_employees_email ON employees(email)")
+
+
+def _m004_drop_duplicate_indexes(conn):
+    # напр. idx_internships_employee повторює idx_internships_employee_id
+    _drop_duplicate_indexes(conn)
+
+
+def _drop_duplicate_indexes(conn):
+    """Видаляє індекси, що повністю дублюють раніше створений індекс тієї ж таблиці."""
+    dropped = []
+    seen = {}   # (таблиця, колонки) -> індекс, який залишаємо
+    # sql IS NOT NULL — лише індекси з CREATE INDEX (autoindex для UNIQUE/PK не чіпаємо)
+    rows = conn.execute("""
+        SELECT name, tbl_name, sql FROM sqlite_master
+        WHERE type = 'index' AND sql IS NOT NULL
+        ORDER BY rowid
+    """).fetchall()
+    for name, table, sql in rows:
+        if " WHERE " in sql.upper() or sql.upper().startswith("CREATE UNIQUE"):
+            continue
+        cols = tuple(r[2:5] for r in conn.execute(f"PRAGMA index_xinfo({name})").fetchall() if r[5])
+        key = (table, cols)
+        if key in seen:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+            dropped.append(name)
+        else:
+            seen[key] = name
+    return dropped
+
+
+def _m005_pagination_indexes(conn):
+    # keyset-пагінація журналу документів: ORDER BY created_at DESC, id DESC
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_created ON documents(created_at)")
+    # сторінки списку працівників у типовому порядку (прізвище, ім'я, id)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_employees_name ON employees(last_name, first_name)")
+
+
+# Повнотекстовий пошук (FTS5). rowid у *_fts = id запису основної таблиці.
+# unicode61 сам приводить кирилицю до нижнього регістру; remove_diacritics=0 —
+# щоб «й»/«ї» не зливались з «и»/«і». prefix — готові індекси для коротких префіксів.
+_FTS_OPTIONS = "tokenize = 'unicode61 remove_diacritics 0', prefix = '2 3'"
+
+_FTS_EMPLOYEE_NAME = "{e}.last_name || ' ' || {e}.first_name || ' ' || IFNULL({e}.middle_name, '')"
+
+_FTS_EMPLOYEE_ROW = f"""
+    INSERT INTO employees_fts(rowid, full_name, email, phone, department, position, birth_date)
+    SELECT NEW.id, {_FTS_EMPLOYEE_NAME.format(e="NEW")},
+           IFNULL(NEW.email, ''), IFNULL(NEW.phone, ''),
+           IFNULL((SELECT name FROM departments WHERE id = NEW.department_id), ''),
+           IFNULL((SELECT name FROM positions   WHERE id = NEW.position_id), ''),
+           IFNULL(NEW.birth_date, '');
+"""
+
+_FTS_DOCUMENT_ROW = f"""
+    INSERT INTO documents_fts(rowid, title, type, employee_name)
+    SELECT NEW.id, IFNULL(NEW.title, ''), NEW.type,
+           IFNULL((SELECT {_FTS_EMPLOYEE_NAME.format(e="e")} FROM employees e WHERE e.id = NEW.employee_id), '');
+"""
+
+_FTS_USER_ROW = f"""
+    INSERT INTO users_fts(rowid, username, role, full_name)
+    SELECT NEW.id, NEW.username, NEW.role,
+           IFNULL((SELECT {_FTS_EMPLOYEE_NAME.format(e="e")} FROM employees e WHERE e.id = NEW.employee_id), '');
+"""
+
+
+def _m006_search_index(conn):
+    for table, columns in (
+        ("employees_fts", "full_name, email, phone, department, position, birth_date"),
+        ("documents_fts", "title, type, employee_name"),
+        ("users_fts", "username, role, full_name"),
+    ):
+        conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({columns}, {_FTS_OPTIONS})")
+
+    # employees
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_employees_fts_ai AFTER INSERT ON employees BEGIN
+            {_FTS_EMPLOYEE_ROW}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_employees_fts_au
+        AFTER UPDATE OF last_name, first_name, middle_name, email, phone,
+                        department_id, position_id, birth_date ON employees BEGIN
+            DELETE FROM employees_fts WHERE rowid = OLD.id;
+            {_FTS_EMPLOYEE_ROW}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_employees_fts_names
+        AFTER UPDATE OF last_name, first_name, middle_name ON employees BEGIN
+            UPDATE documents_fts SET employee_name = {_FTS_EMPLOYEE_NAME.format(e="NEW")}
+             WHERE rowid IN (SELECT id FROM documents WHERE employee_id = NEW.id);
+            UPDATE users_fts SET full_name = {_FTS_EMPLOYEE_NAME.format(e="NEW")}
+             WHERE rowid IN (SELECT id FROM users WHERE employee_id = NEW.id);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_employees_fts_ad AFTER DELETE ON employees BEGIN
+            DELETE FROM employees_fts WHERE rowid = OLD.id;
+        END
+    """)
+
+    # перейменування довідників
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_departments_fts_au AFTER UPDATE OF name ON departments BEGIN
+            UPDATE employees_fts SET department = NEW.name
+             WHERE rowid IN (SELECT id FROM employees WHERE department_id = NEW.id);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_positions_fts_au AFTER UPDATE OF name ON positions BEGIN
+            UPDATE employees_fts SET position = NEW.name
+             WHERE rowid IN (SELECT id FROM employees WHERE position_id = NEW.id);
+        END
+    """)
+
+    # documents
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_documents_fts_ai AFTER INSERT ON documents BEGIN
+            {_FTS_DOCUMENT_ROW}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_documents_fts_au
+        AFTER UPDATE OF title, type, employee_id ON documents BEGIN
+            DELETE FROM documents_fts WHERE rowid = OLD.id;
+            {_FTS_DOCUMENT_ROW}
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_documents_fts_ad AFTER DELETE ON documents BEGIN
+            DELETE FROM documents_fts WHERE rowid = OLD.id;
+        END
+    """)
+
+    # users
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_users_fts_ai AFTER INSERT ON users BEGIN
+            {_FTS_USER_ROW}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_users_fts_au
+        AFTER UPDATE OF username, role, employee_id ON users BEGIN
+            DELETE FROM users_fts WHERE rowid = OLD.id;
+            {_FTS_USER_ROW}
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_fts_ad AFTER DELETE ON users BEGIN
+            DELETE FROM users_fts WHERE rowid = OLD.id;
+        END
+    """)
+    rebuild_search_index(conn)
+
+
+def _m007_fk_child_indexes(conn):
+    # дочірні колонки FK: без них ON DELETE CASCADE і перевірки FK при зміні
+    # documents/users проходять signatures і document_payloads повністю
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_signatures_document ON signatures(document_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_signatures_user ON signatures(user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_document_payloads_document ON document_payloads(document_id)")
+
+
+def _m008_employee_counters(conn):
+    # діапазонні предикати KPI «за 30 днів» (hire_date >= ...) ідуть по індексу
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_employees_hire_date ON employees(hire_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_employees_dismissal_date ON employees(dismissal_date)")
+    # лічильники: 'total' і 'status:<employment_status>', тригери тримають їх актуальними
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS employee_counters (
+            key   TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_employee_counters_ai AFTER INSERT ON employees BEGIN
+            INSERT INTO employee_counters(key, value) VALUES ('total', 1), ('status:' || NEW.employment_status, 1)
+                ON CONFLICT(key) DO UPDATE SET value = value + 1;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_employee_counters_ad AFTER DELETE ON employees BEGIN
+            UPDATE employee_counters SET value = value - 1
+             WHERE key IN ('total', 'status:' || OLD.employment_status);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_employee_counters_au
+        AFTER UPDATE OF employment_status ON employees
+        WHEN OLD.employment_status IS NOT NEW.employment_status BEGIN
+            UPDATE employee_counters SET value = value - 1 WHERE key = 'status:' || OLD.employment_status;
+            INSERT INTO employee_counters(key, value) VALUES ('status:' || NEW.employment_status, 1)
+                ON CONFLICT(key) DO UPDATE SET value = value + 1;
+        END
+    """)
+    rebuild_employee_counters(conn)
+
+
+# Таблиці, зміни яких пишуться у change_log: таблиця -> вираз id рядка (для NEW./OLD.)
+CHANGE_LOG_TABLES = {
+    "employees": "id",
+    "documents": "id",
+    "internships": "id",
+    "users": "id",
+    "departments": "id",
+    "positions": "id",
+    "department_positions": "department_id",
+}
+
+
+def _m009_change_log(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id     INTEGER,
+            op         TEXT NOT NULL,                 -- I / U / D
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    for table, key in CHANGE_LOG_TABLES.items():
+        for event, op, ref in (("INSERT", "I", "NEW"), ("UPDATE", "U", "NEW"), ("DELETE", "D", "OLD")):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_change_log_{op.lower()} AFTER {event} ON {table} BEGIN
+                    INSERT INTO change_log(table_name, row_id, op) VALUES ('{table}', {ref}.{key}, '{op}');
+                END
+            """)
+
+
+def _m010_internships_deadline_index(conn):
+    # активні стажування за датою завершення: регламентне автозавершення, бейджі, терміновість
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_internships_status_end ON internships(status, planned_end_date)")
+    # (status) — префікс нового індексу, окремо не потрібен
+    conn.execute("DROP INDEX IF EXISTS idx_internships_status")
+
+
+def _m011_vacation_periods(conn):
+    # періоди підписаних відпусток окремими рядками замість розбору context_json у Python
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS vacation_periods (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+            doc_id      INTEGER NOT NULL UNIQUE REFERENCES documents(id) ON DELETE CASCADE,
+            start_date  TEXT    NOT NULL,          -- ISO YYYY-MM-DD
+            end_date    TEXT    NOT NULL,          -- ISO YYYY-MM-DD (включно)
+            type        TEXT,                      -- вид відпустки, як у наказі
+            days        INTEGER NOT NULL
+        )
+    """)
+    # перетин інтервалів: employee_id = ? AND start_date <= :end AND end_date >= :start
+    # (діапазон по start_date, end_date перевіряється з самого індексу)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_vacation_periods_employee_dates
+            ON vacation_periods(employee_id, start_date, end_date)
+    """)
+    # наказ перестав бути підписаним — період більше не діє
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_vacation_periods_unsigned
+        AFTER UPDATE OF status ON documents
+        WHEN OLD.status = 'signed' AND NEW.status IS NOT 'signed' BEGIN
+            DELETE FROM vacation_periods WHERE doc_id = NEW.id;
+        END
+    """)
+    rebuild_vacation_periods(conn)
+
+
+def _m012_leave_ledger(conn):
+    # журнал права на щорічну відпустку: нарахування за робочий рік, списання при підписі,
+    # сторно при скасуванні; leave_balances — поточні підсумки, які тримає тригер
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS leave_ledger (
+            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id     INTEGER NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+            work_year_start TEXT    NOT NULL,          -- робочий рік, ISO YYYY-MM-DD
+            work_year_end   TEXT    NOT NULL,
+            kind            TEXT    NOT NULL,          -- accrual / debit / reversal
+            days            INTEGER NOT NULL,          -- зі знаком: +нараховано, -використано
+            doc_id          INTEGER REFERENCES documents(id) ON DELETE SET NULL,
+            created_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # одне нарахування на працівника й робочий рік (повторний accrue_leave нічого не додає)
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_leave_ledger_accrual
+            ON leave_ledger(employee_id, work_year_start) WHERE kind = 'accrual'
+    """)
+    # одне списання на документ: повторне списання за тим самим наказом ігнорується
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_leave_ledger_debit
+            ON leave_ledger(doc_id) WHERE kind = 'debit'
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_leave_ledger_doc ON leave_ledger(doc_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_leave_ledger_employee ON leave_ledger(employee_id, work_year_start)")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS leave_balances (
+            employee_id     INTEGER NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+            work_year_start TEXT    NOT NULL,
+            work_year_end   TEXT    NOT NULL,
+            accrued         INTEGER NOT NULL DEFAULT 0,
+            used            INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (employee_id, work_year_start)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_leave_ledger_ai AFTER INSERT ON leave_ledger BEGIN
+            INSERT INTO leave_balances(employee_id, work_year_start, work_year_end, accrued, used)
+            VALUES (NEW.employee_id, NEW.work_year_start, NEW.work_year_end,
+                    CASE WHEN NEW.kind = 'accrual' THEN NEW.days ELSE 0 END,
+                    CASE WHEN NEW.kind = 'accrual' THEN 0 ELSE -NEW.days END)
+            ON CONFLICT(employee_id, work_year_start) DO UPDATE
+               SET accrued = accrued + excluded.accrued,
+                   used    = used + excluded.used;
+        END
+    """)
+    # у change_log (ChangeBus), як і таблиці з CHANGE_LOG_TABLES; журнал лише доповнюється
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_leave_ledger_change_log_i AFTER INSERT ON leave_ledger BEGIN
+            INSERT INTO change_log(table_name, row_id, op) VALUES ('leave_ledger', NEW.employee_id, 'I');
+        END
+    """)
+    accrue_leave(conn)
+    # списання за вже підписаними щорічними відпустками
+    rows = conn.execute("""
+        SELECT d.id, d.employee_id, d.context_json, e.hire_date
+          FROM vacation_periods v
+          JOIN documents d ON d.id = v.doc_id
+          JOIN employees e ON e.id = v.employee_id
+         ORDER BY v.start_date
+    """).fetchall()
+    for doc_id, employee_id, context_json, hire_date in rows:
+        try:
+            context = json.loads(context_json or "{}")
+        except ValueError:
+            continue
+        _post_vacation_debit(conn, doc_id, employee_id, context, hire_date)
+
+
+# рядок training_events з документа TRAINING для тригерів міграції 13 ({d}=NEW, {source} порожнє);
+# з міграції 15 context_json стиснений у payload_blobs і рядок пише _store_training_event
+_TRAINING_EVENT_SELECT = """
+    SELECT {d}.employee_id, {d}.id,
+           json_extract({d}.context_json, '$.training.start_date'),
+           NULLIF(json_extract({d}.context_json, '$.training.end_date'), ''),
+           json_extract({d}.context_json, '$.training.title'),
+           json_extract({d}.context_json, '$.training.provider'),
+           json_extract({d}.context_json, '$.training.format'),
+           json_extract({d}.context_json, '$.training.place'),
+           {d}.status
+      {source}
+     WHERE {d}.type = 'TRAINING' AND {d}.employee_id IS NOT NULL
+       AND json_valid({d}.context_json)
+       AND date(json_extract({d}.context_json, '$.training.start_date')) IS NOT NULL
+"""
+_TRAINING_EVENT_COLUMNS = "employee_id, doc_id, start_date, end_date, title, provider, format, place, status"
+
+
+def _m013_training_events(conn):
+    # навчання окремими рядками; документи TRAINING створюються з форми, пакетно
+    # (batch_orders) і змінюють статус при підписі/відхиленні — тож синхронізують тригери
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS training_events (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+            doc_id      INTEGER NOT NULL UNIQUE REFERENCES documents(id) ON DELETE CASCADE,
+            start_date  TEXT    NOT NULL,          -- ISO YYYY-MM-DD
+            end_date    TEXT,
+            title       TEXT,
+            provider    TEXT,
+            format      TEXT,
+            place       TEXT,
+            status      TEXT    NOT NULL           -- статус документа: sent / signed / rejected ...
+        )
+    """)
+    # «найближче навчання працівника»: employee_id = ? AND start_date >= сьогодні
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_training_events_employee_start ON training_events(employee_id, start_date)")
+    # «навчання в найближчі N днів» по всій лікарні: діапазон start_date
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_training_events_start ON training_events(start_date)")
+
+    select = _TRAINING_EVENT_SELECT.format(d="NEW", source="")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_training_events_ai AFTER INSERT ON documents
+        WHEN NEW.type = 'TRAINING' BEGIN
+            INSERT INTO training_events({_TRAINING_EVENT_COLUMNS}) {select};
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_training_events_au
+        AFTER UPDATE OF status, context_json, employee_id ON documents
+        WHEN NEW.type = 'TRAINING' BEGIN
+            DELETE FROM training_events WHERE doc_id = NEW.id;
+            INSERT INTO training_events({_TRAINING_EVENT_COLUMNS}) {select};
+        END
+    """)
+    rebuild_training_events(conn)
+
+
+def _m014_document_fields(conn):
+    # бізнес-поля документів (DOCUMENT_FIELDS) типізованими колонками з індексами
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS document_fields (
+            doc_id        INTEGER PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+            doc_type      TEXT NOT NULL,
+            order_number  TEXT,
+            order_date    TEXT,          -- ISO YYYY-MM-DD (у т.ч. з order_date_str ДД.ММ.РРРР)
+            hire_date     TEXT,
+            period_start  TEXT,          -- відпустка / навчання / стажування / звільнення
+            period_end    TEXT,
+            subtype       TEXT,          -- вид відпустки, формат навчання тощо
+            employee_name TEXT,
+            department    TEXT,
+            position      TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_document_fields_type_order_number ON document_fields(doc_type, order_number)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_document_fields_order_date ON document_fields(order_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_document_fields_type_period ON document_fields(doc_type, period_start)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_document_fields_hire_date ON document_fields(hire_date)")
+    rebuild_document_fields(conn)
+
+
+def _m015_payload_store(conn):
+    # context_json / document_payloads.payload_json → спільне сховище payload_blobs:
+    # один стиснений рядок на унікальний вміст (sha256), словник zlib на тип документа
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS payload_dicts (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            doc_type   TEXT    NOT NULL,
+            data       BLOB    NOT NULL,       -- preset-словник zlib (zdict)
+            samples    INTEGER NOT NULL,       -- на скількох payload навчено
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_payload_dicts_type ON payload_dicts(doc_type, id)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS payload_blobs (
+            id      INTEGER PRIMARY KEY AUTOINCREMENT,
+            hash    BLOB    NOT NULL UNIQUE,   -- sha256 канонічного JSON
+            codec   TEXT    NOT NULL,          -- 'zlib'
+            dict_id INTEGER REFERENCES payload_dicts(id),
+            size    INTEGER NOT NULL,          -- байт до стиснення
+            data    BLOB    NOT NULL
+        )
+    """)
+
+    # JSON-тригери навчань читали NEW.context_json; далі training_events пише
+    # _store_training_event разом з документом, а тригер лише переносить статус
+    conn.execute("DROP TRIGGER IF EXISTS trg_training_events_ai")
+    conn.execute("DROP TRIGGER IF EXISTS trg_training_events_au")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_training_events_status
+        AFTER UPDATE OF status ON documents
+        WHEN NEW.type = 'TRAINING' BEGIN
+            UPDATE training_events SET status = NEW.status WHERE doc_id = NEW.id;
+        END
+    """)
+    if "payload_id" not in _table_columns(conn, "documents"):
+        conn.execute("ALTER TABLE documents ADD COLUMN payload_id INTEGER REFERENCES payload_blobs(id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_payload ON documents(payload_id)")
+
+    train_payload_dictionaries(conn)
+    pack_document_payloads(conn)
+
+    # історія payload: посилання на той самий blob замість другої копії JSON
+    if "payload_json" in _table_columns(conn, "document_payloads"):
+        types = dict(conn.execute("SELECT id, type FROM documents").fetchall())
+        rows = conn.execute(
+            "SELECT id, document_id, payload_json, created_at FROM document_payloads"
+        ).fetchall()
+        conn.execute("""
+            CREATE TABLE document_payloads_new (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+                payload_id  INTEGER NOT NULL REFERENCES payload_blobs(id),
+                created_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO document_payloads_new(id, document_id, payload_id, created_at) VALUES (?, ?, ?, ?)",
+            [(pid, doc_id, _store_payload(conn, types.get(doc_id), _canonical_text(text)), created_at)
+             for pid, doc_id, text, created_at in rows]
+        )
+        conn.execute("DROP TABLE document_payloads")
+        conn.execute("ALTER TABLE document_payloads_new RENAME TO document_payloads")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_document_payloads_document ON document_payloads(document_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_document_payloads_payload ON document_payloads(payload_id)")
+
+
+
+def rebuild_employee_counters(conn=None):
+    """Перераховує employee_counters з employees (міграція / ручне відновлення)."""
+    conn = conn or get_connection()
+    conn.execute("DELETE FROM employee_counters")
+    conn.execute("INSERT INTO employee_counters(key, value) SELECT 'total', COUNT(*) FROM employees")
+    conn.execute("""
+        INSERT INTO employee_counters(key, value)
+        SELECT 'status:' || employment_status, COUNT(*) FROM employees GROUP BY employment_status
+    """)
+
+
+def rebuild_vacation_periods(conn=None):
+    """Перезаповнює vacation_periods з підписаних наказів VACATION (міграція / ручне відновлення)."""
+    conn = conn or get_connection()
+    conn.execute("DELETE FROM vacation_periods")
+    for doc_id, _, employee_id, _, context in _iter_document_contexts(
+            conn, "WHERE type = 'VACATION' AND status = 'signed' AND employee_id IS NOT NULL"):
+        _store_vacation_period(conn, doc_id, employee_id, context)
+
+
+def rebuild_training_events(conn=None):
+    """Перезаповнює training_events з документів TRAINING (міграція / ручне відновлення)."""
+    conn = conn or get_connection()
+    conn.execute("DELETE FROM training_events")
+    for doc_id, _, employee_id, status, context in _iter_document_contexts(
+            conn, "WHERE type = 'TRAINING' AND employee_id IS NOT NULL"):
+        _store_training_event(conn, doc_id, employee_id, status, context)
+
+
+def rebuild_document_fields(conn=None):
+    """Перезаповнює document_fields з вмісту всіх документів (міграція / ручне відновлення)."""
+    conn = conn or get_connection()
+    conn.execute("DELETE FROM document_fields")
+    rows = []
+    for doc_id, doc_type, _, _, context in _iter_document_contexts(conn):
+        rows.append((doc_id, doc_type, context))
+        if len(rows) >= 1000:
+            _store_document_fields(conn, rows)
+            rows = []
+    _store_document_fields(conn, rows)
+
+
+def rebuild_search_index(conn=None):
+    """Повністю перебудовує *_fts з основних таблиць (міграція / ручне відновлення)."""
+    conn = conn or get_connection()
+    name = _FTS_EMPLOYEE_NAME.format(e="e")
+    conn.execute("DELETE FROM employees_fts")
+    conn.execute(f"""
+        INSERT INTO employees_fts(rowid, full_name, email, phone, department, position, birth_date)
+        SELECT e.id, {name}, IFNULL(e.email, ''), IFNULL(e.phone, ''),
+               IFNULL(d.name, ''), IFNULL(p.name, ''), IFNULL(e.birth_date, '')
+          FROM employees e
+          LEFT JOIN departments d ON d.id = e.department_id
+          LEFT JOIN positions   p ON p.id = e.position_id
+    """)
+    conn.execute("DELETE FROM documents_fts")
+    conn.execute(f"""
+        INSERT INTO documents_fts(rowid, title, type, employee_name)
+        SELECT d.id, IFNULL(d.title, ''), d.type, IFNULL({name}, '')
+          FROM documents d LEFT JOIN employees e ON e.id = d.employee_id
+    """)
+    conn.execute("DELETE FROM users_fts")
+    conn.execute(f"""
+        INSERT INTO users_fts(rowid, username, role, full_name)
+        SELECT u.id, u.username, u.role, IFNULL({name}, '')
+          FROM users u LEFT JOIN employees e ON e.id = u.employee_id
+    """)
+    for table in ("employees_fts", "documents_fts", "users_fts"):
+        conn.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+
+
+def fts_query(text: str):
+    """
+    Рядок пошуку → вираз MATCH: кожне слово як префікс, усі слова обов'язкові.
+    'іван пет' → '"іван"* "пет"*'. None — якщо в рядку немає жодного слова.
+    """
+    # ті самі межі слів, що й у unicode61: літери/цифри, решта (у т.ч. _ і апостроф) — роздільники
+    words = re.findall(r"[^\W_]+", (text or "").lower())
+    return " ".join(f'"{w}"*' for w in words) or None
+
+
+# (номер, опис, функція) — лише додаємо в кінець, номери не змінюємо
+MIGRATIONS = [
+    (1, "internships: mentor_employee_id, doc_id", _m001_internships_links),
+    (2, "лічильники номерів наказів order_sequences", _m002_order_numbers),
+    (3, "індекси під шляхи доступу до documents/users/employees", _m003_access_indexes),
+    (4, "видалення дублікатів індексів", _m004_drop_duplicate_indexes),
+    (5, "індекси для посторінкових списків", _m005_pagination_indexes),
+    (6, "повнотекстовий пошук FTS5 (employees/documents/users)", _m006_search_index),
+    (7, "індекси на дочірні колонки FK (signatures, document_payloads)", _m007_fk_child_indexes),
+    (8, "лічильники працівників для KPI + індекси дат прийняття/звільнення", _m008_employee_counters),
+    (9, "журнал змін change_log для сповіщення вкладок", _m009_change_log),
+    (10, "індекс internships(status, planned_end_date)", _m010_internships_deadline_index),
+    (11, "таблиця vacation_periods (періоди підписаних відпусток)", _m011_vacation_periods),
+    (12, "журнал права на щорічну відпустку leave_ledger + leave_balances", _m012_leave_ledger),
+    (13, "таблиця training_events (навчання з документів TRAINING)", _m013_training_events),
+    (14, "бізнес-поля документів document_fields (DOCUMENT_FIELDS) з індексами", _m014_document_fields),
+    (15, "стиснене сховище payload_blobs (дедуплікація context_json / document_payloads)", _m015_payload_store),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn=None) -> int:
+    conn = conn or get_connection()
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _apply_migrations(conn) -> list:
+    """Застосовує незастосовані міграції; повертає номери виконаних."""
+    applied = []
+    for version, title, fn in MIGRATIONS:
+        if get_schema_version(conn) >= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # інше робоче місце могло встигнути мігрувати, поки ми чекали блокування
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            fn(conn)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Міграція {version} ({title}) не застосована: {e}")
+            raise
+        applied.append(version)
+    return applied
+
+
+def _ensure_schema(conn):
+    with _schema_lock:
+        if DB_PATH in _schema_ready:
+            return
+        applied = _apply_migrations(conn)
+        if applied:
+            # нові індекси/колонки — планувальнику потрібна свіжа статистика
+            conn.execute("ANALYZE")
+            conn.commit()
+        else:
+            # дешево: перераховує статистику лише там, де вона застаріла
+            conn.execute("PRAGMA analysis_limit = 400")
+            conn.execute("PRAGMA optimize")
+        _schema_ready.add(DB_PATH)
+
+
+# =============================
+# ПРОФІЛЬ SQLITE-СЕСІЇ (PRAGMA)
+# =============================
+# Пріоритет (від меншого до більшого):
+#   DB_PROFILE_DEFAULTS → app_settings ('db.<pragma>') → файл db_profile.env поряд з БД → змінні оточення HR_DB_<PRAGMA>
+# app_settings спільні для всіх робочих місць, env-файл/змінні — локальні для конкретного ПК.
+
+DB_PROFILE_DEFAULTS = {
+    "journal_mode": "WAL",        # читачі не блокуються записом
+    "synchronous":  "NORMAL",     # у WAL достатньо NORMAL (fsync лише на checkpoint)
+    "busy_timeout": "5000",       # мс очікування, якщо інше робоче місце тримає блокування
+    "mmap_size":    "268435456",  # 256 МБ memory-mapped I/O
+    "cache_size":   "-20000",     # від'ємне = КіБ, тобто ~20 МБ page cache
+    "temp_store":   "MEMORY",
+    "foreign_keys": "ON",
+}
+
+# як SQLite повертає перелічувані значення (для звірки в check_db_profile)
+_PRAGMA_ENUMS = {
+    "synchronous":  {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3},
+    "temp_store":   {"DEFAULT": 0, "FILE": 1, "MEMORY": 2},
+    "foreign_keys": {"OFF": 0, "ON": 1},
+}
+
+_profile_lock = threading.Lock()
+_db_profile = None   # обчислюється один раз на процес
+
+
+def _db_profile_env_path() -> Path:
+    return Path(DB_PATH).with_name("db_profile.env")
+
+
+def _read_env_file(path: Path) -> dict:
+    """Простий KEY=VALUE парсер (рядки з # — коментарі)."""
+    values = {}
+    try:
+        text = path.read_text(encoding="utf-8")
+    except OSError:
+        return values
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        values[key.strip()] = value.strip().strip('"').strip("'")
+    return values
+
+
+def _load_db_profile(conn) -> dict:
+    """Збирає профіль з усіх джерел (див. пріоритет вище)."""
+    profile = dict(DB_PROFILE_DEFAULTS)
+
+    try:
+        rows = conn.execute("SELECT key, value FROM app_settings WHERE key LIKE 'db.%'").fetchall()
+    except sqlite3.Error:
+        rows = []   # таблиці ще немає — лишаємо значення за замовчуванням
+    for key, value in rows:
+        name = key[3:]
+        if name in profile and value not in (None, ""):
+            profile[name] = str(value)
+
+    env_file = _read_env_file(_db_profile_env_path())
+    for name in profile:
+        env_key = f"HR_DB_{name.upper()}"
+        if env_file.get(env_key):
+            profile[name] = env_file[env_key]
+        if os.environ.get(env_key):
+            profile[name] = os.environ[env_key]
+
+    # значення підставляються в PRAGMA напряму, тож пропускаємо лише прості токени
+    for name, value in list(profile.items()):
+        if not re.fullmatch(r"-?\w+", value):
+            print(f"DB profile: ігнорую некоректне значення {name}={value!r}")
+            profile[name] = DB_PROFILE_DEFAULTS[name]
+    return profile
+
+
+def get_db_profile(conn=None) -> dict:
+    """Повертає профіль сесії (кешований на процес)."""
+    global _db_profile
+    with _profile_lock:
+        if _db_profile is None:
+            own = conn is None
+            if own:
+                conn = sqlite3.connect(DB_PATH)
+            try:
+                _db_profile = _load_db_profile(conn)
+            finally:
+                if own:
+                    conn.close()
+        return dict(_db_profile)
+
+
+def reload_db_profile():
+    """Скидає кеш профілю (нові підключення прочитають налаштування заново)."""
+    global _db_profile
+    with _profile_lock:
+        _db_profile = None
+
+
+def _apply_db_profile(conn):
+    for name, value in get_db_profile(conn).items():
+        try:
+            conn.execute(f"PRAGMA {name} = {value}")
+        except sqlite3.Error as e:
+            print(f"DB profile: не вдалося застосувати {name}={value}: {e}")
+
+
+def check_db_profile() -> list[dict]:
+    """
+    Звіряє бажаний профіль з тим, що реально діє на підключенні поточного потоку.
+    Повертає [{name, wanted, actual, ok}, ...].
+    """
+    conn = get_connection()
+    report = []
+    for name, wanted in get_db_profile().items():
+        row = conn.execute(f"PRAGMA {name}").fetchone()
+        actual = row[0] if row else None
+        enum = _PRAGMA_ENUMS.get(name)
+        if enum:
+            ok = actual == enum.get(wanted.upper(), wanted)
+        else:
+            ok = str(actual).lower() == wanted.lower()
+        report.append({"name": name, "wanted": wanted, "actual": actual, "ok": ok})
+    return report
+
+
+def report_db_profile():
+    """Стартова перевірка: друкує лише налаштування SQLite, що не діють як очікується (звичайний старт — тихий)."""
+    try:
+        report = check_db_profile()
+    except Exception as e:
+        print("DB profile check error:", e)
+        return []
+    for r in report:
+        if not r["ok"]:
+            print(f"!! PRAGMA {r['name']}: очікується {r['wanted']}, діє {r['actual']}")
+    return report
+
+
 # =============================
 # БАЗОВІ УТИЛІТИ
 # =============================
 
 def get_connection():
-    """Повертає підключення до бази даних SQLite."""
-    return sqlite3.connect(DB_PATH)
+    """Повертає підключення поточного потоку (створюється один раз і далі перевикористовується)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != DB_PATH:
+        if conn is not None:
+            conn.close()
+        conn = _open_connection()
+        _local.conn, _local.path = conn, DB_PATH
+    return conn
+
+
+def open_watch_connection():
+    """
+    Окреме підключення для стеження за змінами (ChangeBus).
+    PRAGMA data_version змінюється лише від комітів інших підключень, тож
+    власне підключення спостерігача бачить і зміни цього процесу, і інших ПК.
+    """
+    return _open_connection()
+
+
+# ---- Журнал змін (change_log) ----
+def get_data_version(conn=None) -> int:
+    conn = conn or get_connection()
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+def get_change_cursor(conn=None) -> int:
+    """id останнього запису change_log (стартова позиція для get_changes_since)."""
+    conn = conn or get_connection()
+    return conn.execute("SELECT IFNULL(MAX(id), 0) FROM change_log").fetchone()[0]
+
+def get_changes_since(last_id: int, conn=None):
+    """
+    Зміни після last_id: (новий_last_id, {table_name: {row_id, ...}}).
+    None у наборі — невідомо, які саме рядки (напр. журнал уже обрізано далі last_id).
+    """
+    conn = conn or get_connection()
+    changes = {}
+    first_id = conn.execute("SELECT MIN(id) FROM change_log").fetchone()[0]
+    if first_id is not None and first_id > last_id + 1 and last_id > 0:
+        # пропущені записи вже видалено prune_change_log — вважаємо зміненим усе
+        changes = {table: {None} for table in CHANGE_LOG_TABLES}
+    for change_id, table, row_id in conn.execute(
+        "SELECT id, table_name, row_id FROM change_log WHERE id > ? ORDER BY id", (last_id,)
+    ):
+        changes.setdefault(table, set()).add(row_id)
+        last_id = change_id
+    return last_id, changes
+
+def prune_change_log(keep_hours: int = 24) -> int:
+    """
+    Прибирає старі записи журналу змін (клієнти, що відстали, отримають «змінено все»).
+    Повертає кількість видалених записів.
+    """
+    conn = get_connection()
+    with closing(conn.cursor()) as cur:
+        try:
+            cur.execute("DELETE FROM change_log WHERE changed_at < DATETIME('now', ?)", (f"-{int(keep_hours)} hours",))
+            _commit(conn)
+        except Exception:
+            _rollback(conn)
+            raise
+        return cur.rowcount or 0
+
+
+@contextmanager
+def checkout_connection():
+    """
+    Явно бере підключення з пулу для фонового потоку.
+    Поки блок активний, fetch_all/fetch_one/execute_query у цьому потоці працюють через нього.
+    """
+    conn = None
+    with _pool_lock:
+        while _idle_pool and conn is None:
+            path, candidate = _idle_pool.pop()
+            if path == DB_PATH:
+                conn = candidate
+            else:
+                candidate.close()
+    if conn is None:
+        conn = _open_connection()
+
+    prev = (getattr(_local, "conn", None), getattr(_local, "path", None), getattr(_local, "tx_depth", 0))
+    _local.conn, _local.path, _local.tx_depth = conn, DB_PATH, 0
+    try:
+        yield conn
+    finally:
+        _local.conn, _local.path, _local.tx_depth = prev
+        if conn.in_transaction:
+            conn.rollback()
+        with _pool_lock:
+            if len(_idle_pool) < POOL_SIZE:
+                _idle_pool.append((DB_PATH, conn))
+                conn = None
+        if conn is not None:
+            conn.close()
+
+
+def close_all_connections():
+    """Закриває підключення поточного потоку і всі вільні підключення пулу (напр., при виході)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = _local.path = None
+    with _pool_lock:
+        while _idle_pool:
+            _idle_pool.pop()[1].close()
+
+
+@contextmanager
+def transaction():
+    """
+    Unit of work: одне підключення, один COMMIT.
+    Усі execute_query/fetch_* всередині блоку (у цьому ж потоці) працюють у спільній транзакції;
+    при винятку все відкочується. Вкладені блоки приєднуються до зовнішнього.
+
+        with db.transaction():
+            emp_id = db.execute_query("INSERT INTO employees ...", ...)
+            db.execute_query("INSERT INTO internships ...", ...)
+    """
+    conn = get_connection()
+    depth = getattr(_local, "tx_depth", 0)
+    if depth == 0 and not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")   # одразу беремо блокування запису — без дедлоків на апгрейді
+    _local.tx_depth = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        _local.tx_depth = depth
+        if depth == 0:
+            conn.rollback()
+        raise
+    _local.tx_depth = depth
+    if depth == 0:
+        conn.commit()
+
+
+def _in_transaction() -> bool:
+    return getattr(_local, "tx_depth", 0) > 0
+
+
+def _commit(conn):
+    """COMMIT, якщо ми не всередині transaction() (там фіксує зовнішній блок)."""
+    if not _in_transaction():
+        conn.commit()
+
+
+def _rollback(conn):
+    if not _in_transaction():
+        conn.rollback()
 
 
 def fetch_all(query: str, params: tuple = ()):
     """Виконує SELECT і повертає список словників."""
-    with closing(get_connection()) as conn, closing(conn.cursor()) as cur:
+    with closing(get_connection().cursor()) as cur:
         cur.execute(query, params)
         columns = [desc[0] for desc in cur.description]
         rows = [dict(zip(columns, row)) for row in cur.fetchall()]
@@ -27,7 +1047,7 @@ def fetch_all(query: str, params: tuple = ()):
 
 def fetch_one(query: str, params: tuple = ()):
     """SELECT → один рядок як dict або None."""
-    with closing(get_connection()) as conn, closing(conn.cursor()) as cur:
+    with closing(get_connection().cursor()) as cur:
         cur.execute(query, params)
         row = cur.fetchone()
         if not row:
@@ -39,9 +1059,14 @@ def fetch_one(query: str, params: tuple = ()):
 
 def execute_query(query: str, params: tuple = ()):
     """Виконує INSERT/UPDATE/DELETE."""
-    with closing(get_connection()) as conn, closing(conn.cursor()) as cur:
-        cur.execute(query, params)
-        conn.commit()
+    conn = get_connection()
+    with closing(conn.cursor()) as cur:
+        try:
+            cur.execute(query, params)
+            _commit(conn)
+        except Exception:
+            _rollback(conn)
+            raise
         return cur.lastrowid
 
 
@@ -49,42 +1074,110 @@ def execute_query(query: str, params: tuple = ()):
 # ФУНКЦІЇ ДЛЯ ОПЕРАЦІЙ ІЗ ТАБЛИЦЯМИ
 # =============================
 
+# ---- Кеш довідників (departments / positions / department_positions) ----
+# Довідники змінюються рідко, а читаються з кожної форми. Дані тримаються в
+# пам'яті процесу; кожна зміна довідника в тій самій транзакції збільшує
+# app_settings['ref.version']. Перевірка свіжості: PRAGMA data_version
+# (змінюється лише коли БД комітило інше підключення) — і тільки тоді
+# читаємо ref.version і, якщо він інший, перечитуємо довідники.
+REF_VERSION_KEY = "ref.version"
+
+_ref_lock = threading.Lock()
+_ref_cache = {"path": None, "version": None, "gen": 0, "data": None}
+
+
+def _load_reference_data() -> dict:
+    departments = fetch_all("SELECT id, name FROM departments ORDER BY name")
+    positions = fetch_all("SELECT id, name FROM positions ORDER BY name")
+    pos_by_id = {p["id"]: p for p in positions}
+    by_department = {}
+    allowed = set()
+    for dep_id, pos_id in get_connection().execute("SELECT department_id, position_id FROM department_positions"):
+        allowed.add((dep_id, pos_id))
+        if pos_id in pos_by_id:
+            by_department.setdefault(dep_id, []).append(pos_by_id[pos_id])
+    for items in by_department.values():
+        items.sort(key=lambda p: p["name"])
+    return {"departments": departments, "positions": positions,
+            "by_department": by_department, "allowed": allowed}
+
+
+def _reference_version(conn):
+    row = conn.execute("SELECT value FROM app_settings WHERE key = ?", (REF_VERSION_KEY,)).fetchone()
+    return row[0] if row else None
+
+
+def _reference_data() -> dict:
+    conn = get_connection()
+    if getattr(_local, "tx_depth", 0):
+        # всередині транзакції бачимо незакомічені зміни — у спільний кеш їх не кладемо
+        return _load_reference_data()
+
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    with _ref_lock:
+        cache = _ref_cache
+        if (cache["data"] is not None and cache["path"] == DB_PATH
+                and getattr(_local, "ref_seen", None) == (DB_PATH, data_version, cache["gen"])):
+            return cache["data"]
+
+        version = _reference_version(conn)
+        if cache["data"] is None or cache["path"] != DB_PATH or cache["version"] != version:
+            cache.update(path=DB_PATH, version=version, data=_load_reference_data(), gen=cache["gen"] + 1)
+        _local.ref_seen = (DB_PATH, data_version, cache["gen"])
+        return cache["data"]
+
+
+def _bump_reference_version():
+    """Викликати в транзакції зміни довідника."""
+    execute_query("""
+        INSERT INTO app_settings(key, value) VALUES (?, '1')
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+    """, (REF_VERSION_KEY,))
+
+
+def invalidate_reference_cache():
+    with _ref_lock:
+        _ref_cache["data"] = None
+        _ref_cache["gen"] += 1
+
+
+def _change_reference(query: str, params: tuple):
+    """Зміна довідника + ref.version однією транзакцією; кеш процесу скидається одразу."""
+    try:
+        with transaction():
+            result = execute_query(query, params)
+            _bump_reference_version()
+        return result
+    finally:
+        invalidate_reference_cache()
+
+
 # ---- Departments ----
 def get_departments():
-    return fetch_all("SELECT id, name FROM departments ORDER BY name")
+    return [dict(d) for d in _reference_data()["departments"]]
 
 def add_department(name: str):
-    return execute_query("INSERT INTO departments (name) VALUES (?)", (name,))
+    return _change_reference("INSERT INTO departments (name) VALUES (?)", (name,))
 
 def delete_department(department_id: int):
-    return execute_query("DELETE FROM departments WHERE id = ?", (department_id,))
+    return _change_reference("DELETE FROM departments WHERE id = ?", (department_id,))
 
 
 # ---- Positions ----
 def get_positions():
-    return fetch_all("SELECT id, name FROM positions ORDER BY name")
+    return [dict(p) for p in _reference_data()["positions"]]
 
 def add_position(name: str) -> int:
     """Додає посаду і повертає її id."""
-    import sqlite3
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        cur = conn.cursor()
-        cur.execute("INSERT INTO positions(name) VALUES (?)", (name,))
-        conn.commit()
-        return cur.lastrowid
-    finally:
-        conn.close()
+    return _change_reference("INSERT INTO positions(name) VALUES (?)", (name,))
 
 
 def delete_position(position_id: int):
-    return execute_query("DELETE FROM positions WHERE id = ?", (position_id,))
+    return _change_reference("DELETE FROM positions WHERE id = ?", (position_id,))
 
 
 # ---- Employees ----
-def get_employees():
-    query = """
+_EMPLOYEES_LIST_SELECT = """
     SELECT e.id,
            e.last_name || ' ' || e.first_name || ' ' || IFNULL(e.middle_name, '') AS full_name,
            e.email,
@@ -97,9 +1190,79 @@ def get_employees():
       FROM employees e
       LEFT JOIN departments d ON e.department_id = d.id
       LEFT JOIN positions   p ON e.position_id = p.id
-     ORDER BY e.last_name, e.first_name
+"""
+
+def get_employees():
+    return fetch_all(_EMPLOYEES_LIST_SELECT + " ORDER BY e.last_name, e.first_name")
+
+def get_employee_row(emp_id: int):
+    """Один рядок у форматі get_employees() — для точкового оновлення списку."""
+    return fetch_one(_EMPLOYEES_LIST_SELECT + " WHERE e.id = ?", (emp_id,))
+
+# Колонки сортування списку працівників → вирази ORDER BY (id додається останнім для стабільності)
+EMPLOYEE_SORT_KEYS = {
+    None:                ("e.last_name", "e.first_name"),
+    "full_name":         ("e.last_name", "e.first_name", "IFNULL(e.middle_name, '')"),
+    "email":             ("IFNULL(e.email, '')",),
+    "phone":             ("IFNULL(e.phone, '')",),
+    "department":        ("IFNULL(d.name, '')",),
+    "position":          ("IFNULL(p.name, '')",),
+    "birth_date":        ("IFNULL(e.birth_date, '')",),
+    "hire_date":         ("IFNULL(e.hire_date, '')",),
+    "employment_status": ("e.employment_status",),
+}
+
+def get_employees_page(search: str = None, department: str = None, position: str = None,
+                       status: str = None, sort: str = None, descending: bool = False,
+                       after=None, limit: int = PAGE_SIZE):
     """
-    return fetch_all(query)
+    Сторінка списку працівників з фільтрами й сортуванням (keyset-пагінація).
+    after — курсор (ключі сортування..., id) останнього рядка попередньої сторінки.
+    Повертає (rows, cursor); cursor=None — далі рядків немає.
+    """
+    keys = EMPLOYEE_SORT_KEYS.get(sort, EMPLOYEE_SORT_KEYS[None]) + ("e.id",)
+    direction = "DESC" if descending else "ASC"
+    key_cols = ", ".join(f"{k} AS _k{i}" for i, k in enumerate(keys))
+
+    where, params = "", []
+    match = fts_query(search)
+    if match:
+        where += " AND e.id IN (SELECT rowid FROM employees_fts WHERE employees_fts MATCH ?)"
+        params.append(match)
+    if department:
+        where += " AND d.name = ?"
+        params.append(department)
+    if position:
+        where += " AND p.name = ?"
+        params.append(position)
+    if status:
+        where += " AND e.employment_status = ?"
+        params.append(status)
+    if after:
+        op = "<" if descending else ">"
+        where += f" AND ({', '.join(keys)}) {op} ({', '.join('?' for _ in keys)})"
+        params.extend(after)
+
+    rows = fetch_all(f"""
+        SELECT e.id,
+               e.last_name || ' ' || e.first_name || ' ' || IFNULL(e.middle_name, '') AS full_name,
+               e.email, e.phone,
+               d.name AS department, p.name AS position,
+               e.birth_date, e.hire_date, e.employment_status,
+               {key_cols}
+          FROM employees e
+          LEFT JOIN departments d ON e.department_id = d.id
+          LEFT JOIN positions   p ON e.position_id = p.id
+         WHERE 1=1 {where}
+         ORDER BY {", ".join(f"{k} {direction}" for k in keys)}
+         LIMIT ?
+    """, (*params, limit + 1))
+
+    cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = tuple(rows[-1][f"_k{i}"] for i in range(len(keys)))
+    return rows, cursor
 
 def add_employee(data: dict):
     query = """
@@ -127,15 +1290,15 @@ def delete_employee(emp_id: int):
 
 # ---- KPI / статистика ----
 def count_employees_total():
-    row = fetch_all("SELECT COUNT(*) AS cnt FROM employees")[0]
-    return row["cnt"]
+    row = fetch_one("SELECT value FROM employee_counters WHERE key = 'total'")
+    return row["value"] if row else 0
 
 def count_employees_hired_last_30d():
+    # порівняння з константою, без DATE() над колонкою — працює idx_employees_hire_date
     row = fetch_all("""
         SELECT COUNT(*) AS cnt
         FROM employees
-        WHERE hire_date IS NOT NULL
-          AND DATE(hire_date) >= DATE('now','-30 day')
+        WHERE hire_date >= DATE('now','-30 day')
     """)[0]
     return row["cnt"]
 
@@ -143,14 +1306,27 @@ def count_employees_dismissed_last_30d():
     row = fetch_all("""
         SELECT COUNT(*) AS cnt
         FROM employees
-        WHERE dismissal_date IS NOT NULL
-          AND DATE(dismissal_date) >= DATE('now','-30 day')
+        WHERE dismissal_date >= DATE('now','-30 day')
     """)[0]
     return row["cnt"]
 
+def get_dashboard_snapshot() -> dict:
+    """
+    Усі KPI головної вкладки одним запитом:
+    {total, active, hired_30d, dismissed_30d, departments}.
+    total/active — з employee_counters (O(1)), «за 30 днів» — діапазон по індексу дати.
+    """
+    return fetch_one("""
+        SELECT
+            IFNULL((SELECT value FROM employee_counters WHERE key = 'total'), 0)           AS total,
+            IFNULL((SELECT value FROM employee_counters WHERE key = 'status:активний'), 0) AS active,
+            (SELECT COUNT(*) FROM employees WHERE hire_date >= DATE('now','-30 day'))      AS hired_30d,
+            (SELECT COUNT(*) FROM employees WHERE dismissal_date >= DATE('now','-30 day')) AS dismissed_30d,
+            (SELECT COUNT(*) FROM departments)                                             AS departments
+    """)
+
 def count_departments():
-    row = fetch_all("SELECT COUNT(*) AS cnt FROM departments")[0]
-    return row["cnt"]
+    return len(_reference_data()["departments"])
 
 
 
@@ -196,22 +1372,11 @@ def update_employee(emp_id: int, data: dict):
 
 def get_positions_by_department(department_id: int):
     """Повертає посади, дозволені для конкретного відділення."""
-    return fetch_all("""
-        SELECT p.id, p.name
-        FROM department_positions dp
-        JOIN positions p ON p.id = dp.position_id
-        WHERE dp.department_id = ?
-        ORDER BY p.name
-    """, (department_id,))
+    return [dict(p) for p in _reference_data()["by_department"].get(department_id, ())]
 
 def is_position_allowed_for_department(position_id: int, department_id: int) -> bool:
     """Чи дозволена ця посада в цьому відділенні?"""
-    row = fetch_all("""
-        SELECT COUNT(*) AS cnt
-        FROM department_positions
-        WHERE department_id = ? AND position_id = ?
-    """, (department_id, position_id))[0]
-    return row["cnt"] > 0
+    return (department_id, position_id) in _reference_data()["allowed"]
 
 
 
@@ -222,36 +1387,83 @@ def is_position_allowed_for_department(position_id: int, department_id: int) ->
 
 # ======== Departments helpers ========
 def rename_department(department_id: int, new_name: str):
-    return execute_query("UPDATE departments SET name = ? WHERE id = ?", (new_name, department_id))
+    return _change_reference("UPDATE departments SET name = ? WHERE id = ?", (new_name, department_id))
 
 def count_employees_in_department(department_id: int) -> int:
     row = fetch_all("SELECT COUNT(*) AS cnt FROM employees WHERE department_id = ?", (department_id,))[0]
     return row["cnt"]
 
+def get_departments_with_counts():
+    """
+    Усі відділення з кількістю працівників одним запитом:
+    [{id, name, emp_count, active_count}, ...] (active_count — лише зі статусом 'активний').
+    """
+    return fetch_all("""
+        SELECT dep.id, dep.name,
+               IFNULL(c.emp_count, 0) AS emp_count,
+               IFNULL(c.active_count, 0) AS active_count
+          FROM departments dep
+          LEFT JOIN (
+                SELECT department_id,
+                       COUNT(*) AS emp_count,
+                       SUM(employment_status = 'активний') AS active_count
+                  FROM employees
+                 WHERE department_id IS NOT NULL
+                 GROUP BY department_id
+          ) c ON c.department_id = dep.id
+         ORDER BY dep.name
+    """)
+
 # ======== Positions helpers ========
 def rename_position(position_id: int, new_name: str):
-    return execute_query("UPDATE positions SET name = ? WHERE id = ?", (new_name, position_id))
+    return _change_reference("UPDATE positions SET name = ? WHERE id = ?", (new_name, position_id))
 
 def count_employees_in_position(position_id: int) -> int:
     row = fetch_all("SELECT COUNT(*) AS cnt FROM employees WHERE position_id = ?", (position_id,))[0]
     return row["cnt"]
 
+def get_positions_with_counts(department_id: int | None = None):
+    """
+    Посади з кількістю працівників одним запитом: [{id, name, emp_count, active_count}, ...].
+    department_id — лише посади, дозволені у відділенні (лічильники — по всіх працівниках на посаді).
+    """
+    where, params = "", ()
+    if department_id is not None:
+        where = "WHERE pos.id IN (SELECT position_id FROM department_positions WHERE department_id = ?)"
+        params = (department_id,)
+    return fetch_all(f"""
+        SELECT pos.id, pos.name,
+               IFNULL(c.emp_count, 0) AS emp_count,
+               IFNULL(c.active_count, 0) AS active_count
+          FROM positions pos
+          LEFT JOIN (
+                SELECT position_id,
+                       COUNT(*) AS emp_count,
+                       SUM(employment_status = 'активний') AS active_count
+                  FROM employees
+                 WHERE position_id IS NOT NULL
+                 GROUP BY position_id
+          ) c ON c.position_id = pos.id
+         {where}
+         ORDER BY pos.name
+    """, params)
+
 # Повний список посад (для режиму "Усі посади" у довідниках)
 def get_all_positions():
-    return fetch_all("SELECT id, name FROM positions ORDER BY name")
+    return get_positions()
 
 # Посади доступні для конкретного відділення (ти вже додав get_positions_by_department)
 # def get_positions_by_department(department_id: int): ... (вже є)
 
 # Додати/видалити звʼязок pos ↔ dep (щоб керувати доступністю посад у відділеннях – згодом)
 def link_position_to_department(position_id: int, department_id: int):
-    return execute_query(
+    return _change_reference(
         "INSERT OR IGNORE INTO department_positions (department_id, position_id) VALUES (?, ?)",
         (department_id, position_id)
     )
 
 def unlink_position_from_department(position_id: int, department_id: int):
-    return execute_query(
+    return _change_reference(
         "DELETE FROM department_positions WHERE department_id = ? AND position_id = ?",
         (department_id, position_id)
     )
@@ -262,8 +1474,16 @@ def unlink_position_from_department(position_id: int, department_id: int):
 
 
 
-def get_users():
-    return fetch_all("""
+def get_users(search: str = None, role: str = None):
+    where, params = "", []
+    match = fts_query(search)
+    if match:
+        where += " AND u.id IN (SELECT rowid FROM users_fts WHERE users_fts MATCH ?)"
+        params.append(match)
+    if role:
+        where += " AND u.role = ?"
+        params.append(role)
+    return fetch_all(f"""
         SELECT
             u.id,
             u.username,
@@ -280,8 +1500,9 @@ def get_users():
         LEFT JOIN employees  e ON e.id = u.employee_id
         LEFT JOIN departments d ON d.id = e.department_id
         LEFT JOIN positions   p ON p.id = e.position_id
+        WHERE 1=1 {where}
         ORDER BY u.username
-    """)
+    """, tuple(params))
 
 
 
@@ -291,190 +1512,887 @@ def get_users():
 
 
 
-def _conn():
-    return sqlite3.connect(DB_PATH)
-
 def get_employee_brief_list():
     """
     Повертає [(id, "Прізвище Ім'я По-батькові"), ...] для випадаючого списку.
     """
-    con = _conn()
-    con.row_factory = sqlite3.Row
-    cur = con.cursor()
-    rows = cur.execute("""
+    rows = fetch_all("""
         SELECT e.id,
                e.last_name || ' ' || e.first_name || ' ' || IFNULL(e.middle_name,'') AS full_name
         FROM employees e
         ORDER BY e.last_name, e.first_name
-    """).fetchall()
-    con.close()
+    """)
     return [(r["id"], r["full_name"].strip()) for r in rows]
 
 def get_employee_min(employee_id: int):
     """
     Мінімальний профіль працівника для підстановки в шаблон.
     """
-    con = _conn()
-    con.row_factory = sqlite3.Row
-    cur = con.cursor()
-    row = cur.execute("""
+    row = fetch_one("""
         SELECT e.id, e.last_name, e.first_name, IFNULL(e.middle_name,'') AS middle_name,
                d.name AS department_name, p.name AS position_name
         FROM employees e
         JOIN departments d ON d.id = e.department_id
         JOIN positions   p ON p.id = e.position_id
         WHERE e.id=?
-    """, (employee_id,)).fetchone()
-    con.close()
+    """, (employee_id,))
     if not row:
         raise RuntimeError("Працівника не знайдено")
-    return dict(row)
+    return row
 
-def create_document_with_preview(employee_id: int, doc_type: str, title: str,
-                                 context: dict, created_by: str,
-                                 template_path: str, out_dir: str):
-    """
-    1) створює запис у documents (draft)
-    2) рендерить чернетку DOCX з контексту
-    3) оновлює file_docx
-    """
-    out_dir = Path(out_dir); out_dir.mkdir(parents=True, exist_ok=True)
-    con = _conn()
-    cur = con.cursor()
+def get_employees_min(employee_ids) -> dict:
+    """get_employee_min для багатьох працівників одним запитом: {id: профіль}."""
+    ids = sorted({int(i) for i in employee_ids})
+    if not ids:
+        return {}
+    rows = fetch_all("""
+        SELECT e.id, e.last_name, e.first_name, IFNULL(e.middle_name,'') AS middle_name,
+               d.name AS department_name, p.name AS position_name
+        FROM employees e
+        JOIN departments d ON d.id = e.department_id
+        JOIN positions   p ON p.id = e.position_id
+        WHERE e.id IN (SELECT value FROM json_each(?))
+    """, (json.dumps(ids),))
+    return {r["id"]: r for r in rows}
+
+_DOCUMENTS_LIST_SELECT = """
+    SELECT d.id, d.type, d.title, d.status, d.created_at,
+           d.signed_by, d.signed_at, d.file_docx,
+           (e.last_name || ' ' || e.first_name || ' ' || IFNULL(e.middle_name,'')) AS employee_name
+    FROM documents d
+    LEFT JOIN employees e ON e.id = d.employee_id
+    WHERE 1=1
+"""
+
+def _documents_filters(search: str = None, status: str = None):
+    where, params = "", []
+    if status:
+        where += " AND d.status = ?"
+        params.append(status)
+    match = fts_query(search)
+    if match:
+        where += " AND d.id IN (SELECT rowid FROM documents_fts WHERE documents_fts MATCH ?)"
+        params.append(match)
+    return where, params
 
-    cur.execute("""
-        INSERT INTO documents (employee_id, type, title, status, created_by, context_json)
-        VALUES (?, ?, ?, 'draft', ?, ?)
-    """, (employee_id, doc_type, title, created_by, json.dumps(context, ensure_ascii=False)))
-    doc_id = cur.lastrowid
+def list_documents(search: str = None, status: str = None):
+    where, params = _documents_filters(search, status)
+    return fetch_all(_DOCUMENTS_LIST_SELECT + where + " ORDER BY d.created_at DESC", tuple(params))
 
-    # DOCX draft
-    out_path = out_dir / f"emp_{employee_id:04d}_doc_{doc_id:06d}_draft.docx"
-    tpl = DocxTemplate(template_path)
-    tpl.render(context)
-    tpl.save(out_path)
+def list_documents_page(search: str = None, status: str = None, after=None, limit: int = PAGE_SIZE):
+    """
+    Сторінка журналу документів (новіші зверху), keyset-пагінація.
+    after — курсор (created_at, id) останнього рядка попередньої сторінки.
+    Повертає (rows, cursor); cursor=None — далі рядків немає.
+    """
+    where, params = _documents_filters(search, status)
+    if after:
+        where += " AND (d.created_at, d.id) < (?, ?)"
+        params.extend(after)
+    rows = fetch_all(
+        _DOCUMENTS_LIST_SELECT + where + " ORDER BY d.created_at DESC, d.id DESC LIMIT ?",
+        (*params, limit + 1)
+    )
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1]["created_at"], rows[-1]["id"])
+
+# ---- Сховище payload (payload_blobs) ----
+# Вміст документа (context) зберігається один раз на унікальний JSON: канонічний текст
+# (ключі за абеткою, без пробілів) → sha256 → рядок payload_blobs, стиснений zlib з
+# preset-словником типу документа. documents.payload_id і document_payloads посилаються
+# на той самий рядок; get_document повертає context_json вже розпакованим.
+PAYLOAD_CODEC = "zlib"
+PAYLOAD_DICT_SIZE = 16 * 1024      # байт на словник (вікно zlib — 32 КБ)
+PAYLOAD_DICT_SAMPLES = 200         # останні документи типу, на яких вчиться словник
+PAYLOAD_DICT_MIN_SAMPLES = 20      # менше — стискаємо без словника
+
+_payload_dict_cache = {}           # (DB_PATH, dict_id) -> bytes; рядки payload_dicts не змінюються
+
+# фрагмент канонічного JSON: "ключ": і (якщо є) скалярне значення
+_PAYLOAD_FRAGMENT = re.compile(r'"(?:[^"\\]|\\.)*":(?:"(?:[^"\\]|\\.)*"|[-\w.]+)?')
+
+def _canonical_json(context) -> str:
+    return json.dumps(context, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+def _canonical_text(text):
+    """JSON-рядок у канонічному вигляді (некоректний JSON лишається як є)."""
+    try:
+        return _canonical_json(json.loads(text))
+    except (TypeError, ValueError):
+        return text or ""
+
+def _payload_dict(conn, dict_id: int) -> bytes:
+    key = (DB_PATH, dict_id)
+    if key not in _payload_dict_cache:
+        row = conn.execute("SELECT data FROM payload_dicts WHERE id = ?", (dict_id,)).fetchone()
+        _payload_dict_cache[key] = row[0] if row else b""
+    return _payload_dict_cache[key]
+
+def _store_payload(conn, doc_type, text: str) -> int:
+    """id рядка payload_blobs для канонічного JSON text (новий рядок — лише для нового вмісту)."""
+    raw = text.encode("utf-8")
+    digest = hashlib.sha256(raw).digest()
+    row = conn.execute("SELECT id FROM payload_blobs WHERE hash = ?", (digest,)).fetchone()
+    if row:
+        return row[0]
+    row = conn.execute(
+        "SELECT id FROM payload_dicts WHERE doc_type = ? ORDER BY id DESC LIMIT 1", (doc_type,)
+    ).fetchone()
+    dict_id = row[0] if row else None
+    comp = zlib.compressobj(9, zdict=_payload_dict(conn, dict_id)) if dict_id else zlib.compressobj(9)
+    data = comp.compress(raw) + comp.flush()
+    cur = conn.execute(
+        "INSERT INTO payload_blobs(hash, codec, dict_id, size, data) VALUES (?, ?, ?, ?, ?)",
+        (digest, PAYLOAD_CODEC, dict_id, len(raw), data)
+    )
+    return cur.lastrowid
 
-    cur.execute("UPDATE documents SET file_docx=? WHERE id=?", (str(out_path), doc_id))
-    con.commit(); con.close()
-    return doc_id, str(out_path)
+def _pack_context(conn, doc_type: str, context: dict) -> int:
+    return _store_payload(conn, doc_type, _canonical_json(context))
 
-def list_documents(search: str = None, status: str = None):
-    con = _conn()
-    con.row_factory = sqlite3.Row
-    cur = con.cursor()
-
-    base = """
-        SELECT d.id, d.type, d.title, d.status, d.created_at,
-               d.signed_by, d.signed_at, d.file_docx,
-               (e.last_name || ' ' || e.first_name || ' ' || IFNULL(e.middle_name,'')) AS employee_name
-        FROM documents d
-        LEFT JOIN employees e ON e.id = d.employee_id
-        WHERE 1=1
+def _load_payload(conn, payload_id: int):
+    """Розпакований JSON-рядок з payload_blobs (None — якщо рядка немає)."""
+    row = conn.execute("SELECT codec, dict_id, data FROM payload_blobs WHERE id = ?", (payload_id,)).fetchone()
+    if not row:
+        return None
+    codec, dict_id, data = row
+    if codec != PAYLOAD_CODEC:
+        raise ValueError(f"Невідомий кодек payload #{payload_id}: {codec}")
+    dec = zlib.decompressobj(zdict=_payload_dict(conn, dict_id)) if dict_id else zlib.decompressobj()
+    return (dec.decompress(data) + dec.flush()).decode("utf-8")
+
+def _decode_context(conn, context_json, payload_id) -> dict:
+    """context документа з payload_blobs або (ще не перенесений) з context_json."""
+    text = _load_payload(conn, payload_id) if payload_id is not None else context_json
+    try:
+        context = json.loads(text or "{}")
+    except ValueError:
+        return {}
+    return context if isinstance(context, dict) else {}
+
+def _iter_document_contexts(conn, where: str = "", params: tuple = ()):
+    """(id, type, employee_id, status, context) документів порціями по 1000 (перебудови похідних таблиць)."""
+    # до міграції 15 колонки payload_id ще немає — читаємо лише context_json
+    payload = "payload_id" if "payload_id" in _table_columns(conn, "documents") else "NULL"
+    cur = conn.execute(
+        f"SELECT id, type, employee_id, status, context_json, {payload} FROM documents {where}", params
+    )
+    while True:
+        chunk = cur.fetchmany(1000)
+        if not chunk:
+            break
+        for doc_id, doc_type, employee_id, status, context_json, payload_id in chunk:
+            yield doc_id, doc_type, employee_id, status, _decode_context(conn, context_json, payload_id)
+
+def _train_payload_dict(samples) -> bytes:
+    """
+    Preset-словник zlib з фрагментів, що повторюються в кількох зразках.
+    Найцінніші (частота × довжина) — в кінці: zlib бере збіги з найближчої частини словника.
+    """
+    freq = Counter()
+    for text in samples:
+        freq.update(set(_PAYLOAD_FRAGMENT.findall(text)))
+    common = sorted((f for f, n in freq.items() if n > 1), key=lambda f: freq[f] * len(f), reverse=True)
+    picked, size = [], 0
+    for fragment in common:
+        data = fragment.encode("utf-8")
+        if size + len(data) > PAYLOAD_DICT_SIZE:
+            continue
+        picked.append(data)
+        size += len(data)
+    return b"".join(reversed(picked))
+
+def train_payload_dictionaries(conn=None, retrain: bool = False) -> list[str]:
+    """
+    Навчає словники для типів документів (за замовчуванням — лише для тих, що ще без словника)
+    на останніх PAYLOAD_DICT_SAMPLES документах типу. Нові payload стискаються новим словником,
+    уже записані лишаються зі своїм dict_id. Повертає типи, для яких словник створено.
+    """
+    conn = conn or get_connection()
+    trained = []
+    for (doc_type,) in conn.execute("SELECT code FROM document_types ORDER BY code").fetchall():
+        if not retrain and conn.execute(
+                "SELECT 1 FROM payload_dicts WHERE doc_type = ? LIMIT 1", (doc_type,)).fetchone():
+            continue
+        payload = "d.payload_id" if "payload_id" in _table_columns(conn, "documents") else "NULL"
+        rows = conn.execute(f"""
+            SELECT d.context_json, {payload}
+              FROM document_fields f
+              JOIN documents d ON d.id = f.doc_id
+             WHERE f.doc_type = ?
+             ORDER BY f.doc_id DESC
+             LIMIT ?
+        """, (doc_type, PAYLOAD_DICT_SAMPLES)).fetchall()
+        samples = {_canonical_json(_decode_context(conn, context_json, payload_id))
+                   for context_json, payload_id in rows}
+        if len(samples) < PAYLOAD_DICT_MIN_SAMPLES:
+            continue
+        data = _train_payload_dict(samples)
+        if not data:
+            continue
+        conn.execute("INSERT INTO payload_dicts(doc_type, data, samples) VALUES (?, ?, ?)",
+                     (doc_type, data, len(samples)))
+        trained.append(doc_type)
+    return trained
+
+def pack_document_payloads(conn=None) -> int:
+    """
+    Переносить context_json, що ще лежить відкритим текстом (до міграції 15 або вставлений
+    в обхід insert_document), у payload_blobs. Повертає кількість перенесених документів.
+    """
+    conn = conn or get_connection()
+    rows = conn.execute("SELECT id, type, context_json FROM documents WHERE context_json IS NOT NULL").fetchall()
+    conn.executemany(
+        "UPDATE documents SET payload_id = ?, context_json = NULL WHERE id = ?",
+        [(_store_payload(conn, doc_type, _canonical_text(text)), doc_id) for doc_id, doc_type, text in rows]
+    )
+    return len(rows)
+
+def prune_payloads(conn=None) -> int:
+    """Видаляє payload_blobs, на які вже не посилається жоден документ чи запис історії."""
+    conn = conn or get_connection()
+    cur = conn.execute("""
+        DELETE FROM payload_blobs
+         WHERE NOT EXISTS (SELECT 1 FROM documents d WHERE d.payload_id = payload_blobs.id)
+           AND NOT EXISTS (SELECT 1 FROM document_payloads p WHERE p.payload_id = payload_blobs.id)
+    """)
+    return cur.rowcount
+
+# ---- Бізнес-поля документів (document_fields) ----
+def _iso_date(value):
+    """'YYYY-MM-DD' або 'ДД.ММ.РРРР' → ISO-рядок; інше → None."""
+    value = (value or "").strip() if isinstance(value, str) else ""
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+def _full_name(emp):
+    if not isinstance(emp, dict):
+        return None
+    name = " ".join(p for p in (emp.get("last_name"), emp.get("first_name"), emp.get("middle_name")) if p)
+    return name or None
+
+# колонка document_fields -> шлях у context (через крапку) або (шлях, перетворення);
+# "a|b" — перший непорожній з альтернативних шляхів;
+# "*" — для всіх типів, далі — уточнення/доповнення для конкретного типу
+DOCUMENT_FIELDS = {
+    "*": {
+        "order_number":  "order_number",
+        "order_date":    ("order_date|order_date_str", _iso_date),
+        "employee_name": ("employee", _full_name),
+        "department":    "employee.department_name",
+        "position":      "employee.position_name",
+    },
+    "P1": {
+        "hire_date":    ("hire_date", _iso_date),
+        "period_start": ("hire_date", _iso_date),
+    },
+    "P4": {
+        "period_start": ("dismissal_date|dismissal_date_str", _iso_date),
+        "subtype":      "dismissal_reason",
+    },
+    "VACATION": {
+        "period_start": ("vacation.start_date", _iso_date),
+        "period_end":   ("vacation.end_date", _iso_date),
+        "subtype":      "vacation.type",
+    },
+    "TRAINING": {
+        "period_start": ("training.start_date", _iso_date),
+        "period_end":   ("training.end_date", _iso_date),
+        "subtype":      "training.format",
+    },
+    "INTERNSHIP_REFERRAL": {
+        "period_start": ("internship_start_date_str", _iso_date),
+        "period_end":   ("internship_end_date_str", _iso_date),
+    },
+}
+DOCUMENT_FIELD_COLUMNS = tuple(DOCUMENT_FIELDS["*"]) + ("hire_date", "period_start", "period_end", "subtype")
+
+def document_fields(doc_type: str, context: dict) -> dict:
+    """Значення колонок document_fields для документа за DOCUMENT_FIELDS."""
+    spec = {**DOCUMENT_FIELDS["*"], **DOCUMENT_FIELDS.get(doc_type, {})}
+    out = dict.fromkeys(DOCUMENT_FIELD_COLUMNS)
+    for column, rule in spec.items():
+        paths, convert = rule if isinstance(rule, tuple) else (rule, None)
+        for path in paths.split("|"):
+            value = context or {}
+            for key in path.split("."):
+                value = value.get(key) if isinstance(value, dict) else None
+            if value not in (None, ""):
+                break
+        if convert is not None:
+            value = convert(value)
+        elif value is not None:
+            value = str(value).strip() or None
+        out[column] = value
+    return out
+
+def _store_document_fields(conn, rows):
+    """rows — [(doc_id, doc_type, context), ...]; вставка або заміна рядків document_fields."""
+    columns = ("doc_id", "doc_type") + DOCUMENT_FIELD_COLUMNS
+    data = []
+    for doc_id, doc_type, context in rows:
+        fields = document_fields(doc_type, context)
+        data.append((doc_id, doc_type) + tuple(fields[c] for c in DOCUMENT_FIELD_COLUMNS))
+    conn.executemany(f"""
+        INSERT OR REPLACE INTO document_fields({", ".join(columns)})
+        VALUES ({", ".join("?" for _ in columns)})
+    """, data)
+
+DOCUMENT_SORT_FIELDS = ("order_date", "order_number", "period_start", "hire_date", "employee_name")
+
+def find_documents(doc_type: str | None = None, order_number: str | None = None,
+                   date_field: str = "order_date", date_from=None, date_to=None,
+                   status: str | None = None, sort: str = "order_date", descending: bool = True,
+                   limit: int = PAGE_SIZE):
+    """
+    Документи за бізнес-полями (document_fields) без розбору JSON:
+    тип, номер наказу, діапазон дат по date_field (order_date / period_start / hire_date),
+    статус; сортування за одним з DOCUMENT_SORT_FIELDS.
+    """
+    if date_field not in ("order_date", "period_start", "hire_date"):
+        raise ValueError(f"Невідоме поле дати: {date_field}")
+    if sort not in DOCUMENT_SORT_FIELDS:
+        raise ValueError(f"Невідоме поле сортування: {sort}")
+    query = f"""
+        SELECT d.id, d.type, d.title, d.status, d.employee_id, d.created_at, d.signed_at,
+               f.order_number, f.order_date, f.hire_date, f.period_start, f.period_end,
+               f.subtype, f.employee_name, f.department, f.position
+          FROM document_fields f
+          JOIN documents d ON d.id = f.doc_id
+         WHERE 1=1
     """
     params = []
+    if doc_type:
+        query += " AND f.doc_type = ?"
+        params.append(doc_type)
+    if order_number:
+        query += " AND f.order_number = ?"
+        params.append(order_number)
+    if date_from:
+        query += f" AND f.{date_field} >= ?"
+        params.append(str(date_from))
+    if date_to:
+        query += f" AND f.{date_field} <= ?"
+        params.append(str(date_to))
     if status:
-        base += " AND d.status = ?"
+        query += " AND d.status = ?"
         params.append(status)
-    if search:
-        like = f"%{search}%"
-        base += " AND (d.title LIKE ? OR d.type LIKE ? OR employee_name LIKE ?)"
-        params.extend([like, like, like])
-    base += " ORDER BY d.created_at DESC"
-
-    rows = cur.execute(base, params).fetchall()
-    con.close()
-    return [dict(r) for r in rows]
-
-def update_document_status(doc_id: int, new_status: str):
-    con = _conn(); cur = con.cursor()
-    cur.execute("UPDATE documents SET status=?, updated_at=CURRENT_TIMESTAMP WHERE id=?",
-                (new_status, doc_id))
-    con.commit(); con.close()
-
-def get_document(doc_id: int):
-    con = _conn(); con.row_factory = sqlite3.Row; cur = con.cursor()
-    row = cur.execute("SELECT * FROM documents WHERE id=?", (doc_id,)).fetchone()
-    con.close()
-    return dict(row) if row else {}
-
-
+    order = "DESC" if descending else "ASC"
+    query += f" ORDER BY f.{sort} {order}, f.doc_id {order} LIMIT ?"
+    params.append(int(limit))
+    return fetch_all(query, tuple(params))
+
+def insert_document(doc_type: str, employee_id: int, title: str, context: dict,
+                    status: str = "sent", created_by: str | None = None,
+                    with_payload: bool = True) -> int:
+    """
+    Створює документ (вміст — у payload_blobs) і, за потреби, запис історії в document_payloads,
+    що посилається на той самий payload. Усе — в одній транзакції (або в зовнішній,
+    якщо викликано всередині transaction()).
+    """
+    with transaction():
+        conn = get_connection()
+        payload_id = _pack_context(conn, doc_type, context)
+        doc_id = execute_query("""
+            INSERT INTO documents(type, employee_id, status, title, payload_id, created_by)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (doc_type, employee_id, status, title, payload_id, created_by))
+        _bump_order_sequence(doc_type, (context or {}).get("order_number"))
+        _sync_document_tables(conn, [(doc_id, doc_type, employee_id, status, context)])
+
+        if with_payload:
+            # історія payload (не обовʼязково, але корисно)
+            try:
+                execute_query(
+                    "INSERT INTO document_payloads(document_id, payload_id) VALUES (?, ?)",
+                    (doc_id, payload_id)
+                )
+            except sqlite3.Error:
+                pass
+    return doc_id
 
+def insert_documents_many(items, status: str = "sent", created_by: str | None = None,
+                          with_payload: bool = True) -> list[int]:
+    """
+    Пакетна вставка документів: items — [(doc_type, employee_id, title, context), ...].
+    documents і document_payloads пишуться через executemany в одній транзакції
+    (однакові payload стискаються й зберігаються один раз);
+    id видаються послідовно (під BEGIN IMMEDIATE ніхто інший не пише). Повертає id у порядку items.
+    """
+    items = list(items)
+    if not items:
+        return []
+    with transaction():
+        conn = get_connection()
+        row = conn.execute("""
+            SELECT MAX(IFNULL((SELECT MAX(id) FROM documents), 0),
+                       IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'documents'), 0))
+        """).fetchone()
+        first_id = row[0] + 1
+        doc_ids = list(range(first_id, first_id + len(items)))
+
+        rows = []
+        for doc_id, (doc_type, employee_id, title, context) in zip(doc_ids, items):
+            rows.append((doc_id, doc_type, employee_id, status, title,
+                         _pack_context(conn, doc_type, context), created_by))
+        conn.executemany("""
+            INSERT INTO documents(id, type, employee_id, status, title, payload_id, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+        for doc_type, _, _, context in items:
+            _bump_order_sequence(doc_type, (context or {}).get("order_number"))
+        _sync_document_tables(conn, [(doc_id, doc_type, employee_id, status, context)
+                                     for doc_id, (doc_type, employee_id, _, context) in zip(doc_ids, items)])
+
+        if with_payload:
+            conn.executemany(
+                "INSERT INTO document_payloads(document_id, payload_id) VALUES (?, ?)",
+                [(r[0], r[5]) for r in rows]
+            )
+    return doc_ids
+
+def set_documents_files(files):
+    """Пакетне оновлення file_docx: files — [(doc_id, path), ...]."""
+    files = list(files)
+    if not files:
+        return
+    with transaction():
+        get_connection().executemany(
+            "UPDATE documents SET file_docx = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            [(path, doc_id) for doc_id, path in files]
+        )
+
+def list_employee_documents(employee_id: int, status: str | None = None):
+    """Документи одного працівника (для його кабінету), новіші зверху."""
+    query = """
+        SELECT id, type, title, status, created_at, signed_at
+        FROM documents
+        WHERE employee_id = ?
+    """
+    params = [employee_id]
+    if status:
+        query += " AND status = ?"
+        params.append(status)
+    query += " ORDER BY created_at DESC"
+    return fetch_all(query, tuple(params))
 
+def _sync_document_tables(conn, docs):
+    """
+    Похідні таблиці з вмісту документа: docs — [(doc_id, doc_type, employee_id, status, context), ...].
+    document_fields — для всіх, training_events — для TRAINING, vacation_periods — для підписаних VACATION.
+    """
+    _store_document_fields(conn, [(doc_id, doc_type, context) for doc_id, doc_type, _, _, context in docs])
+    for doc_id, doc_type, employee_id, status, context in docs:
+        if doc_type == "TRAINING":
+            _store_training_event(conn, doc_id, employee_id, status, context)
+        elif doc_type == "VACATION" and status == "signed" and employee_id:
+            _store_vacation_period(conn, doc_id, employee_id, context)
+
+# ---- Періоди відпусток (vacation_periods) ----
+def _store_vacation_period(conn, doc_id: int, employee_id: int, context: dict):
+    """Записує (або оновлює) період відпустки з context підписаного наказу VACATION."""
+    vac = (context or {}).get("vacation") or {}
+    start, end = vac.get("start_date"), vac.get("end_date")
+    try:
+        days = (date.fromisoformat(end) - date.fromisoformat(start)).days + 1
+    except (TypeError, ValueError):
+        print(f"VACATION #{doc_id}: некоректний період відпустки {start!r} — {end!r}")
+        return
+    if days <= 0:
+        return
+    conn.execute("""
+        INSERT INTO vacation_periods(employee_id, doc_id, start_date, end_date, type, days)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(doc_id) DO UPDATE
+           SET employee_id = excluded.employee_id, start_date = excluded.start_date,
+               end_date = excluded.end_date, type = excluded.type, days = excluded.days
+    """, (employee_id, doc_id, start, end, vac.get("type"), days))
 
-def create_document_with_preview(employee_id: int, doc_type: str, title: str,
-                                 context: dict, created_by: str,
-                                 template_path: str, out_dir: str,
-                                 status_on_create: str = "draft"):
+def find_vacation_overlaps(employee_id: int, start_date, end_date):
     """
-    1) створює запис у documents зі status_on_create ('sent' для авто-відправки)
-    2) рендерить чернетку DOCX з контексту
-    3) оновлює file_docx
+    Підписані відпустки працівника, що перетинаються з [start_date; end_date] (включно).
+    Дати — date або 'YYYY-MM-DD'. Рядки: doc_id, start_date, end_date, type, days.
     """
-    out_dir = Path(out_dir); out_dir.mkdir(parents=True, exist_ok=True)
-    con = _conn(); cur = con.cursor()
+    return fetch_all("""
+        SELECT doc_id, start_date, end_date, type, days
+          FROM vacation_periods
+         WHERE employee_id = ?
+           AND start_date <= ?
+           AND end_date   >= ?
+         ORDER BY start_date
+    """, (employee_id, str(end_date), str(start_date)))
+
+def get_current_vacation(employee_id: int, on_date=None):
+    """Період відпустки, що триває на on_date (за замовчуванням — сьогодні), або None."""
+    on_date = str(on_date or date.today())
+    return fetch_one("""
+        SELECT doc_id, start_date, end_date, type, days
+          FROM vacation_periods
+         WHERE employee_id = ?
+           AND start_date <= ?
+           AND end_date   >= ?
+         ORDER BY start_date DESC
+         LIMIT 1
+    """, (employee_id, on_date, on_date))
+
+# ---- Навчання (training_events) ----
+UPCOMING_TRAINING_DAYS = 30
+_TRAINING_ACTIVE = "('sent', 'signed')"   # направлення на підписі або підтверджене
+
+def _store_training_event(conn, doc_id: int, employee_id, status: str, context: dict):
+    """Перезаписує рядок training_events документа TRAINING (без дати початку — рядка немає)."""
+    conn.execute("DELETE FROM training_events WHERE doc_id = ?", (doc_id,))
+    tr = (context or {}).get("training") or {}
+    start = _iso_date(tr.get("start_date"))
+    if not start or not employee_id:
+        return
+    conn.execute(f"""
+        INSERT INTO training_events({_TRAINING_EVENT_COLUMNS})
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (employee_id, doc_id, start, tr.get("end_date") or None, tr.get("title"),
+          tr.get("provider"), tr.get("format"), tr.get("place"), status))
+
+def get_next_training(employee_id: int):
+    """Найближче навчання працівника, що стартує сьогодні чи пізніше (sent/signed), або None."""
+    return fetch_one(f"""
+        SELECT doc_id, start_date, end_date, title, provider, format, place, status
+          FROM training_events
+         WHERE employee_id = ?
+           AND start_date >= DATE('now','localtime')
+           AND status IN {_TRAINING_ACTIVE}
+         ORDER BY start_date
+         LIMIT 1
+    """, (employee_id,))
+
+def list_upcoming_trainings(days: int = UPCOMING_TRAINING_DAYS):
+    """Навчання по всій лікарні, що стартують у найближчі days днів (діапазон по idx_training_events_start)."""
+    return fetch_all(f"""
+        SELECT t.doc_id, t.employee_id,
+               {_FTS_EMPLOYEE_NAME.format(e="e")} AS full_name,
+               d.name AS department,
+               t.start_date, t.end_date, t.title, t.provider, t.status
+          FROM training_events t
+          JOIN employees e ON e.id = t.employee_id
+          LEFT JOIN departments d ON d.id = e.department_id
+         WHERE t.start_date BETWEEN DATE('now','localtime') AND DATE('now','localtime', ?)
+           AND t.status IN {_TRAINING_ACTIVE}
+         ORDER BY t.start_date, e.last_name
+    """, (f"+{int(days)} day",))
+
+# ---- Журнал права на щорічну відпустку (leave_ledger / leave_balances) ----
+ANNUAL_LEAVE_DAYS = 24                   # днів щорічної основної відпустки за робочий рік
+ANNUAL_LEAVE_TYPE = "щорічна основна"    # лише цей вид списується з балансу
+
+def _anniversary(base: date, year: int) -> date:
+    """Річниця з урахуванням 29 лютого (у невисокосний рік — 28.02)."""
+    try:
+        return base.replace(year=year)
+    except ValueError:
+        return date(year, 2, 28)
 
-    cur.execute("""
-        INSERT INTO documents (employee_id, type, title, status, created_by, context_json)
+def leave_work_year(hire_date, anchor) -> tuple:
+    """
+    Робочий рік, у який потрапляє anchor (date або 'YYYY-MM-DD'):
+    - є hire_date: [річниця прийняття; наступна річниця - 1 день]
+    - немає hire_date: календарний рік anchor
+    Повертає два ISO-рядки.
+    """
+    if isinstance(anchor, str):
+        anchor = date.fromisoformat(anchor)
+    try:
+        hired = date.fromisoformat(hire_date) if isinstance(hire_date, str) else hire_date
+    except ValueError:
+        hired = None
+    if not hired:
+        return (date(anchor.year, 1, 1).isoformat(), date(anchor.year, 12, 31).isoformat())
+    start = _anniversary(hired, anchor.year)
+    if anchor < start:
+        start = _anniversary(hired, anchor.year - 1)
+    end = date.fromordinal(_anniversary(hired, start.year + 1).toordinal() - 1)
+    return (start.isoformat(), end.isoformat())
+
+def _post_leave_entry(conn, employee_id: int, work_year: tuple, kind: str, days: int, doc_id=None) -> int:
+    # нарахування й списання ідемпотентні (idx_leave_ledger_accrual / idx_leave_ledger_debit),
+    # повтор просто ігнорується
+    cur = conn.execute("""
+        INSERT INTO leave_ledger(employee_id, work_year_start, work_year_end, kind, days, doc_id)
         VALUES (?, ?, ?, ?, ?, ?)
-    """, (employee_id, doc_type, title, status_on_create, created_by, json.dumps(context, ensure_ascii=False)))
-    doc_id = cur.lastrowid
+        ON CONFLICT DO NOTHING
+    """, (employee_id, work_year[0], work_year[1], kind, days, doc_id))
+    return cur.rowcount
+
+def _post_vacation_debit(conn, doc_id: int, employee_id: int, context: dict, hire_date=None):
+    """Списання днів за підписаним наказом VACATION (лише щорічна основна)."""
+    vac = (context or {}).get("vacation") or {}
+    if (vac.get("type") or "").strip().lower() != ANNUAL_LEAVE_TYPE:
+        return
+    try:
+        start, end = date.fromisoformat(vac["start_date"]), date.fromisoformat(vac["end_date"])
+    except (KeyError, TypeError, ValueError):
+        return
+    days = (end - start).days + 1
+    if days <= 0:
+        return
+    # робочий рік — як у наказі; якщо його там немає — за датою прийняття
+    work_year = (vac.get("work_period_from"), vac.get("work_period_to"))
+    try:
+        date.fromisoformat(work_year[0]); date.fromisoformat(work_year[1])
+    except (TypeError, ValueError):
+        work_year = leave_work_year(hire_date, start)
+    _post_leave_entry(conn, employee_id, work_year, "debit", -days, doc_id)
+
+def _reverse_leave_entries(conn, doc_id: int) -> int:
+    """Сторно всіх ще не сторнованих списань за документом."""
+    cur = conn.execute("""
+        INSERT INTO leave_ledger(employee_id, work_year_start, work_year_end, kind, days, doc_id)
+        SELECT employee_id, work_year_start, work_year_end, 'reversal', -SUM(days), doc_id
+          FROM leave_ledger
+         WHERE doc_id = ? AND kind IN ('debit', 'reversal')
+         GROUP BY employee_id, work_year_start, work_year_end
+        HAVING SUM(days) <> 0
+    """, (doc_id,))
+    return cur.rowcount
+
+def accrue_leave(conn=None, employee_id: int | None = None) -> int:
+    """
+    Нараховує ANNUAL_LEAVE_DAYS за кожен розпочатий робочий рік від hire_date
+    (до звільнення), якого ще немає в журналі. Повертає кількість нових нарахувань.
+    Викликається з run_maintenance і при встановленні hire_date.
+    """
+    conn = conn or get_connection()
+    query = """
+        SELECT e.id, e.hire_date, e.dismissal_date,
+               (SELECT MAX(l.work_year_start) FROM leave_ledger l
+                 WHERE l.employee_id = e.id AND l.kind = 'accrual') AS last_start
+          FROM employees e
+         WHERE e.hire_date IS NOT NULL
+    """
+    params = ()
+    if employee_id is not None:
+        query += " AND e.id = ?"
+        params = (employee_id,)
+
+    today = date.today()
+    added = 0
+    for emp_id, hire_date, dismissal_date, last_start in conn.execute(query, params).fetchall():
+        try:
+            hired = date.fromisoformat(hire_date)
+            until = min(today, date.fromisoformat(dismissal_date)) if dismissal_date else today
+        except ValueError:
+            continue
+        year = hired.year if last_start is None else date.fromisoformat(last_start).year + 1
+        while True:
+            start = _anniversary(hired, year)
+            if start > until:
+                break
+            added += _post_leave_entry(conn, emp_id, leave_work_year(hired, start),
+                                       "accrual", ANNUAL_LEAVE_DAYS)
+            year += 1
+    return added
+
+def rebuild_leave_balances(conn=None):
+    """Перераховує leave_balances з leave_ledger (ручне відновлення)."""
+    conn = conn or get_connection()
+    conn.execute("DELETE FROM leave_balances")
+    conn.execute("""
+        INSERT INTO leave_balances(employee_id, work_year_start, work_year_end, accrued, used)
+        SELECT employee_id, work_year_start, MAX(work_year_end),
+               SUM(CASE WHEN kind = 'accrual' THEN days ELSE 0 END),
+               -SUM(CASE WHEN kind = 'accrual' THEN 0 ELSE days END)
+          FROM leave_ledger
+         GROUP BY employee_id, work_year_start
+    """)
+
+def get_leave_balance(employee_id: int, anchor=None) -> dict:
+    """
+    Баланс щорічної основної відпустки за робочий рік, у який потрапляє anchor
+    (за замовчуванням — сьогодні): {work_year_start, work_year_end, accrued, used, remaining}.
+    Якщо рік ще не нараховано — accrued = ANNUAL_LEAVE_DAYS (право за законом).
+    """
+    emp = fetch_one("SELECT hire_date FROM employees WHERE id = ?", (employee_id,)) or {}
+    work_year = leave_work_year(emp.get("hire_date"), anchor or date.today())
+    row = fetch_one("""
+        SELECT accrued, used FROM leave_balances
+         WHERE employee_id = ? AND work_year_start = ?
+    """, (employee_id, work_year[0])) or {}
+    accrued = row.get("accrued") or ANNUAL_LEAVE_DAYS
+    used = row.get("used") or 0
+    return {
+        "work_year_start": work_year[0],
+        "work_year_end": work_year[1],
+        "accrued": accrued,
+        "used": used,
+        "remaining": accrued - used,
+    }
+
+def list_leave_balances(search: str | None = None, department: str | None = None):
+    """
+    Звіт HR: активні працівники з балансом поточного робочого року
+    (по одному пошуку за PK leave_balances на працівника). Поля балансу — None,
+    якщо рік ще не нараховано (немає hire_date або регламент ще не відпрацював).
+    """
+    query = f"""
+        SELECT e.id,
+               {_FTS_EMPLOYEE_NAME.format(e="e")} AS full_name,
+               d.name AS department,
+               p.name AS position,
+               e.hire_date,
+               b.work_year_start, b.work_year_end, b.accrued, b.used,
+               b.accrued - b.used AS remaining
+          FROM employees e
+          LEFT JOIN departments d ON d.id = e.department_id
+          LEFT JOIN positions   p ON p.id = e.position_id
+          LEFT JOIN leave_balances b
+            ON b.employee_id = e.id
+           AND b.work_year_start = (SELECT MAX(work_year_start) FROM leave_balances
+                                     WHERE employee_id = e.id
+                                       AND work_year_start <= DATE('now','localtime'))
+           AND b.work_year_end >= DATE('now','localtime')
+         WHERE e.employment_status = 'активний'
+    """
+    params = []
+    match = fts_query(search)
+    if match:
+        query += " AND e.id IN (SELECT rowid FROM employees_fts WHERE employees_fts MATCH ?)"
+        params.append(match)
+    if department:
+        query += " AND d.name = ?"
+        params.append(department)
+    query += " ORDER BY e.last_name, e.first_name"
+    return fetch_all(query, tuple(params))
+
+REVOCABLE_SIGNED_TYPES = ("VACATION", "TRAINING")   # підписані, які можна скасувати
+
+def reject_document(doc_id: int) -> str:
+    """
+    Відхиляє документ (status='rejected') однією транзакцією:
+    - 'sent' — будь-якого типу (працівник/HR відмовились від підпису);
+    - 'signed' — лише накази з REVOCABLE_SIGNED_TYPES: VACATION (період знімається
+      тригером, списані дні повертаються сторно-записом у leave_ledger) і TRAINING
+      (подія в training_events отримує статус 'rejected' тригером).
+    Повертає тип документа.
+    """
+    with transaction():
+        doc = fetch_one("SELECT id, type, status FROM documents WHERE id = ?", (doc_id,))
+        if not doc:
+            raise RuntimeError("Документ не знайдено.")
+        if doc["status"] == "signed" and doc["type"] not in REVOCABLE_SIGNED_TYPES:
+            raise RuntimeError("Серед підписаних можна скасувати лише наказ про відпустку чи направлення на навчання.")
+        if doc["status"] not in ("sent", "signed"):
+            raise RuntimeError("Відхилити можна лише документи зі статусом 'sent' або 'signed'.")
+        execute_query(
+            "UPDATE documents SET status='rejected', updated_at=CURRENT_TIMESTAMP WHERE id=?",
+            (doc_id,)
+        )
+        _reverse_leave_entries(get_connection(), doc_id)
+    return doc["type"]
 
-    out_path = out_dir / f"emp_{employee_id:04d}_doc_{doc_id:06d}_draft.docx"
-    tpl = DocxTemplate(template_path)
-    tpl.render(context)
-    tpl.save(out_path)
+def update_document_status(doc_id: int, new_status: str):
+    execute_query("UPDATE documents SET status=?, updated_at=CURRENT_TIMESTAMP WHERE id=?",
+                  (new_status, doc_id))
 
-    cur.execute("UPDATE documents SET file_docx=?, updated_at=CURRENT_TIMESTAMP WHERE id=?",
-                (str(out_path), doc_id))
-    con.commit(); con.close()
-    return doc_id, str(out_path)
+def get_document(doc_id: int):
+    """Документ за id; context_json — розпакований з payload_blobs JSON-рядок."""
+    doc = fetch_one("SELECT * FROM documents WHERE id=?", (doc_id,)) or {}
+    if doc.get("payload_id") is not None:
+        doc["context_json"] = _load_payload(get_connection(), doc["payload_id"])
+    return doc
 
 
+def sign_document(doc_id: int, signed_by: str, context: dict, file_path: str, file_hash: str):
+    """
+    Фіксує підпис працівника однією транзакцією:
+    - documents: status='signed', signed_by/signed_at, file_docx, payload (новий вміст — у payload_blobs)
+    - P4: працівник звільнений, акаунт деактивовано
+    - hire_date працівника (якщо ще не стоїть) + нарахування відпустки
+    - VACATION: період у vacation_periods, списання днів у leave_ledger
+    - запис у signatures з хешем фінального DOCX
+    Повертає тип документа.
+    """
+    with transaction():
+        doc = fetch_one("SELECT id, type, employee_id, status FROM documents WHERE id = ?", (doc_id,))
+        if not doc:
+            raise RuntimeError("Документ не знайдено.")
+        if doc["status"] != "sent":
+            # вже підписаний в іншому вікні/на іншому ПК
+            raise RuntimeError("Підписувати можна лише документи зі статусом 'sent'.")
+        employee_id = doc["employee_id"]
+
+        conn = get_connection()
+        execute_query(
+            "UPDATE documents SET status='signed', signed_by=?, signed_at=CURRENT_TIMESTAMP, "
+            "file_docx=?, payload_id=?, context_json=NULL, updated_at=CURRENT_TIMESTAMP WHERE id=?",
+            (signed_by, file_path, _pack_context(conn, doc["type"], context), doc_id)
+        )
+        # document_fields, training_events, для VACATION — період у vacation_periods
+        _sync_document_tables(conn, [(doc_id, doc["type"], employee_id, "signed", context)])
+
+        if doc["type"] == "P4":
+            execute_query("""
+                UPDATE employees
+                SET dismissal_date = DATE('now'),
+                    employment_status = 'звільнений',
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (employee_id,))
+            execute_query("UPDATE users SET is_active = 0 WHERE employee_id = ?", (employee_id,))
+
+        hire_date = context.get("hire_date") or context.get("start_date")
+        if hire_date:
+            execute_query(
+                "UPDATE employees SET hire_date = COALESCE(hire_date, ?) WHERE id = ?",
+                (hire_date, employee_id)
+            )
+            accrue_leave(employee_id=employee_id)
+
+        if doc["type"] == "VACATION" and employee_id:
+            # списання днів з балансу робочого року
+            emp = fetch_one("SELECT hire_date FROM employees WHERE id = ?", (employee_id,)) or {}
+            _post_vacation_debit(conn, doc_id, employee_id, context, emp.get("hire_date"))
+
+        user = fetch_one("SELECT id, role FROM users WHERE username = ?", (signed_by,))
+        execute_query(
+            "INSERT INTO signatures(document_id, user_id, role, signature_data) VALUES (?, ?, ?, ?)",
+            (
+                doc_id,
+                user["id"] if user else None,
+                (user["role"] if user else "employee") or "employee",
+                json.dumps({
+                    "method": "click-to-sign",
+                    "file_hash_sha256": file_hash,
+                    "file_path": file_path,
+                }, ensure_ascii=False),
+            )
+        )
+    return doc["type"]
 
 
 # --- Довідники ---
 def get_departments_list():
-    con = _conn(); con.row_factory = sqlite3.Row; cur = con.cursor()
-    rows = cur.execute("SELECT id, name FROM departments ORDER BY name").fetchall()
-    con.close()
-    return [dict(r) for r in rows]
-
-def get_positions_by_department(department_id: int):
-    con = _conn(); con.row_factory = sqlite3.Row; cur = con.cursor()
-    rows = cur.execute("""
-        SELECT p.id, p.name
-        FROM positions p
-        JOIN department_positions dp ON dp.position_id = p.id
-        WHERE dp.department_id = ?
-        ORDER BY p.name
-    """, (department_id,)).fetchall()
-    con.close()
-    return [dict(r) for r in rows]
+    return get_departments()
 
 def get_employee_by_email(email: str):
-    con = _conn(); con.row_factory = sqlite3.Row; cur = con.cursor()
-    row = cur.execute("SELECT * FROM employees WHERE email = ?", (email,)).fetchone()
-    con.close()
-    return dict(row) if row else None
+    return fetch_one("SELECT * FROM employees WHERE email = ?", (email,))
 
 def create_employee_minimal(last_name: str, first_name: str, middle_name: str,
                             email: str, phone: str, department_id: int, position_id: int):
-    con = _conn(); cur = con.cursor()
-    cur.execute("""
+    return execute_query("""
         INSERT INTO employees(last_name, first_name, middle_name, email, phone, department_id, position_id)
         VALUES (?, ?, ?, ?, ?, ?, ?)
     """, (last_name, first_name, middle_name, email, phone, department_id, position_id))
-    emp_id = cur.lastrowid
-    con.commit(); con.close()
-    return emp_id
 
 def create_user_for_employee(username: str, password: str, role: str, employee_id: int):
-    con = _conn(); cur = con.cursor()
-    cur.execute("""
+    execute_query("""
         INSERT INTO users(username, password, role, is_active, employee_id)
         VALUES (?, ?, ?, 1, ?)
     """, (username, password, role, employee_id))
-    con.commit(); con.close()
 
 def suggest_username(email: str, last_name: str, first_name: str) -> str:
     if email and "@" in email:
@@ -500,153 +2418,120 @@ def get_setting(key: str):
     return row["value"] if row else None
 
 
-def get_next_p1_order_number():
-    """
-    Повертає наступний номер П-1 у форматі 'N/YYYY'.
-    Читаємо останній з documents.context_json → $.order_number.
-    """
-    y = date.today().year
-    row = fetch_one(
-        """
-        SELECT COALESCE(
-            MAX(
-                CAST(
-                    SUBSTR(
-                        json_extract(context_json, '$.order_number'),
-                        1,
-                        INSTR(json_extract(context_json, '$.order_number'), '/') - 1
-                    ) AS INTEGER
-                )
-            ),
-            0
-        ) AS max_seq
-        FROM documents
-        WHERE type = 'P1'
-          AND json_extract(context_json, '$.order_number') LIKE ?
-        """,
-        (f'%/{y}',)
-    )
-    next_seq = (row["max_seq"] if row else 0) + 1
-    return f"{next_seq}/{y}"
+# ===== Номери наказів (order_sequences) =====
+def _parse_order_number(order_no) -> tuple[int, int] | None:
+    """'15/2025' → (15, 2025); інші формати → None."""
+    seq, sep, year = str(order_no or "").strip().partition("/")
+    if not sep or not seq.strip().isdigit() or not year.strip().isdigit():
+        return None
+    return int(seq), int(year)
 
 
-def get_next_p4_order_number():
+def _bump_order_sequence(doc_type: str, order_no):
     """
-    Повертає наступний номер П-4 у форматі 'N/YYYY', шукаючи в documents.context_json → $.order_number
-    для type='P4' у поточному році.
+    Підтягує лічильник (doc_type, рік) до номера щойно вставленого документа.
+    Викликається всередині транзакції вставки документа — тож атомарно з нею.
     """
+    parsed = _parse_order_number(order_no)
+    if not parsed:
+        return
+    seq, year = parsed
+    execute_query("""
+        INSERT INTO order_sequences(doc_type, year, last_number) VALUES (?, ?, ?)
+        ON CONFLICT(doc_type, year) DO UPDATE
+           SET last_number = MAX(last_number, excluded.last_number)
+    """, (doc_type, year, seq))
+
+
+def get_next_order_number(doc_type: str) -> str:
+    """Пропозиція наступного номера 'N/YYYY' для типу документа (O(1): один рядок за PK)."""
     y = date.today().year
     row = fetch_one(
-        """
-        SELECT COALESCE(
-            MAX(
-                CAST(
-                    SUBSTR(
-                        json_extract(context_json, '$.order_number'),
-                        1,
-                        INSTR(json_extract(context_json, '$.order_number'), '/') - 1
-                    ) AS INTEGER
-                )
-            ),
-            0
-        ) AS max_seq
-        FROM documents
-        WHERE type = 'P4'
-          AND json_extract(context_json, '$.order_number') LIKE ?
-        """,
-        (f'%/{y}',)
+        "SELECT last_number FROM order_sequences WHERE doc_type = ? AND year = ?",
+        (doc_type, y)
     )
-    next_seq = (row["max_seq"] if row else 0) + 1
+    next_seq = (row["last_number"] if row else 0) + 1
     return f"{next_seq}/{y}"
 
 
-def get_next_training_order_number():
-    """
-    Повертає наступний номер для направлення на підвищення кваліфікації у форматі 'N/YYYY'.
-    Шукає у documents.context_json → $.order_number для type='TRAINING' у поточному році.
-    """
-    y = date.today().year
-    row = fetch_one(
-        """
-        SELECT COALESCE(
-            MAX(
-                CAST(
-                    SUBSTR(
-                        json_extract(context_json, '$.order_number'),
-                        1,
-                        INSTR(json_extract(context_json, '$.order_number'), '/') - 1
-                    ) AS INTEGER
-                )
-            ),
-            0
-        ) AS max_seq
-        FROM documents
-        WHERE type = 'TRAINING'
-          AND json_extract(context_json, '$.order_number') LIKE ?
-        """,
-        (f'%/{y}',)
-    )
-    next_seq = (row["max_seq"] if row else 0) + 1
-    return f"{next_seq}/{y}"
+def reserve_order_number(doc_type: str) -> str:
+    """Атомарно видає наступний номер (лічильник одразу збільшується)."""
+    return reserve_order_numbers(doc_type, 1)[0]
 
-def get_next_vacation_order_number():
-    """
-    Повертає наступний номер наказу про відпустку у форматі 'N/YYYY',
-    шукаючи в documents.context_json → $.order_number для type='VACATION' у поточному році.
-    """
+
+def reserve_order_numbers(doc_type: str, count: int) -> list[str]:
+    """Атомарно видає count послідовних номерів 'N/YYYY' одним оновленням лічильника."""
+    if count <= 0:
+        return []
     y = date.today().year
-    row = fetch_one(
-        """
-        SELECT COALESCE(
-            MAX(
-                CAST(
-                    SUBSTR(
-                        json_extract(context_json, '$.order_number'),
-                        1,
-                        INSTR(json_extract(context_json, '$.order_number'), '/') - 1
-                    ) AS INTEGER
-                )
-            ),
-            0
-        ) AS max_seq
-        FROM documents
-        WHERE type = 'VACATION'
-          AND json_extract(context_json, '$.order_number') LIKE ?
-        """,
-        (f'%/{y}',)
-    )
-    next_seq = (row["max_seq"] if row else 0) + 1
-    return f"{next_seq}/{y}"
+    with transaction():
+        execute_query("""
+            INSERT INTO order_sequences(doc_type, year, last_number) VALUES (?, ?, ?)
+            ON CONFLICT(doc_type, year) DO UPDATE SET last_number = last_number + excluded.last_number
+        """, (doc_type, y, count))
+        row = fetch_one(
+            "SELECT last_number FROM order_sequences WHERE doc_type = ? AND year = ?",
+            (doc_type, y)
+        )
+    last = row["last_number"]
+    return [f"{n}/{y}" for n in range(last - count + 1, last + 1)]
 
 
+def get_next_p1_order_number():
+    """Повертає наступний номер П-1 у форматі 'N/YYYY'."""
+    return get_next_order_number("P1")
 
 
+def get_next_p4_order_number():
+    """Повертає наступний номер П-4 у форматі 'N/YYYY'."""
+    return get_next_order_number("P4")
+
+
+def get_next_training_order_number():
+    """Повертає наступний номер для направлення на підвищення кваліфікації у форматі 'N/YYYY'."""
+    return get_next_order_number("TRAINING")
+
+def get_next_vacation_order_number():
+    """Повертає наступний номер наказу про відпустку у форматі 'N/YYYY'."""
+    return get_next_order_number("VACATION")
 
 
 def order_number_exists_p1(order_no: str) -> bool:
     """
-    Чи існує вже такий номер у П-1 (у context_json)?
+    Чи існує вже такий номер у П-1? (індекс idx_document_fields_type_order_number)
     """
     row = fetch_one(
-        """
-        SELECT COUNT(*) AS c
-        FROM documents
-        WHERE type = 'P1'
-          AND json_extract(context_json, '$.order_number') = ?
-        """,
+        "SELECT 1 AS x FROM document_fields WHERE doc_type = 'P1' AND order_number = ? LIMIT 1",
         (order_no,)
     )
-    return (row and row["c"] > 0)
+    return row is not None
 
 
 
 
 
 # ===== Internships =====
+# Терміновість стажування (лише active): днів до planned_end_date і кошик підсвітки.
+# Одні й ті самі вирази — для таблиці вкладки і для лічильників бейджа.
+URGENCY_BUCKETS = ("overdue", "critical", "very_soon", "due_soon")
+URGENCY_HORIZON_DAYS = 14
+
+_INTERNSHIP_DAYS_LEFT = "CAST(julianday(i.planned_end_date) - julianday(DATE('now','localtime')) AS INTEGER)"
+_INTERNSHIP_URGENCY = f"""
+    CASE WHEN i.status <> 'active' THEN NULL
+         WHEN {_INTERNSHIP_DAYS_LEFT} < 0  THEN 'overdue'      -- прострочено
+         WHEN {_INTERNSHIP_DAYS_LEFT} <= 1 THEN 'critical'     -- 0–1 день
+         WHEN {_INTERNSHIP_DAYS_LEFT} <= 6 THEN 'very_soon'    -- 2–6 днів
+         WHEN {_INTERNSHIP_DAYS_LEFT} <= {URGENCY_HORIZON_DAYS} THEN 'due_soon'  -- 7–14 днів
+    END"""
+
 def list_internships(status: str | None = None, search: str | None = None):
-    q = """
+    """Рядки вкладки «Стажування» з days_left і urgency, порахованими в SQL."""
+    q = f"""
         SELECT i.id, i.employee_id, i.start_date, i.months,
                i.planned_end_date, i.status, IFNULL(i.notes,'') AS notes,
+               {_INTERNSHIP_DAYS_LEFT} AS days_left,
+               {_INTERNSHIP_URGENCY} AS urgency,
                (e.last_name || ' ' || e.first_name || ' ' || IFNULL(e.middle_name,'')) AS full_name,
                d.name AS department_name, p.name AS position_name
         FROM internships i
@@ -667,15 +2552,6 @@ def list_internships(status: str | None = None, search: str | None = None):
     return fetch_all(q, tuple(params))
 
 
-def auto_complete_overdue():
-    """Усі active з простроченим planned_end_date → completed."""
-    return execute_query("""
-        UPDATE internships
-           SET status='completed', updated_at=CURRENT_TIMESTAMP
-         WHERE status='active' AND DATE(planned_end_date) < DATE('now')
-    """)
-
-
 def extend_internship(internship_id: int, add_months: int, note: str = ""):
     """+N місяців до planned_end_date; статус лишається active."""
     return execute_query("""
@@ -710,39 +2586,101 @@ def fail_internship(internship_id: int, note: str = ""):
 
 def auto_complete_overdue() -> int:
     """
-    Завершує всі активні стажування, у яких planned_end_date < сьогодні.
-    Повертає кількість оновлених рядків.
-    """
-    from contextlib import closing
-    with closing(sqlite3.connect(DB_PATH)) as con, closing(con.cursor()) as cur:
-        cur.execute("""
-            UPDATE internships
-            SET status = 'completed',
-                updated_at = CURRENT_TIMESTAMP
-            WHERE status = 'active'
-              AND DATE(planned_end_date) < DATE('now')
-        """)
-        con.commit()
+    Завершує всі активні стажування, у яких planned_end_date < сьогодні (за місцевим часом).
+    Повертає кількість оновлених рядків. Викликається з run_maintenance(), не з екранів.
+    """
+    conn = get_connection()
+    with closing(conn.cursor()) as cur:
+        try:
+            cur.execute("""
+                UPDATE internships
+                SET status = 'completed',
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'active'
+                  AND planned_end_date < DATE('now','localtime')   -- «сьогодні» як у _INTERNSHIP_DAYS_LEFT
+            """)
+            _commit(conn)
+        except Exception:
+            _rollback(conn)
+            raise
         return cur.rowcount or 0
 
 
-# лічильники
-def internships_overdue_count():
+# ===== Регламентні задачі =====
+MAINTENANCE_LAST_RUN_KEY = "maintenance.last_run"
+MAINTENANCE_INTERVAL_KEY = "maintenance.interval_hours"
+MAINTENANCE_INTERVAL_HOURS = 24
+
+
+def _maintenance_due(interval_hours: float) -> bool:
     row = fetch_one("""
-        SELECT COUNT(*) AS c
-        FROM internships
-        WHERE status='active' AND DATE(planned_end_date) < DATE('now')
+        SELECT value IS NULL OR value <= DATETIME('now', ?) AS due
+          FROM (SELECT (SELECT value FROM app_settings WHERE key = ?) AS value)
+    """, (f"-{float(interval_hours)} hours", MAINTENANCE_LAST_RUN_KEY))
+    return bool(row["due"])
+
+
+def run_maintenance(force: bool = False) -> dict | None:
+    """
+    Регламентні записи, винесені зі шляхів читання (екрани лише читають):
+      - прострочені активні стажування → completed;
+      - обрізання журналу змін change_log;
+      - нарахування щорічної відпустки за нові робочі роки (leave_ledger);
+      - словники стиснення для нових типів документів і видалення payload без посилань.
+    Виконується не частіше ніж раз на app_settings['maintenance.interval_hours']
+    (за замовчуванням 24 год); час останнього запуску — app_settings['maintenance.last_run'].
+    Повертає {задача: результат} або None, якщо ще не час.
+    """
+    try:
+        interval = float(get_setting(MAINTENANCE_INTERVAL_KEY) or MAINTENANCE_INTERVAL_HOURS)
+    except ValueError:
+        interval = MAINTENANCE_INTERVAL_HOURS
+    if not force and not _maintenance_due(interval):
+        return None   # дешева перевірка без блокування запису
+
+    with transaction():
+        # під блокуванням перевіряємо ще раз — інше робоче місце могло встигнути
+        if not force and not _maintenance_due(interval):
+            return None
+        result = {
+            "internships_completed": auto_complete_overdue(),
+            "change_log_pruned": prune_change_log(),
+            "leave_accrued": accrue_leave(),
+            "payload_dicts_trained": len(train_payload_dictionaries()),
+            "payloads_pruned": prune_payloads(),
+        }
+        execute_query("""
+            INSERT INTO app_settings(key, value) VALUES (?, DATETIME('now'))
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """, (MAINTENANCE_LAST_RUN_KEY,))
+    return result
+
+
+# лічильники
+def internship_urgency_counts() -> dict:
+    """
+    Активні стажування за кошиками терміновості одним проходом по
+    idx_internships_status_end: {overdue, critical, very_soon, due_soon}.
+    """
+    rows = fetch_all(f"""
+        SELECT {_INTERNSHIP_URGENCY} AS urgency, COUNT(*) AS c
+          FROM internships i
+         WHERE i.status = 'active'
+           AND i.planned_end_date <= DATE('now','localtime','+{URGENCY_HORIZON_DAYS} day')
+         GROUP BY urgency
     """)
-    return row["c"] if row else 0
+    counts = dict.fromkeys(URGENCY_BUCKETS, 0)
+    for r in rows:
+        if r["urgency"] in counts:
+            counts[r["urgency"]] = r["c"]
+    return counts
+
+def internships_overdue_count():
+    return internship_urgency_counts()["overdue"]
 
 def internships_soon_count():
-    row = fetch_one("""
-        SELECT COUNT(*) AS c
-        FROM internships
-        WHERE status='active'
-          AND DATE(planned_end_date) BETWEEN DATE('now') AND DATE('now','+14 day')
-    """)
-    return row["c"] if row else 0
+    counts = internship_urgency_counts()
+    return counts["critical"] + counts["very_soon"] + counts["due_soon"]
 
 def docs_sent_count():
     row = fetch_one("""
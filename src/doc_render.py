@@ -0,0 +1,220 @@
+# src/doc_render.py
+"""
+Рендер DOCX документів працівника без залежності від Tk.
+
+Тут зібрано нормалізацію контексту під шаблони (спільну для прев'ю і
+підпису) та сам рендер — функції можна викликати з фонового потоку.
+"""
+import hashlib
+from datetime import datetime
+from pathlib import Path
+
+import db_manager as db
+from template_cache import get_template
+
+TEMPLATES_MAP = {
+    "P1": Path("data/templates/hire_order_P1.docx"),  # ← за потреби змінити назву файла шаблону
+    "P4": Path("data/templates/dismissal_order_P4.docx"),
+    "INTERNSHIP_REFERRAL": Path("data/templates/internship_assignment.docx"),
+    "TRAINING": Path("data/templates/training_referral.docx"),
+    "VACATION": Path("data/templates/vacation_order.docx"),
+}
+
+
+def fmt_dmy(iso: str | None) -> str:
+    """'YYYY-MM-DD' -> 'ДД.ММ.РРРР' (інший формат повертаємо як є)."""
+    if not iso:
+        return ""
+    try:
+        d = datetime.strptime(iso, "%Y-%m-%d")
+        return f"{d.day:02d}.{d.month:02d}.{d.year}"
+    except Exception:
+        return iso
+
+
+def cb(flag: bool) -> str:
+    return "☑" if bool(flag) else "☐"
+
+
+def get_template_path(doc_type: str) -> Path:
+    tpl_path = TEMPLATES_MAP.get(doc_type)
+    if not tpl_path or not tpl_path.exists():
+        raise RuntimeError(f"Не знайдено шаблон для типу '{doc_type}'. Перевір TEMPLATES_MAP.")
+    return tpl_path
+
+
+def director_full_name() -> str:
+    """ПІБ керівника: DIRECTOR_FULL_NAME -> director_employee_id -> штатний директор."""
+    val = None
+    # 1) текстове налаштування (якщо комусь так зручніше)
+    try:
+        val = db.get_setting("DIRECTOR_FULL_NAME")
+    except Exception:
+        val = None
+    # 2) id працівника- директора → ПІБ з employees
+    if not val:
+        try:
+            dir_id = db.get_setting("director_employee_id")
+            if dir_id:
+                row = db.fetch_one("""
+                    SELECT TRIM(
+                        COALESCE(last_name,'') || ' ' ||
+                        COALESCE(first_name,'') ||
+                        CASE WHEN IFNULL(middle_name,'')<>'' THEN ' '||middle_name ELSE '' END
+                    ) AS full_name
+                    FROM employees
+                    WHERE id = ?
+                """, (dir_id,))
+                val = (row or {}).get("full_name")
+        except Exception:
+            pass
+    # 3) резервний спосіб (якщо реалізовано в db_manager)
+    if not val:
+        try:
+            val = db.get_active_director_name()
+        except Exception:
+            val = None
+    return val or ""
+
+
+def build_template_context(doc_type: str, context: dict) -> dict:
+    """
+    Нормалізує payload документа під шаблон:
+    - department.name / position.name
+    - hire_date_str / start_date_str / contract_until_str (ДД.ММ.РРРР)
+    - чекбокси cb_*
+    - salary/work/інші текстові поля
+    - плейсхолдери підпису employee_sign_* і director_full_name
+    - секції training / vacation для відповідних типів
+    Вихідний context не змінюється.
+    """
+    src = dict(context or {})
+    emp = (src.get("employee") or {}) if isinstance(src.get("employee"), dict) else {}
+    ctx = dict(src)
+
+    # 1) Об'єкти з .name для {{ department.name }} і {{ position.name }}
+    ctx.setdefault("department", {"name": emp.get("department_name", "")})
+    ctx.setdefault("position",   {"name": emp.get("position_name", "")})
+
+    # 2) ПІБ у плоских полях (на всякий випадок)
+    ctx.setdefault("last_name",   emp.get("last_name", ""))
+    ctx.setdefault("first_name",  emp.get("first_name", ""))
+    ctx.setdefault("middle_name", emp.get("middle_name", ""))
+
+    # 3) Рядкові дати з ISO → ДД.ММ.РРРР
+    # hire_date_str у шапці (“від …”) — беремо з order_date, якщо є, інакше hire_date
+    ctx.setdefault("hire_date_str",  fmt_dmy(src.get("order_date") or src.get("hire_date")))
+    # start_date_str (“Прийняти на роботу з …”) — з hire_date
+    ctx.setdefault("start_date_str", fmt_dmy(src.get("hire_date")))
+    ctx.setdefault("contract_until_str", fmt_dmy(src.get("contract_until")))
+
+    # 4) Чекбокси умов
+    ctx["cb_competition"] = cb(src.get("is_competition"))
+    ctx["cb_contract"]    = cb(src.get("is_contract"))
+    ctx["cb_probation"]   = cb(src.get("is_probation"))
+    ctx["cb_absence"]     = cb(src.get("is_absence"))
+    ctx["cb_reserve"]     = cb(src.get("is_reserve"))
+    ctx["cb_internship"]  = cb(src.get("is_internship"))
+    ctx["cb_transfer"]    = cb(src.get("is_transfer"))
+    ctx["cb_other"]       = cb(src.get("is_other"))
+
+    is_main = bool(src.get("is_main_job"))
+    ctx["cb_work_main"]      = cb(is_main)
+    ctx["cb_work_secondary"] = cb(not is_main)
+    # якщо треба — тут можна вивести логіку повного робочого часу
+    ctx["cb_worktime_full"]  = cb(False)
+
+    # 5) Текстові/числові поля
+    ctx.setdefault("probation_months", src.get("probation_months", ""))
+    ctx.setdefault("other_text",       src.get("other_text", ""))
+    ctx.setdefault("work_hours",       src.get("work_hours", ""))
+    ctx.setdefault("work_minutes",     src.get("work_minutes", ""))
+    ctx.setdefault("salary_grn",       src.get("salary_grn", ""))
+    ctx.setdefault("salary_kop",       src.get("salary_kop", ""))
+    ctx.setdefault("order_number",     src.get("order_number", ""))
+
+    # 6) Підпис працівника (у прев'ю непідписаного документа — порожньо)
+    ctx.setdefault("employee_sign_day",   "")
+    ctx.setdefault("employee_sign_month", "")
+    ctx.setdefault("employee_sign_year",  "")
+
+    # 7) Директор
+    ctx.setdefault("director_full_name", "")
+
+    # --- TRAINING ---
+    if doc_type == "TRAINING":
+        tr = dict((src.get("training") or {}))
+
+        ctx["order_date_str"] = fmt_dmy(src.get("order_date"))
+        s = fmt_dmy(tr.get("start_date"))
+        e = fmt_dmy(tr.get("end_date"))
+        tr["start_date_str"] = s
+        tr["end_date_str"]   = e
+        tr["period_str"]     = f"{s} — {e}" if (s and e) else (s or e or "")
+
+        # Підписані ярлики (щоб у шаблоні було просто підставити)
+        tr["format_label"]  = tr.get("format")  or ""
+        tr["mode_label"]    = tr.get("mode")    or ""
+        tr["funding_label"] = tr.get("funding") or ""
+
+        # Години / вартість
+        hours_raw = (tr.get("planned_hours") or "").strip()
+        tr["hours_str"] = f"{hours_raw} акад. год." if hours_raw else ""
+
+        cost_raw = (tr.get("estimated_cost") or "").strip()
+        tr["estimated_cost"] = cost_raw  # (якщо хочеш, додай ' грн' прямо в шаблоні)
+
+        ctx["training"] = tr
+
+    # --- Fallback для ПІБ керівника ---
+    if not ctx.get("director_full_name"):
+        ctx["director_full_name"] = director_full_name()
+
+    # --- VACATION ---
+    if doc_type == "VACATION":
+        vac = dict(src.get("vacation") or {})
+
+        ctx["order_date_str"] = fmt_dmy(src.get("order_date"))
+
+        def _range_str(a, b):
+            a_str = fmt_dmy(a); b_str = fmt_dmy(b)
+            if a_str and b_str:
+                return f"{a_str} — {b_str}"
+            return a_str or b_str or ""
+
+        # Періоди у зручних рядках
+        vac["work_period_str"] = _range_str(vac.get("work_period_from"), vac.get("work_period_to"))
+        vac["period_str"]      = _range_str(vac.get("start_date"),       vac.get("end_date"))
+
+        # Кількість днів + чекбокс матдопомоги
+        td = (vac.get("total_days") or "").strip()
+        vac["total_days_str"]    = f"{td} календарних днів" if td else ""
+        vac["material_aid_mark"] = "☑" if vac.get("material_aid") else "☐"
+        vac["work_period_start_str"] = fmt_dmy(vac.get("work_period_from"))
+        vac["work_period_end_str"]   = fmt_dmy(vac.get("work_period_to"))
+        vac["start_date_str"]        = fmt_dmy(vac.get("start_date"))
+        vac["end_date_str"]          = fmt_dmy(vac.get("end_date"))
+        vac["type_label"]            = vac.get("type") or ""
+        ctx["cb_health_aid"]         = "☑" if vac.get("material_aid") else "☐"
+        vac.setdefault("health_aid_amount", "")
+
+        ctx["vacation"] = vac
+
+    return ctx
+
+
+def render_document(doc_type: str, context: dict, out_path) -> str:
+    """Нормалізує контекст і зберігає DOCX у out_path. Нічого не змінює в БД."""
+    tpl_path = get_template_path(doc_type)
+    tpl = get_template(tpl_path)
+    tpl.render(build_template_context(doc_type, context))
+    tpl.save(str(out_path))
+    return str(out_path)
+
+
+def file_sha256(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
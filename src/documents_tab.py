@@ -5,6 +5,7 @@ from tkinter import ttk, messagebox
 from datetime import date, datetime
 from pathlib import Path
 import db_manager as db
+from virtual_table import VirtualTable
 from p1_create_form import P1CreateForm
 from p4_create_form import P4CreateForm
 from training_referral_form import TrainingReferralForm
@@ -67,7 +68,7 @@ class DocumentsTab(ctk.CTkFrame):
         self.status_var = ctk.StringVar(value="усі")
         ctk.CTkLabel(bar, text="   Статус:").pack(side="left", padx=(6,4))
         self.status_filter = ctk.CTkComboBox(
-            bar, values=["усі","sent","signed"],
+            bar, values=["усі","sent","signed","rejected"],
             variable=self.status_var, width=130, command=lambda _=None: self.refresh()
         )
         self.status_filter.pack(side="left")
@@ -81,6 +82,9 @@ class DocumentsTab(ctk.CTkFrame):
 
         # refresh
         ctk.CTkButton(bar, text="Оновити", width=100, command=self.refresh).pack(side="right")
+        # відхилення надісланого / скасування підписаного наказу про відпустку
+        ctk.CTkButton(bar, text="Відхилити", width=100, fg_color="#8B3A3A", hover_color="#6E2E2E",
+                      command=self.reject_selected).pack(side="right", padx=6)
 
         # Table
         table_wrap = ctk.CTkFrame(self)
@@ -96,24 +100,73 @@ class DocumentsTab(ctk.CTkFrame):
             self.tree.heading(k, text=v)
             self.tree.column(k, width=120 if k not in ("title","employee") else 220, stretch=True)
 
-        yscroll = ttk.Scrollbar(table_wrap, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=yscroll.set)
+        yscroll = ttk.Scrollbar(table_wrap, orient="vertical")
         self.tree.pack(side="left", fill="both", expand=True)
         yscroll.pack(side="right", fill="y")
+        # журнал документів росте без меж — у Treeview лише видиме вікно рядків,
+        # а з БД сторінки підтягуються в міру прокрутки
+        self._cursor = None
+        self._filters = {}
+        self.table = VirtualTable(self.tree, yscroll, on_need_more=self._load_next_page)
 
     # ---------- Data ops ----------
     def refresh(self):
-        for row in self.tree.get_children():
-            self.tree.delete(row)
         query = self.search_var.get().strip()
         status = self.status_var.get()
         if status == "усі": status = None
-        docs = db.list_documents(search=query, status=status)
-        for d in docs:
-            self.tree.insert("", "end", values=(
+        self._filters = {"search": query, "status": status}
+        # перечитуємо стільки, скільки вже підвантажено — новий документ з'явиться вгорі, прокрутка не злетить
+        docs, cursor = db.list_documents_page(limit=max(db.PAGE_SIZE, len(self.table)), **self._filters)
+        self._set_cursor(cursor)   # до set_rows: рендер може одразу попросити наступну сторінку
+        self.table.set_rows(self._table_rows(docs))
+
+    def _load_next_page(self):
+        """Наступна сторінка журналу, коли прокрутка дійшла до кінця (VirtualTable)."""
+        if self._cursor is None:
+            return
+        docs, cursor = db.list_documents_page(after=self._cursor, **self._filters)
+        self._set_cursor(cursor)
+        self.table.append_rows(self._table_rows(docs))
+
+    def _set_cursor(self, cursor):
+        self._cursor = cursor
+        self.table.has_more = cursor is not None
+
+    @staticmethod
+    def _table_rows(docs):
+        return [
+            (d["id"], (
                 d["id"], d["employee_name"], d["type"], d["title"], d["status"],
                 d["created_at"], d.get("signed_by",""), d.get("signed_at","")
             ))
+            for d in docs
+        ]
+
+    def reject_selected(self):
+        keys = self.table.selection()
+        if not keys:
+            messagebox.showwarning("Відхилення", "Оберіть документ у списку.", parent=self)
+            return
+        doc_id = int(keys[0])
+        doc = db.get_document(doc_id)
+        if not doc:
+            messagebox.showerror("Відхилення", "Документ не знайдено.", parent=self)
+            return
+        if doc.get("status") == "signed" and doc.get("type") == "VACATION":
+            text = (f"Скасувати підписаний наказ #{doc_id}?\n"
+                    "Період відпустки буде знято, а списані дні повернуться на баланс працівника.")
+        elif doc.get("status") == "signed":
+            text = f"Скасувати підписаний документ #{doc_id}?"
+        else:
+            text = f"Відхилити документ #{doc_id}?"
+        if not messagebox.askyesno("Відхилення", text, parent=self):
+            return
+        try:
+            db.reject_document(doc_id)
+        except Exception as e:
+            messagebox.showerror("Відхилення", str(e), parent=self)
+            return
+        self.refresh()
 
     # ---------- Create menu ----------
     def _open_create_menu(self):
@@ -170,17 +223,6 @@ class DocumentsTab(ctk.CTkFrame):
         form = P1CreateForm(self)
 
         def on_submit(emp_data, payload):
-            # 1) створюємо employee і одразу беремо його id
-            emp_id = db.execute_query("""
-                INSERT INTO employees(last_name, first_name, middle_name, birth_date, email, phone, department_id, position_id)
-                VALUES (:last_name, :first_name, :middle_name, :birth_date, :email, :phone, :department_id, :position_id)
-            """, emp_data)
-
-
-            if hasattr(self, "on_employee_created") and callable(self.on_employee_created): # оновлення таблиці співробітників
-                self.on_employee_created()
-
-
             # --- [NEW] ПІБ підписанта (director_full_name) з app_settings ---
             director_full_name = ""
             try:
@@ -194,154 +236,143 @@ class DocumentsTab(ctk.CTkFrame):
             except Exception:
                 pass
 
-            # підставляємо у payload П-1 (піде в context_json при створенні документа П-1)
+            # підставляємо у payload П-1 (стане вмістом документа П-1 при створенні)
             payload["director_full_name"] = director_full_name
 
-
-
-            # 1.2) СТАЖУВАННЯ: створюємо запис для новачка
-            # старт стажування — з payload (hire_date/start_date) або сьогодні
-            start_iso = (
-                payload.get("hire_date")
-                or payload.get("start_date")
-                or db.today_iso()
-            )
-
-            # тривалість у місяцях: з payload['probation_months'] або дефолт 3
-            try:
-                months = int(payload.get("internship_months") or 3)
-            except (TypeError, ValueError):
-                months = 3
-            months = max(1, min(3, months))  # обмежимо 1–3
-
-            # запис у таблицю internships
-            # --- створюємо стажування і зберігаємо його id ---
-            mentor_id = payload.get("mentor_employee_id")
-
-            internship_id = db.execute_query("""
-                INSERT INTO internships (
-                    employee_id, start_date, months, planned_end_date, status, notes,
-                    mentor_employee_id,
-                    created_at, updated_at
+            created_by = (self.current_user or {}).get("username", "hr")
+
+            # Увесь прийом — одна транзакція: або створено все (працівник, стажування,
+            # направлення, користувач, П-1), або нічого — без «сиріт» у БД.
+            with db.transaction():
+                # 1) створюємо employee і одразу беремо його id
+                emp_id = db.execute_query("""
+                    INSERT INTO employees(last_name, first_name, middle_name, birth_date, email, phone, department_id, position_id)
+                    VALUES (:last_name, :first_name, :middle_name, :birth_date, :email, :phone, :department_id, :position_id)
+                """, emp_data)
+
+                # 1.2) СТАЖУВАННЯ: створюємо запис для новачка
+                # старт стажування — з payload (hire_date/start_date) або сьогодні
+                start_iso = (
+                    payload.get("hire_date")
+                    or payload.get("start_date")
+                    or db.today_iso()
                 )
-                VALUES (
-                    :emp_id, :start_date, :months,
-                    DATE(:start_date, '+' || :months || ' months'),
-                    'active', 'Авто: прийняття за П-1',
-                    :mentor_employee_id,
-                    CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
-                )
-            """, {
-                "emp_id": emp_id,
-                "start_date": start_iso,
-                "months": months,
-                "mentor_employee_id": mentor_id
-            })
-
-            # --- нам потрібна фактична дата завершення, яку порахував SQLite ---
-            intern_row = db.fetch_one("SELECT planned_end_date FROM internships WHERE id = ?", (internship_id,))
-            planned_end_iso = (intern_row or {}).get("planned_end_date") or start_iso
-
-            # --- дані працівника та наставника для шаблону ---
-            emp_min = db.get_employee_min(emp_id)  # {last_name, first_name, middle_name, department_name, position_name, ...}
-            mentor_min = db.get_employee_min(mentor_id) if mentor_id else None
-            mentor_full_name = " ".join(filter(None, [
-                (mentor_min or {}).get("last_name", ""),
-                (mentor_min or {}).get("first_name", ""),
-                (mentor_min or {}).get("middle_name", ""),
-            ])).strip()
-
-            # --- контекст рівно з тими ключами, що в твоєму шаблоні internship_assignment.docx ---
-            context_int = {
-                # шапка наказу
-                "order_number":    payload.get("order_number", ""),
-                "order_date_str":  date_ddmmyyyy(payload.get("order_date") or db.today_iso()),
-
-                # період стажування
-                "internship_start_date_str": date_ddmmyyyy(start_iso),
-                "internship_end_date_str":   date_ddmmyyyy(planned_end_iso),
-
-                # ==== ПРАЦІВНИК ====
-                # плоскі ключі (на випадок якщо вони є в шаблоні)
-                "employee_last_name":   emp_min.get("last_name", ""),
-                "employee_first_name":  emp_min.get("first_name", ""),
-                "employee_middle_name": emp_min.get("middle_name", ""),
-
-                # ВКЛАДЕНИЙ об’єкт employee.* — саме його очікує твій шаблон
-                "employee": {
-                    "last_name":       emp_min.get("last_name", ""),
-                    "first_name":      emp_min.get("first_name", ""),
-                    "middle_name":     emp_min.get("middle_name", ""),
-                    "department_name": emp_min.get("department_name", ""),
-                    "position_name":   emp_min.get("position_name", ""),
-                },
 
-                # ==== НАСТАВНИК ====
-                "mentor_full_name":       mentor_full_name,
-                "mentor_department_name": (mentor_min or {}).get("department_name", "") if mentor_min else "",
-                "mentor_position":        (mentor_min or {}).get("position_name", "") if mentor_min else "",
-
-                # підписи (до моменту підпису порожньо)
-                "director_full_name": director_full_name,
-                "employee_sign_day":   "",
-                "employee_sign_month": "",
-                "employee_sign_year":  "",
-            }
-
-
-            # --- створюємо документ типу INTERNSHIP_REFERRAL зі статусом 'sent' ---
-            doc_id_int = db.execute_query("""
-                INSERT INTO documents(type, employee_id, status, title, context_json, created_by)
-                VALUES ('INTERNSHIP_REFERRAL', ?, 'sent', ?, ?, ?)
-            """, (
-                emp_id,
-                f"Направлення на стажування: {emp_min.get('last_name','')} {emp_min.get('first_name','')}",
-                json.dumps(context_int, ensure_ascii=False),
-                (self.current_user or {}).get("username", "hr"),
-            ))
-
-            # історія payload (не обовʼязково, але корисно)
-            try:
-                db.execute_query(
-                    "INSERT INTO document_payloads(document_id, payload_json) VALUES (?, ?)",
-                    (doc_id_int, json.dumps(context_int, ensure_ascii=False))
+                # тривалість у місяцях: з payload['probation_months'] або дефолт 3
+                try:
+                    months = int(payload.get("internship_months") or 3)
+                except (TypeError, ValueError):
+                    months = 3
+                months = max(1, min(3, months))  # обмежимо 1–3
+
+                # --- створюємо стажування і зберігаємо його id ---
+                mentor_id = payload.get("mentor_employee_id")
+
+                internship_id = db.execute_query("""
+                    INSERT INTO internships (
+                        employee_id, start_date, months, planned_end_date, status, notes,
+                        mentor_employee_id,
+                        created_at, updated_at
+                    )
+                    VALUES (
+                        :emp_id, :start_date, :months,
+                        DATE(:start_date, '+' || :months || ' months'),
+                        'active', 'Авто: прийняття за П-1',
+                        :mentor_employee_id,
+                        CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+                    )
+                """, {
+                    "emp_id": emp_id,
+                    "start_date": start_iso,
+                    "months": months,
+                    "mentor_employee_id": mentor_id
+                })
+
+                # --- нам потрібна фактична дата завершення, яку порахував SQLite ---
+                intern_row = db.fetch_one("SELECT planned_end_date FROM internships WHERE id = ?", (internship_id,))
+                planned_end_iso = (intern_row or {}).get("planned_end_date") or start_iso
+
+                # --- дані працівника та наставника для шаблону ---
+                emp_min = db.get_employee_min(emp_id)  # {last_name, first_name, middle_name, department_name, position_name, ...}
+                mentor_min = db.get_employee_min(mentor_id) if mentor_id else None
+                mentor_full_name = " ".join(filter(None, [
+                    (mentor_min or {}).get("last_name", ""),
+                    (mentor_min or {}).get("first_name", ""),
+                    (mentor_min or {}).get("middle_name", ""),
+                ])).strip()
+
+                # --- контекст рівно з тими ключами, що в твоєму шаблоні internship_assignment.docx ---
+                context_int = {
+                    # шапка наказу
+                    "order_number":    payload.get("order_number", ""),
+                    "order_date_str":  date_ddmmyyyy(payload.get("order_date") or db.today_iso()),
+
+                    # період стажування
+                    "internship_start_date_str": date_ddmmyyyy(start_iso),
+                    "internship_end_date_str":   date_ddmmyyyy(planned_end_iso),
+
+                    # ==== ПРАЦІВНИК ====
+                    # плоскі ключі (на випадок якщо вони є в шаблоні)
+                    "employee_last_name":   emp_min.get("last_name", ""),
+                    "employee_first_name":  emp_min.get("first_name", ""),
+                    "employee_middle_name": emp_min.get("middle_name", ""),
+
+                    # ВКЛАДЕНИЙ об’єкт employee.* — саме його очікує твій шаблон
+                    "employee": {
+                        "last_name":       emp_min.get("last_name", ""),
+                        "first_name":      emp_min.get("first_name", ""),
+                        "middle_name":     emp_min.get("middle_name", ""),
+                        "department_name": emp_min.get("department_name", ""),
+                        "position_name":   emp_min.get("position_name", ""),
+                    },
+
+                    # ==== НАСТАВНИК ====
+                    "mentor_full_name":       mentor_full_name,
+                    "mentor_department_name": (mentor_min or {}).get("department_name", "") if mentor_min else "",
+                    "mentor_position":        (mentor_min or {}).get("position_name", "") if mentor_min else "",
+
+                    # підписи (до моменту підпису порожньо)
+                    "director_full_name": director_full_name,
+                    "employee_sign_day":   "",
+                    "employee_sign_month": "",
+                    "employee_sign_year":  "",
+                }
+
+                # --- створюємо документ типу INTERNSHIP_REFERRAL зі статусом 'sent' (+ історія payload) ---
+                doc_id_int = db.insert_document(
+                    "INTERNSHIP_REFERRAL", emp_id,
+                    f"Направлення на стажування: {emp_min.get('last_name','')} {emp_min.get('first_name','')}",
+                    context_int, created_by=created_by,
                 )
-            except Exception:
-                pass
-
-            # --- прив'язуємо документ до стажування ---
-            db.execute_query("UPDATE internships SET doc_id = ? WHERE id = ?", (doc_id_int, internship_id))
 
+                # --- прив'язуємо документ до стажування ---
+                db.execute_query("UPDATE internships SET doc_id = ? WHERE id = ?", (doc_id_int, internship_id))
 
+                # ─────────────────────────────────────────────────────────────
+                # 1.1) СТВОРЮЄМО ОБЛІКОВИЙ ЗАПИС ДЛЯ ПРАЦІВНИКА
+                # база для логіна (з email або з ПІБ), гарантуємо унікальність
+                base_username = db.suggest_username(emp_data.get("email"), emp_data["last_name"], emp_data["first_name"])
+                username = _unique_username(base_username or "user")
 
+                # випадковий тимчасовий пароль (10 символів)
+                temp_password = _gen_password(10)
 
+                # вставляємо користувача з роллю employee і прив'язкою до employee_id
+                db.create_user_for_employee(username=username, password=temp_password, role="employee", employee_id=emp_id)
 
-            # ─────────────────────────────────────────────────────────────
-            # 1.1) СТВОРЮЄМО ОБЛІКОВИЙ ЗАПИС ДЛЯ ПРАЦІВНИКА
-            # база для логіна (з email або з ПІБ)
-            base_username = db.suggest_username(emp_data.get("email"), emp_data["last_name"], emp_data["first_name"])
-
-            # гарантуємо унікальність логіна
-            username = base_username or "user"
-            i = 1
-            while db.fetch_one("SELECT 1 AS x FROM users WHERE username = ?", (username,)):
-                username = f"{base_username}-{i}"
-                i += 1
-
-            # випадковий тимчасовий пароль (10 символів)
-            import string
-            from secrets import choice
-            alphabet = string.ascii_letters + string.digits
-            temp_password = "".join(choice(alphabet) for _ in range(10))
+                # 2) створюємо документ П-1 (payload — один стиснений запис payload_blobs для документа й історії document_payloads)
+                db.insert_document(
+                    "P1", emp_id,
+                    f"Наказ П-1: {emp_data['last_name']} {emp_data['first_name']}",
+                    payload, created_by=created_by,
+                )
 
-            # вставляємо користувача з роллю employee і прив'язкою до employee_id
-            db.create_user_for_employee(username=username, password=temp_password, role="employee", employee_id=emp_id)
+            # ---- далі — лише після успішного COMMIT ----
+            if hasattr(self, "on_employee_created") and callable(self.on_employee_created): # оновлення таблиці співробітників
+                self.on_employee_created(emp_id)
 
             # зберігаємо .txt з доступами
-            from datetime import datetime
-            from pathlib import Path
-            cred_dir = Path("data/credentials"); cred_dir.mkdir(parents=True, exist_ok=True)
-            cred_path = cred_dir / f"emp_{emp_id:04d}_{username}.txt"
+            cred_path = CRED_DIR / f"emp_{emp_id:04d}_{username}.txt"
             cred_text = (
                 "ДОСТУПИ ДО СИСТЕМИ\n"
                 "-------------------\n"
@@ -358,25 +389,6 @@ class DocumentsTab(ctk.CTkFrame):
                 self.clipboard_append(temp_password)
             except Exception:
                 pass
-            # ─────────────────────────────────────────────────────────────
-
-
-
-            # 2) створюємо документ (кладемо payload також у context_json) і беремо doc_id
-            doc_id = db.execute_query("""
-                INSERT INTO documents(type, employee_id, status, title, context_json)
-                VALUES ('P1', :emp_id, 'sent', :title, :context_json)
-            """, {
-                "emp_id": emp_id,
-                "title": f"Наказ П-1: {emp_data['last_name']} {emp_data['first_name']}",
-                "context_json": json.dumps(payload, ensure_ascii=False)
-            })
-
-            # 3) дублюємо payload в історію/версії (document_payloads)
-            db.execute_query("""
-                INSERT INTO document_payloads(document_id, payload_json)
-                VALUES (:doc_id, :payload)
-            """, {"doc_id": doc_id, "payload": json.dumps(payload, ensure_ascii=False)})
 
             # 4) миттєво оновлюємо таблицю документів
             self.refresh()
@@ -465,25 +477,12 @@ class DocumentsTab(ctk.CTkFrame):
             }
 
 
-            # ---- INSERT у documents зі статусом 'sent' ----
-            doc_id = db.execute_query("""
-                INSERT INTO documents(type, employee_id, status, title, context_json, created_by)
-                VALUES ('P4', ?, 'sent', ?, ?, ?)
-            """, (
-                emp_id,
+            # ---- INSERT у documents зі статусом 'sent' (+ історія payload/context) ----
+            db.insert_document(
+                "P4", emp_id,
                 f"Наказ П-4: {context['employee']['last_name']} {context['employee']['first_name']}",
-                json.dumps(context, ensure_ascii=False),
-                (self.current_user or {}).get("username", "hr"),
-            ))
-
-            # ---- (необовʼязково) зберігаємо історію payload/context ----
-            try:
-                db.execute_query(
-                    "INSERT INTO document_payloads(document_id, payload_json) VALUES (?, ?)",
-                    (doc_id, json.dumps(context, ensure_ascii=False))
-                )
-            except Exception:
-                pass
+                context, created_by=(self.current_user or {}).get("username", "hr"),
+            )
 
             # ---- Оновити таблицю ----
             self.refresh()
@@ -497,31 +496,14 @@ class DocumentsTab(ctk.CTkFrame):
         form = TrainingReferralForm(self)
 
         def on_submit(emp_id: int, payload: dict):
-            # 1) Створюємо документ у БД зі статусом 'sent'
+            # 1) Створюємо документ у БД зі статусом 'sent' (+ історія payload)
             title = f"Направлення на підвищення кваліфікації: {payload.get('employee', {}).get('last_name','')} {payload.get('employee', {}).get('first_name','')}"
-            doc_id = db.execute_query(
-                """
-                INSERT INTO documents(type, employee_id, status, title, context_json, created_by)
-                VALUES ('TRAINING', ?, 'sent', ?, ?, ?)
-                """,
-                (
-                    emp_id,
-                    title,
-                    json.dumps(payload, ensure_ascii=False),
-                    (self.current_user or {}).get("username", "hr"),
-                )
+            db.insert_document(
+                "TRAINING", emp_id, title, payload,
+                created_by=(self.current_user or {}).get("username", "hr"),
             )
 
-            # 2) (необовʼязково) Історія payload
-            try:
-                db.execute_query(
-                    "INSERT INTO document_payloads(document_id, payload_json) VALUES (?, ?)",
-                    (doc_id, json.dumps(payload, ensure_ascii=False))
-                )
-            except Exception:
-                pass
-
-            # 3) Оновити таблицю і повідомити
+            # 2) Оновити таблицю і повідомити
             self.refresh()
             from tkinter import messagebox
             messagebox.showinfo("Готово", "Направлення на підвищення кваліфікації створено і відправлено на підпис.")
@@ -535,26 +517,13 @@ class DocumentsTab(ctk.CTkFrame):
         form = VacationForm(self)
 
         def on_submit(emp_id, payload):
-            # INSERT у documents зі статусом 'sent'
-            doc_id = db.execute_query("""
-                INSERT INTO documents(type, employee_id, status, title, context_json, created_by)
-                VALUES ('VACATION', ?, 'sent', ?, ?, ?)
-            """, (
-                emp_id,
+            # INSERT у documents зі статусом 'sent' (+ історія payload)
+            db.insert_document(
+                "VACATION", emp_id,
                 f"Надання відпустки: {payload.get('employee', {}).get('last_name', '')} "
                 f"{payload.get('employee', {}).get('first_name', '')}",
-                json.dumps(payload, ensure_ascii=False),
-                (self.current_user or {}).get("username", "hr"),
-            ))
-
-            # (необов’язково) історія payload
-            try:
-                db.execute_query(
-                    "INSERT INTO document_payloads(document_id, payload_json) VALUES (?, ?)",
-                    (doc_id, json.dumps(payload, ensure_ascii=False))
-                )
-            except Exception:
-                pass
+                payload, created_by=(self.current_user or {}).get("username", "hr"),
+            )
 
             # оновити таблицю
             self.refresh()
@@ -2,19 +2,12 @@
 import customtkinter as ctk
 from tkinter import messagebox
 import db_manager as db
-from docxtpl import DocxTemplate
+from doc_render import render_document, file_sha256
+from render_service import RenderService
+from tree_sync import TableBinding
 from pathlib import Path
 import os, sys, subprocess, json
 
-TEMPLATES_MAP = {
-    "P1": Path("data/templates/hire_order_P1.docx"),  # ← за потреби змінити назву файла шаблону
-    "P4": Path("data/templates/dismissal_order_P4.docx"),  
-    "INTERNSHIP_REFERRAL": Path("data/templates/internship_assignment.docx"),
-    "TRAINING": Path("data/templates/training_referral.docx"),
-    "VACATION": Path("data/templates/vacation_order.docx"), 
-}
-
-
 
 TMP_DIR = Path("data/tmp")
 TMP_DIR.mkdir(parents=True, exist_ok=True)
@@ -55,9 +48,15 @@ class EmployeeMainWindow(ctk.CTk):
                 return
             self.employee_id = u["employee_id"]
 
+        # ---- Фоновий рендер DOCX (прев'ю/підпис не блокують вікно) ----
+        self.render_service = RenderService(self)
+        self._render_job = None
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
         # ---- Tabview ----
         self.tabview = ctk.CTkTabview(self)
         self.tabview.pack(fill="both", expand=True, padx=16, pady=16)
+        self._build_job_bar()
 
         self.tab_profile = self.tabview.add("Профіль")
         self.tab_docs = self.tabview.add("Документи")
@@ -235,6 +234,7 @@ class EmployeeMainWindow(ctk.CTk):
         from tkinter import ttk  # локальний імпорт, щоб не ламати існуючу структуру
         cols = ("id", "type", "title", "status", "created_at", "signed_at")
         self.docs_tree = ttk.Treeview(table, columns=cols, show="headings", height=18)
+        self.docs_binding = TableBinding(self.docs_tree)
         headings = {
             "id": "ID",
             "type": "Тип",
@@ -317,22 +317,7 @@ class EmployeeMainWindow(ctk.CTk):
         Фільтр статусу: 'усі' | 'sent' | 'signed'
         """
         status = self.docs_status_var.get()
-        where = "WHERE employee_id = ?"
-        params = [self.employee_id]
-        if status != "усі":
-            where += " AND status = ?"
-            params.append(status)
-
-        rows = db.fetch_all(f"""
-            SELECT id, type, title, status, created_at, signed_at
-            FROM documents
-            {where}
-            ORDER BY created_at DESC
-        """, tuple(params))
-
-        # Очистити і заповнити таблицю
-        for iid in self.docs_tree.get_children():
-            self.docs_tree.delete(iid)
+        rows = db.list_employee_documents(self.employee_id, None if status == "усі" else status)
 
         # Якщо хочеш людську назву типу: можна підмінити тут або через JOIN документів і document_types
         TYPE_LABELS = {
@@ -343,12 +328,14 @@ class EmployeeMainWindow(ctk.CTk):
             "VACATION": "Надання відпустки", 
         }
 
-        for r in rows:
-            show_type = TYPE_LABELS.get(r.get("type"), r.get("type"))
-            self.docs_tree.insert("", "end", values=(
-                r.get("id"), show_type, r.get("title"), r.get("status"),
+        # оновлюємо лише змінені рядки таблиці
+        self.docs_binding.sync(
+            (r.get("id"), (
+                r.get("id"), TYPE_LABELS.get(r.get("type"), r.get("type")), r.get("title"), r.get("status"),
                 r.get("created_at") or "", r.get("signed_at") or ""
             ))
+            for r in rows
+        )
 
         try:
             self.load_training_reminder()
@@ -369,208 +356,85 @@ class EmployeeMainWindow(ctk.CTk):
         except Exception as e:
             messagebox.showerror("Перегляд", f"Не вдалося відкрити файл: {e}")
 
-    def _render_preview_docx(self, doc_type: str, context: dict, employee_id: int, doc_id: int) -> str:
-        """
-        Генерує ТИМЧАСОВИЙ DOCX-прев'ю для документа працівника.
-        Нормалізує payload під шаблон П-1:
-        - department.name / position.name
-        - hire_date_str / start_date_str / contract_until_str (ДД.ММ.РРРР)
-        - чекбокси cb_*
-        - salary/work/інші текстові поля
-        - плейсхолдери підпису sign_employee_* і director_full_name
-        Нічого не змінює в БД.
-        """
-        from datetime import datetime, date
-
-        def fmt_dmy(iso: str | None) -> str:
-            if not iso:
-                return ""
-            try:
-                d = datetime.strptime(iso, "%Y-%m-%d")
-                return f"{d.day:02d}.{d.month:02d}.{d.year}"
-            except Exception:
-                return iso  # якщо формат інший — повертаємо як є
-
-        def cb(flag: bool) -> str:
-            return "☑" if bool(flag) else "☐"
-
-        tpl_path = TEMPLATES_MAP.get(doc_type)
-        if not tpl_path or not tpl_path.exists():
-            raise RuntimeError(f"Не знайдено шаблон для типу '{doc_type}'. Перевір TEMPLATES_MAP.")
-
-        # --- вихідний payload із БД ---
-        src = dict(context or {})
-        emp = (src.get("employee") or {}) if isinstance(src.get("employee"), dict) else {}
-
-        # --- нормалізований контекст під шаблон ---
-        ctx = dict(src)
-
-        # 1) Об'єкти з .name для {{ department.name }} і {{ position.name }}
-        ctx.setdefault("department", {"name": emp.get("department_name", "")})
-        ctx.setdefault("position",   {"name": emp.get("position_name", "")})
-
-        # 2) ПІБ у плоских полях (на всякий випадок)
-        ctx.setdefault("last_name",   emp.get("last_name", ""))
-        ctx.setdefault("first_name",  emp.get("first_name", ""))
-        ctx.setdefault("middle_name", emp.get("middle_name", ""))
-
-        # 3) Рядкові дати з ISO → ДД.ММ.РРРР
-        # hire_date_str у шапці (“від …”) — беремо з order_date, якщо є, інакше hire_date
-        ctx.setdefault("hire_date_str",  fmt_dmy(src.get("order_date") or src.get("hire_date")))
-        # start_date_str (“Прийняти на роботу з …”) — з hire_date
-        ctx.setdefault("start_date_str", fmt_dmy(src.get("hire_date")))
-        ctx.setdefault("contract_until_str", fmt_dmy(src.get("contract_until")))
-
-        # 4) Чекбокси умов
-        ctx["cb_competition"] = cb(src.get("is_competition"))
-        ctx["cb_contract"]    = cb(src.get("is_contract"))
-        ctx["cb_probation"]   = cb(src.get("is_probation"))
-        ctx["cb_absence"]     = cb(src.get("is_absence"))
-        ctx["cb_reserve"]     = cb(src.get("is_reserve"))
-        ctx["cb_internship"]  = cb(src.get("is_internship"))
-        ctx["cb_transfer"]    = cb(src.get("is_transfer"))
-        ctx["cb_other"]       = cb(src.get("is_other"))
-
-        is_main = bool(src.get("is_main_job"))
-        ctx["cb_work_main"]      = cb(is_main)
-        ctx["cb_work_secondary"] = cb(not is_main)
-        # якщо треба — тут можна вивести логіку повного робочого часу
-        ctx["cb_worktime_full"]  = cb(False)
-
-        # 5) Текстові/числові поля
-        ctx.setdefault("probation_months", src.get("probation_months", ""))
-        ctx.setdefault("other_text",       src.get("other_text", ""))
-        ctx.setdefault("work_hours",       src.get("work_hours", ""))
-        ctx.setdefault("work_minutes",     src.get("work_minutes", ""))
-        ctx.setdefault("salary_grn",       src.get("salary_grn", ""))
-        ctx.setdefault("salary_kop",       src.get("salary_kop", ""))
-        ctx.setdefault("order_number",     src.get("order_number", ""))
-
-        # 6) Підпис працівника (для прев’ю порожньо)
-        ctx.setdefault("employee_sign_day",   "")
-        ctx.setdefault("employee_sign_month", "")
-        ctx.setdefault("employee_sign_year",  "")
-
-        # Якщо хочеш автодату в прев'ю:
-        # t = date.today()
-        # ctx.setdefault("sign_employee_day",   f"{t.day:02d}")
-        # ctx.setdefault("sign_employee_month", f"{t.month:02d}")
-        # ctx.setdefault("sign_employee_year",  f"{t.year}")
-
-        # 7) Директор (поки порожньо — можна підвантажувати з налаштувань)
-        ctx.setdefault("director_full_name", "")
-
-        # --- шлях для тимчасового прев'ю ---
-        out_path = TMP_DIR / f"emp_{employee_id:04d}_doc_{doc_id:06d}_preview.docx"
-
-
-        # --- НОРМАЛІЗАЦІЯ ДЛЯ TRAINING (прев'ю) ---
-        if doc_type == "TRAINING":
-            src = dict(context or {})
-            tr = dict((src.get("training") or {}))
-
-            # Дати: ДД.ММ.РРРР
-            ctx["order_date_str"] = fmt_dmy(src.get("order_date"))
-            s = fmt_dmy(tr.get("start_date"))
-            e = fmt_dmy(tr.get("end_date"))
-            tr["start_date_str"] = s
-            tr["end_date_str"]   = e
-            tr["period_str"]     = f"{s} — {e}" if (s and e) else (s or e or "")
-
-            # Підписані ярлики (щоб у шаблоні було просто підставити)
-            tr["format_label"]  = tr.get("format")  or ""
-            tr["mode_label"]    = tr.get("mode")    or ""
-            tr["funding_label"] = tr.get("funding") or ""
-
-            # Години / вартість
-            hours_raw = (tr.get("planned_hours") or "").strip()
-            tr["hours_str"] = f"{hours_raw} акад. год." if hours_raw else ""
-
-            cost_raw = (tr.get("estimated_cost") or "").strip()
-            tr["estimated_cost"] = cost_raw  # (якщо хочеш, додай ' грн' прямо в шаблоні)
-
-            # Повертаємо в контекст
-            ctx["training"] = tr
-
-        # --- Fallback для ПІБ керівника: payload -> DIRECTOR_FULL_NAME -> director_employee_id -> штатний директор ---
-        if not ctx.get("director_full_name"):
-            val = None
-            # 1) текстове налаштування (якщо комусь так зручніше)
-            try:
-                val = db.get_setting("DIRECTOR_FULL_NAME")
-            except Exception:
-                val = None
-            # 2) id працівника- директора → ПІБ з employees
-            if not val:
-                try:
-                    dir_id = db.get_setting("director_employee_id")
-                    if dir_id:
-                        row = db.fetch_one("""
-                            SELECT TRIM(
-                                COALESCE(last_name,'') || ' ' ||
-                                COALESCE(first_name,'') || 
-                                CASE WHEN IFNULL(middle_name,'')<>'' THEN ' '||middle_name ELSE '' END
-                            ) AS full_name
-                            FROM employees
-                            WHERE id = ?
-                        """, (dir_id,))
-                        val = (row or {}).get("full_name")
-                except Exception:
-                    pass
-            # 3) резервний спосіб (якщо реалізовано в db_manager)
-            if not val:
-                try:
-                    val = db.get_active_director_name()
-                except Exception:
-                    val = None
-            ctx["director_full_name"] = val or ""
-
-
-
-        # --- НОРМАЛІЗАЦІЯ ДЛЯ VACATION (прев'ю) ---
-        if doc_type == "VACATION":
-            src = dict(context or {})
-            vac = dict(src.get("vacation") or {})
-
-            # Дата наказу у формат ДД.ММ.РРРР (якщо використовуєш у шаблоні)
-            ctx["order_date_str"] = fmt_dmy(src.get("order_date"))
+    # ===================== Фонові задачі (прев'ю / підпис) =====================
+    def _build_job_bar(self):
+        """Панель прогресу внизу вікна — показується лише поки формується документ."""
+        self.job_bar = ctk.CTkFrame(self)
+        self._job_text_var = ctk.StringVar(value="")
+        ctk.CTkLabel(self.job_bar, textvariable=self._job_text_var).pack(side="left", padx=(12, 8), pady=6)
+        self._job_progress = ctk.CTkProgressBar(self.job_bar, width=260)
+        self._job_progress.pack(side="left", padx=6)
+        ctk.CTkButton(self.job_bar, text="Скасувати", width=120, fg_color="#666", hover_color="#555",
+                      command=self.cancel_render_job).pack(side="right", padx=12, pady=6)
+
+    def _start_render_job(self, title: str, error_text: str, fn, *args, on_done=None):
+        """Запускає fn(job, *args) у фоні; on_done(result) — у головному потоці."""
+        if self._render_job is not None:
+            messagebox.showwarning(title, "Зачекайте — попередній документ ще формується.")
+            return
 
-            def _range_str(a, b):
-                a_str = fmt_dmy(a); b_str = fmt_dmy(b)
-                if a_str and b_str:
-                    return f"{a_str} — {b_str}"
-                return a_str or b_str or ""
+        def finish():
+            self._render_job = None
+            self.job_bar.pack_forget()
 
-            # Періоди у зручних рядках
-            vac["work_period_str"] = _range_str(vac.get("work_period_from"), vac.get("work_period_to"))
-            vac["period_str"]      = _range_str(vac.get("start_date"),       vac.get("end_date"))
+        def done(result):
+            finish()
+            if on_done:
+                on_done(result)
 
-            # Кількість днів + чекбокс матдопомоги
-            td = (vac.get("total_days") or "").strip()
-            vac["total_days_str"]    = f"{td} календарних днів" if td else ""
-            vac["material_aid_mark"] = "☑" if vac.get("material_aid") else "☐"
-            vac["work_period_start_str"] = fmt_dmy(vac.get("work_period_from"))
-            vac["work_period_end_str"]   = fmt_dmy(vac.get("work_period_to"))
-            vac["start_date_str"]        = fmt_dmy(vac.get("start_date"))
-            vac["end_date_str"]          = fmt_dmy(vac.get("end_date"))
-            vac["type_label"]            = vac.get("type") or ""
-            ctx["cb_health_aid"]         = "☑" if vac.get("material_aid") else "☐"
-            vac.setdefault("health_aid_amount", "")
+        def error(e):
+            finish()
+            messagebox.showerror(title, f"{error_text}: {e}")
 
+        def progress(percent, text):
+            self._job_progress.set(percent / 100)
+            self._job_text_var.set(text)
 
+        self._job_progress.set(0)
+        self._job_text_var.set(f"{title}: у черзі…")
+        self.job_bar.pack(side="bottom", fill="x", padx=16, pady=(0, 12), before=self.tabview)
+        self._render_job = self.render_service.submit(
+            fn, *args, on_done=done, on_error=error, on_progress=progress, on_cancel=finish
+        )
 
-            # Повертаємо в контекст
-            ctx["vacation"] = vac
+    def cancel_render_job(self):
+        job = self._render_job
+        if job is None:
+            return
+        if job.cancel():
+            self._job_text_var.set("Скасування…")
+        else:
+            messagebox.showinfo("Скасування", "Документ уже зберігається — дочекайтеся завершення.")
 
+    def _on_close(self):
+        self.render_service.shutdown()
+        self.destroy()
 
-        # --- рендер ---
-        from docxtpl import DocxTemplate
-        tpl = DocxTemplate(str(tpl_path))
-        tpl.render(ctx)
-        tpl.save(str(out_path))
-        return str(out_path)
+    def _render_preview_docx(self, doc_type: str, context: dict, employee_id: int, doc_id: int) -> str:
+        """
+        Генерує ТИМЧАСОВИЙ DOCX-прев'ю для документа працівника (див. doc_render.build_template_context).
+        Нічого не змінює в БД; не звертається до Tk — викликається з фонового потоку.
+        """
+        out_path = TMP_DIR / f"emp_{employee_id:04d}_doc_{doc_id:06d}_preview.docx"
+        return render_document(doc_type, context, out_path)
 
+    def _preview_job(self, job, doc_type: str, context: dict, employee_id: int, doc_id: int) -> str:
+        job.progress(20, "Формування прев'ю…")
+        return self._render_preview_docx(doc_type, context, employee_id, doc_id)
 
+    def _preview_document(self, doc: dict):
+        """Прев'ю документа з БД у фоні; після рендеру відкриває файл."""
+        try:
+            ctx = json.loads(doc.get("context_json") or "{}")
+        except Exception as e:
+            messagebox.showerror("Перегляд", f"Пошкоджений вміст документа (JSON): {e}")
+            return
+        self._start_render_job(
+            "Перегляд", "Не вдалося згенерувати прев'ю",
+            self._preview_job,
+            doc.get("type"), ctx, int(doc.get("employee_id") or 0), int(doc.get("id") or 0),
+            on_done=self._open_with_default_app,
+        )
 
     def preview_selected_doc(self):
         """Хендлер кнопки 'Переглянути'."""
@@ -588,11 +452,7 @@ class EmployeeMainWindow(ctk.CTk):
             return
 
         # Перевірка власності та отримання контексту
-        doc = db.fetch_one("""
-            SELECT id, employee_id, type, title, status, context_json
-            FROM documents
-            WHERE id = ?
-        """, (doc_id,))
+        doc = db.get_document(doc_id)
         if not doc:
             messagebox.showerror("Перегляд", "Документ не знайдено.")
             return
@@ -600,36 +460,18 @@ class EmployeeMainWindow(ctk.CTk):
             messagebox.showerror("Перегляд", "Ви не маєте доступу до цього документа.")
             return
 
-        try:
-            ctx = json.loads(doc.get("context_json") or "{}")
-        except Exception as e:
-            messagebox.showerror("Перегляд", f"Пошкоджений вміст документа (JSON): {e}")
-            return
-
-        try:
-            path = self._render_preview_docx(
-                doc_type=doc.get("type"),
-                context=ctx,
-                employee_id=int(doc.get("employee_id") or 0),
-                doc_id=doc_id
-            )
-            self._open_with_default_app(path)
-        except Exception as e:
-            messagebox.showerror("Перегляд", f"Не вдалося згенерувати прев'ю: {e}")
+        self._preview_document(doc)
 
 
     def sign_selected_doc(self):
         """
         Підпис документа працівником:
         - дозволено лише для статусу 'sent'
-        - проставляє дату підпису в контекст (sign_employee_day/month/year)
-        - рендерить фінальний DOCX у data/documents
-        - оновлює documents.status='signed', signed_by, signed_at, file_docx, context_json
-        - оновлює таблицю
+        - проставляє дату підпису в контекст (employee_sign_day/month/year)
+        - у фоні рендерить фінальний DOCX у data/documents і фіксує підпис у БД (db.sign_document)
+        - після завершення оновлює профіль і таблицю
         """
-        import json
-        from datetime import datetime, date
-        from tkinter import messagebox
+        from datetime import date
 
         sel = self.docs_tree.selection()
         if not sel:
@@ -649,284 +491,63 @@ class EmployeeMainWindow(ctk.CTk):
                 messagebox.showwarning("Підпис", "Підписувати можна лише документи зі статусом 'sent'.")
                 return
 
-            # --- вихідні дані з БД ---
-            doc_type = doc.get("type")
-            employee_id = doc.get("employee_id")
             raw_ctx = doc.get("context_json") or {}
             context = raw_ctx if isinstance(raw_ctx, dict) else json.loads(raw_ctx)
+        except Exception as e:
+            messagebox.showerror("Підпис", f"Не вдалося підписати: {e}")
+            return
 
-            # --- додати дату підпису працівника у payload ---
-            today = date.today()
-            context["employee_sign_day"]   = f"{today.day:02d}"
-            context["employee_sign_month"] = f"{today.month:02d}"
-            context["employee_sign_year"]  = f"{today.year}"
-
-
-            # ---------- НОРМАЛІЗАЦІЯ КОНТЕКСТУ ПІД ШАБЛОН (ідентично прев'ю) ----------
-            def fmt_dmy(iso: str | None) -> str:
-                if not iso:
-                    return ""
-                try:
-                    d = datetime.strptime(iso, "%Y-%m-%d")
-                    return f"{d.day:02d}.{d.month:02d}.{d.year}"
-                except Exception:
-                    return iso
-
-            def cb(flag: bool) -> str:
-                return "☑" if bool(flag) else "☐"
-
-            src = dict(context or {})
-            emp = (src.get("employee") or {}) if isinstance(src.get("employee"), dict) else {}
-            ctx = dict(src)
-
-            # 1) department/position як об'єкти з .name
-            ctx.setdefault("department", {"name": emp.get("department_name", "")})
-            ctx.setdefault("position",   {"name": emp.get("position_name", "")})
-
-            # 2) ПІБ (на всяк)
-            ctx.setdefault("last_name",   emp.get("last_name", ""))
-            ctx.setdefault("first_name",  emp.get("first_name", ""))
-            ctx.setdefault("middle_name", emp.get("middle_name", ""))
-
-            # 3) Дати у рядок
-            ctx.setdefault("hire_date_str",  fmt_dmy(src.get("order_date") or src.get("hire_date")))
-            ctx.setdefault("start_date_str", fmt_dmy(src.get("hire_date")))
-            ctx.setdefault("contract_until_str", fmt_dmy(src.get("contract_until")))
-
-            # 4) Чекбокси
-            ctx["cb_competition"] = cb(src.get("is_competition"))
-            ctx["cb_contract"]    = cb(src.get("is_contract"))
-            ctx["cb_probation"]   = cb(src.get("is_probation"))
-            ctx["cb_absence"]     = cb(src.get("is_absence"))
-            ctx["cb_reserve"]     = cb(src.get("is_reserve"))
-            ctx["cb_internship"]  = cb(src.get("is_internship"))
-            ctx["cb_transfer"]    = cb(src.get("is_transfer"))
-            ctx["cb_other"]       = cb(src.get("is_other"))
-
-            is_main = bool(src.get("is_main_job"))
-            ctx["cb_work_main"]      = cb(is_main)
-            ctx["cb_work_secondary"] = cb(not is_main)
-            ctx["cb_worktime_full"]  = cb(False)
-
-            # 5) Текстові поля
-            ctx.setdefault("probation_months", src.get("probation_months", ""))
-            ctx.setdefault("other_text",       src.get("other_text", ""))
-            ctx.setdefault("work_hours",       src.get("work_hours", ""))
-            ctx.setdefault("work_minutes",     src.get("work_minutes", ""))
-            ctx.setdefault("salary_grn",       src.get("salary_grn", ""))
-            ctx.setdefault("salary_kop",       src.get("salary_kop", ""))
-            ctx.setdefault("order_number",     src.get("order_number", ""))
-
-            # 6) Підпис працівника (переконуємось, що є в ctx)
-            ctx.setdefault("employee_sign_day",   context["employee_sign_day"])
-            ctx.setdefault("employee_sign_month", context["employee_sign_month"])
-            ctx.setdefault("employee_sign_year",  context["employee_sign_year"])
-
-
-            # 7) Директор (поки порожньо; можна підтягувати з налаштувань)
-            ctx.setdefault("director_full_name", src.get("director_full_name", ""))
-
-            # --- НОРМАЛІЗАЦІЯ ДЛЯ TRAINING (фінальний рендер) ---
-            if doc_type == "TRAINING":
-                # беремо вихідний context і секцію training
-                src = dict(context or {})
-                tr = dict((src.get("training") or {}))
-
-                # форматування дат у ДД.ММ.РРРР
-                def _fmt(iso):
-                    if not iso:
-                        return ""
-                    try:
-                        d = datetime.strptime(iso, "%Y-%m-%d")
-                        return f"{d.day:02d}.{d.month:02d}.{d.year}"
-                    except Exception:
-                        return iso
-
-                # шапка наказу
-                ctx["order_date_str"] = _fmt(src.get("order_date"))
-
-                # період навчання
-                s = _fmt(tr.get("start_date"))
-                e = _fmt(tr.get("end_date"))
-                tr["start_date_str"] = s
-                tr["end_date_str"]   = e
-                tr["period_str"]     = f"{s} — {e}" if (s and e) else (s or e or "")
-
-                # підписані ярлики (щоб у шаблоні підставляти готові рядки)
-                tr["format_label"]  = tr.get("format")  or ""
-                tr["mode_label"]    = tr.get("mode")    or ""
-                tr["funding_label"] = tr.get("funding") or ""
-
-                # години / вартість (відображення як у прев’ю)
-                hours_raw = (tr.get("planned_hours") or "").strip()
-                tr["hours_str"] = f"{hours_raw} акад. год." if hours_raw else ""
-
-                cost_raw = (tr.get("estimated_cost") or "").strip()
-                tr["estimated_cost"] = cost_raw  # суфікс "грн" можна додати у шаблоні
-
-                # повертаємо секцію назад у контекст
-                ctx["training"] = tr
-
-            # --- НОРМАЛІЗАЦІЯ ДЛЯ VACATION (sign) ---
-            if doc_type == "VACATION":
-                vac = dict(src.get("vacation") or {})
-
-                # Дата наказу (якщо використовуєш у шаблоні)
-                ctx["order_date_str"] = fmt_dmy(src.get("order_date"))
-
-                # Періоди у форматі ДД.ММ.РРРР
-                vac["work_period_start_str"] = fmt_dmy(vac.get("work_period_from"))
-                vac["work_period_end_str"]   = fmt_dmy(vac.get("work_period_to"))
-                vac["start_date_str"]        = fmt_dmy(vac.get("start_date"))
-                vac["end_date_str"]          = fmt_dmy(vac.get("end_date"))
-
-                # Підписані ярлики/чекбокси
-                vac["type_label"]    = vac.get("type") or ""
-                ctx["cb_health_aid"] = "☑" if vac.get("material_aid") else "☐"
-                vac.setdefault("health_aid_amount", "")
-
-                # Повернути в контекст
-                ctx["vacation"] = vac
-
-            # ---------- РЕНДЕР ФІНАЛЬНОГО DOCX ----------
-            tpl_path = TEMPLATES_MAP.get(doc_type)
-            if not tpl_path or not tpl_path.exists():
-                messagebox.showerror("Підпис", f"Не знайдено шаблон для типу '{doc_type}'.")
-                return
-
-
-            # --- Fallback для ПІБ керівника: payload -> DIRECTOR_FULL_NAME -> director_employee_id -> штатний директор ---
-            if not ctx.get("director_full_name"):
-                val = None
-                try:
-                    val = db.get_setting("DIRECTOR_FULL_NAME")
-                except Exception:
-                    val = None
-                if not val:
-                    try:
-                        dir_id = db.get_setting("director_employee_id")
-                        if dir_id:
-                            row = db.fetch_one("""
-                                SELECT TRIM(
-                                    COALESCE(last_name,'') || ' ' ||
-                                    COALESCE(first_name,'') || 
-                                    CASE WHEN IFNULL(middle_name,'')<>'' THEN ' '||middle_name ELSE '' END
-                                ) AS full_name
-                                FROM employees
-                                WHERE id = ?
-                            """, (dir_id,))
-                            val = (row or {}).get("full_name")
-                    except Exception:
-                        pass
-                if not val:
-                    try:
-                        val = db.get_active_director_name()
-                    except Exception:
-                        val = None
-                ctx["director_full_name"] = val or ""
-
-        
-
-
-
-            from docxtpl import DocxTemplate
-            out_path = DOCS_DIR / f"emp_{employee_id:04d}_doc_{doc_id:06d}_signed.docx"
-            tpl = DocxTemplate(str(tpl_path))
-            tpl.render(ctx)
-            tpl.save(str(out_path))
-
-            # ---------- ОНОВЛЕННЯ БД ----------
-            signed_by = (self.current_user or {}).get("username", "")
-            db.execute_query(
-                "UPDATE documents SET status='signed', signed_by=?, signed_at=CURRENT_TIMESTAMP, "
-                "file_docx=?, context_json=?, updated_at=CURRENT_TIMESTAMP WHERE id=?",
-                (signed_by, str(out_path), json.dumps(context, ensure_ascii=False), doc_id)
-            )
-
-            # щоб блок «Стажування» оновився без натискання «Оновити»
-            try:
-                self.load_internship_summary()
-                self.load_training_reminder()
-                self.load_vacation_note()
-            except Exception:
-                pass
+        # --- додати дату підпису працівника у payload ---
+        today = date.today()
+        context["employee_sign_day"]   = f"{today.day:02d}"
+        context["employee_sign_month"] = f"{today.month:02d}"
+        context["employee_sign_year"]  = f"{today.year}"
+
+        signed_by = (self.current_user or {}).get("username", "")
+        self._start_render_job(
+            "Підпис", "Не вдалося підписати",
+            self._sign_job,
+            doc_id, doc.get("type"), int(doc.get("employee_id") or 0), context, signed_by,
+            on_done=self._after_sign,
+        )
 
-            # Після оновлення documents → signed
+    def _sign_job(self, job, doc_id: int, doc_type: str, employee_id: int, context: dict, signed_by: str) -> str:
+        """Фонова частина підпису: рендер → sha256 → одна транзакція в БД."""
+        out_path = DOCS_DIR / f"emp_{employee_id:04d}_doc_{doc_id:06d}_signed.docx"
+        # рендеримо в тимчасовий файл і ставимо на місце лише після підпису в БД:
+        # документ могли відхилити, поки працівник підписував (sign_document тоді падає)
+        part_path = out_path.with_name(out_path.stem + ".part.docx")
+        try:
+            job.progress(20, "Формування підписаного документа…")
+            render_document(doc_type, context, part_path)
+            job.check()
+
+            job.progress(70, "Обчислення контрольної суми…")
+            file_hash = file_sha256(part_path)
+
+            job.progress(85, "Збереження підпису…")
+            job.begin_commit()
+            doc_type = db.sign_document(doc_id, signed_by, context, str(out_path), file_hash)
+        except BaseException:
+            part_path.unlink(missing_ok=True)
+            raise
+        os.replace(part_path, out_path)
+        return doc_type
+
+    def _after_sign(self, doc_type: str):
+        # щоб блоки «Стажування»/«Навчання»/«Відпустка» оновились без натискання «Оновити»
+        try:
+            self.load_internship_summary()
+            self.load_training_reminder()
+            self.load_vacation_note()
             if doc_type == "P4":
-                # 1) помітити працівника як звільненого
-                db.execute_query("""
-                    UPDATE employees
-                    SET dismissal_date = DATE('now'),
-                        employment_status = 'звільнений',
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                """, (employee_id,))
-
-                # 2) (необов'язково) деактивувати користувача
-                db.execute_query("""
-                    UPDATE users
-                    SET is_active = 0
-                    WHERE employee_id = ?
-                """, (employee_id,))
-
-                # 5) Автооновити вкладки після підпису
-                try:
-                    self.load_profile()   # статус, дати тощо
-                    self.refresh_docs()   # список документів
-                    # (не обов'язково, але можна ще раз підстрахуватися)
-                    self.load_internship_summary()
-                except Exception:
-                    pass
-
-
-
-
-            # === проставляємо дату прийняття в employees, якщо ще не стоїть ===
-            hire_date = context.get("hire_date") or context.get("start_date")
-            if hire_date:
-                db.execute_query(
-                    "UPDATE employees SET hire_date = COALESCE(hire_date, ?) WHERE id = ?",
-                    (hire_date, employee_id)
-                )
-
-
-
-                        # ---------- [NEW] ЛОГ У signatures ----------
-            # хто підписав
-            row = db.fetch_one("SELECT id, role FROM users WHERE username = ?", (signed_by,))
-            user_id = row["id"] if row else None
-            role_for_log = (row["role"] if row else "employee") or "employee"
-
-            # хеш фінального DOCX (для контролю цілісності)
-            import hashlib, json as _json
-            with open(out_path, "rb") as f:
-                file_hash = hashlib.sha256(f.read()).hexdigest()
-
-            db.execute_query(
-                "INSERT INTO signatures(document_id, user_id, role, signature_data) "
-                "VALUES (?, ?, ?, ?)",
-                (
-                    doc_id,
-                    user_id,
-                    role_for_log,
-                    _json.dumps(
-                        {
-                            "method": "click-to-sign",
-                            "file_hash_sha256": file_hash,
-                            "file_path": str(out_path)
-                        },
-                        ensure_ascii=False
-                    )
-                )
-            )
-
-
-            # Оновити список
-            self.refresh_docs()
-            messagebox.showinfo("Підпис", "Документ успішно підписано.")
+                self.load_profile()   # статус, дати тощо
+        except Exception:
+            pass
 
-        except Exception as e:
-            messagebox.showerror("Підпис", f"Не вдалося підписати: {e}")
+        # Оновити список
+        self.refresh_docs()
+        messagebox.showinfo("Підпис", "Документ успішно підписано.")
 
 
 
@@ -1026,66 +647,23 @@ class EmployeeMainWindow(ctk.CTk):
         if not doc:
             messagebox.showerror("Перегляд", "Документ не знайдено.")
             return
-        try:
-            ctx = json.loads(doc.get("context_json") or "{}")
-        except Exception as e:
-            messagebox.showerror("Перегляд", f"Пошкоджений вміст документа: {e}")
-            return
-        try:
-            path = self._render_preview_docx(
-                doc_type=doc.get("type"),
-                context=ctx,
-                employee_id=int(doc.get("employee_id") or 0),
-                doc_id=int(doc.get("id") or 0),
-            )
-            self._open_with_default_app(path)
-        except Exception as e:
-            messagebox.showerror("Перегляд", f"Не вдалося згенерувати прев'ю: {e}")
+        self._preview_document(doc)
 
 
     def load_training_reminder(self):
         """Шукає найближчий TRAINING (sent/signed) з майбутньою датою старту і показує компактну плашку."""
         self._training_doc_id = None
         try:
-            rows = db.fetch_all("""
-                SELECT id, type, status, context_json
-                FROM documents
-                WHERE employee_id = ?
-                  AND type = 'TRAINING'
-                  AND status IN ('sent','signed')
-                ORDER BY created_at DESC
-            """, (self.employee_id,))
-
-            from datetime import datetime, date
-            today = date.today()
-
-            best = None  # (doc, ctx, tr, start_date_obj)
-            for r in rows:
-                try:
-                    ctx = json.loads(r.get("context_json") or "{}")
-                except Exception:
-                    ctx = {}
-
-                tr = (ctx.get("training") or {}) if isinstance(ctx.get("training"), dict) else {}
-                s_iso = (tr.get("start_date") or "").strip()
-                if not s_iso:
-                    continue
-                try:
-                    s_dt = datetime.strptime(s_iso, "%Y-%m-%d").date()
-                except Exception:
-                    continue
-                # показуємо тільки майбутні/сьогоднішні
-                if s_dt >= today:
-                    if (best is None) or (s_dt < best[3]):
-                        best = (r, ctx, tr, s_dt)
-
-            if not best:
+            # найближче sent/signed навчання зі стартом від сьогодні — один індексний пошук
+            tr = db.get_next_training(self.employee_id)
+            if not tr:
                 # немає що показувати
                 self.training_frame.grid_remove()
                 return
 
-            r, ctx, tr, s_dt = best
-            e_iso = (tr.get("end_date") or "").strip()
+            from datetime import datetime, date
+            today = date.today()
+            s_dt = datetime.strptime(tr["start_date"], "%Y-%m-%d").date()
 
             # форматування
             def fmt(iso):
@@ -1100,11 +678,11 @@ class EmployeeMainWindow(ctk.CTk):
             e_str = fmt(tr.get("end_date"))
 
             # заголовок
-            title = f"Підвищення кваліфікації: {tr.get('title','')}".strip()
+            title = f"Підвищення кваліфікації: {tr.get('title') or ''}".strip()
             self._tr_title_var.set(title or "Підвищення кваліфікації")
 
             # мета-рядок
-            meta_bits = [tr.get("provider",""), tr.get("format",""), tr.get("place","")]
+            meta_bits = [tr.get("provider") or "", tr.get("format") or "", tr.get("place") or ""]
             self._tr_meta_var.set(" • ".join([b for b in meta_bits if b]).strip(" •"))
 
             # період + дні до старту
@@ -1114,11 +692,11 @@ class EmployeeMainWindow(ctk.CTk):
             self._tr_period_var.set((period + left_txt).strip())
 
             # бейдж статусу
-            badge = "Потрібен підпис" if (r.get("status") == "sent") else "Підтверджено"
+            badge = "Потрібен підпис" if (tr.get("status") == "sent") else "Підтверджено"
             self._tr_badge_var.set(badge)
 
             # збережемо doc_id для кнопки
-            self._training_doc_id = r.get("id")
+            self._training_doc_id = tr.get("doc_id")
 
             # показати плашку
             self.training_frame.grid()
@@ -1136,26 +714,11 @@ class EmployeeMainWindow(ctk.CTk):
         if not doc:
             messagebox.showerror("Перегляд", "Документ не знайдено.")
             return
-        try:
-            ctx = json.loads(doc.get("context_json") or "{}")
-        except Exception as e:
-            messagebox.showerror("Перегляд", f"Пошкоджений вміст документа: {e}")
-            return
-        try:
-            path = self._render_preview_docx(
-                doc_type=doc.get("type"),
-                context=ctx,
-                employee_id=int(doc.get("employee_id") or 0),
-                doc_id=int(doc.get("id") or 0),
-            )
-            self._open_with_default_app(path)
-        except Exception as e:
-            messagebox.showerror("Перегляд", f"Не вдалося згенерувати прев'ю: {e}")
+        self._preview_document(doc)
 
 
     def load_vacation_note(self):
         """Показує коротке повідомлення у профілі, якщо працівник зараз у відпустці (за підписаним наказом VACATION)."""
-        import json
         from datetime import date, datetime
 
         # за замовчуванням ховаємо
@@ -1166,43 +729,21 @@ class EmployeeMainWindow(ctk.CTk):
             pass
 
         try:
-            rows = db.fetch_all("""
-                SELECT id, status, context_json
-                FROM documents
-                WHERE employee_id = ? AND type = 'VACATION' AND status = 'signed'
-                ORDER BY COALESCE(signed_at, created_at) DESC
-            """, (self.employee_id,))
+            vac = db.get_current_vacation(self.employee_id)
         except Exception:
-            rows = []
+            vac = None
+        if not vac:
+            return   # актуальної відпустки немає — рядок лишається прихованим
 
         today = date.today()
-
-        for r in rows:
-            try:
-                ctx = r.get("context_json") or {}
-                if not isinstance(ctx, dict):
-                    ctx = json.loads(ctx)
-                vac = (ctx.get("vacation") or {})
-                s = vac.get("start_date")
-                e = vac.get("end_date")
-                if not (s and e):
-                    continue
-
-                sdt = datetime.strptime(s, "%Y-%m-%d").date()
-                edt = datetime.strptime(e, "%Y-%m-%d").date()
-
-                if sdt <= today <= edt:
-                    # формат дати ДД.ММ.РРРР
-                    def fmt(d): return f"{d.day:02d}.{d.month:02d}.{d.year}"
-                    days_left = (edt - today).days + 1
-                    vac_type = vac.get("type") or ""
-                    note = f"Зараз у відпустці{f' ({vac_type})' if vac_type else ''} до {fmt(edt)} • залишилось {days_left} дн."
-                    self._vacation_note_var.set(note)
-                    self.vacation_note.grid()   # показати рядок
-                    return
-            except Exception:
-                continue
-        # Якщо актуальної відпустки не знайшли — залишаємо прихованим
+        edt = datetime.strptime(vac["end_date"], "%Y-%m-%d").date()
+        # формат дати ДД.ММ.РРРР
+        def fmt(d): return f"{d.day:02d}.{d.month:02d}.{d.year}"
+        days_left = (edt - today).days + 1
+        vac_type = vac.get("type") or ""
+        note = f"Зараз у відпустці{f' ({vac_type})' if vac_type else ''} до {fmt(edt)} • залишилось {days_left} дн."
+        self._vacation_note_var.set(note)
+        self.vacation_note.grid()   # показати рядок
 
 
 
@@ -1,14 +1,23 @@
 # src/hr_main_window.py
-from datetime import datetime
 from tkinter import ttk
 import customtkinter as ctk
 import db_manager as db
+from tree_sync import TableBinding
+from virtual_table import VirtualTable
+from search_index import EmployeeSearchIndex
+from change_bus import ChangeBus
+from render_service import RenderService
 from tkinter import messagebox
 from documents_tab import DocumentsTab
 from p1_create_form import P1CreateForm
 from internships_tab import InternshipsTab
+from leave_tab import LeaveBalancesTab
 import json
 
+LOCAL_INDEX_LIMIT = 20000   # до стількох працівників пошук/фільтри/сортування — в пам'яті, далі — посторінково з БД
+BADGE_REFRESH_MS = 15 * 60_000   # бейджі залежать і від дати (прострочення) — рідкісне оновлення за часом
+MAINTENANCE_CHECK_MS = 60 * 60_000   # як часто перевіряти, чи не час для db.run_maintenance()
+
 
 
 class DashboardTab(ctk.CTkFrame):
@@ -31,8 +40,28 @@ class DashboardTab(ctk.CTkFrame):
             card.grid(row=0, column=i, padx=10, pady=10, sticky="nsew")
             kpi_wrap.grid_columnconfigure(i, weight=1)
 
+        # Найближчі навчання (training_events) — діапазонний запит по даті старту
+        tr_wrap = ctk.CTkFrame(self, corner_radius=12)
+        tr_wrap.pack(fill="both", expand=True, padx=10, pady=(6, 10))
+        ctk.CTkLabel(tr_wrap, text=f"Навчання в найближчі {db.UPCOMING_TRAINING_DAYS} днів",
+                     font=ctk.CTkFont(size=16, weight="bold")).pack(anchor="w", padx=12, pady=(10, 4))
+
+        cols = ("start", "end", "full_name", "department", "title", "provider", "status")
+        self.tr_tree = ttk.Treeview(tr_wrap, columns=cols, show="headings", height=8)
+        self.tr_binding = TableBinding(self.tr_tree)
+        headings = {
+            "start": "Початок", "end": "Кінець", "full_name": "ПІБ", "department": "Відділення",
+            "title": "Програма", "provider": "Організатор", "status": "Статус",
+        }
+        for k, v in headings.items():
+            self.tr_tree.heading(k, text=v)
+            self.tr_tree.column(k, width=110 if k in ("start", "end", "status") else 220,
+                                anchor="center" if k in ("start", "end", "status") else "w")
+        self.tr_tree.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
         # Завантажити дані KPI
         self.reload_kpis()
+        self.reload_trainings()
 
     def _kpi_card(self, parent, title, value_text):
         frame = ctk.CTkFrame(parent, corner_radius=12)
@@ -46,10 +75,8 @@ class DashboardTab(ctk.CTkFrame):
 
     def reload_kpis(self):
         try:
-            total = db.count_employees_total()
-            hired = db.count_employees_hired_last_30d()
-            dismissed = db.count_employees_dismissed_last_30d()
-            deps = db.count_departments()
+            snap = db.get_dashboard_snapshot()
+            total, hired, dismissed, deps = snap["total"], snap["hired_30d"], snap["dismissed_30d"], snap["departments"]
         except Exception as e:
             total = hired = dismissed = deps = "—"
             print("KPI error:", e)
@@ -59,6 +86,21 @@ class DashboardTab(ctk.CTkFrame):
         self.kpi_dismissed.value_lbl.configure(text=str(dismissed))
         self.kpi_deps.value_lbl.configure(text=str(deps))
 
+    def reload_trainings(self):
+        try:
+            rows = db.list_upcoming_trainings()
+        except Exception as e:
+            rows = []
+            print("Upcoming trainings error:", e)
+        status_text = {"sent": "на підписі", "signed": "підтверджено"}
+        self.tr_binding.sync(
+            (r["doc_id"], (
+                r["start_date"], r["end_date"] or "", r["full_name"], r["department"] or "—",
+                r["title"] or "", r["provider"] or "", status_text.get(r["status"], r["status"]),
+            ))
+            for r in rows
+        )
+
 
 class EmployeesTab(ctk.CTkFrame):
     """Таблиця + сортування + пошук + фільтри + панель дій (Edit працює)."""
@@ -68,8 +110,10 @@ class EmployeesTab(ctk.CTkFrame):
 
         # ---- Стан ----
         self.current_sort = {"col": None, "direction": "asc"}
-        self.all_rows = []   # повний набір (з id!)
-        self.rows = []       # відфільтрований набір
+        self.all_rows = {}   # id -> рядок (лише в локальному режимі)
+        self.index = EmployeeSearchIndex()
+        self._local = False  # True — усі працівники в пам'яті, запити відповідає self.index
+        self._cursor = None  # курсор наступної сторінки (keyset), None — усе завантажено
         self._search_after_id = None
 
         # ---- Верхня панель: пошук + фільтри ----
@@ -143,8 +187,10 @@ class EmployeesTab(ctk.CTkFrame):
         self.tree = ttk.Treeview(table_frame, columns=self.columns, show="headings", height=20)
         self.tree.pack(fill="both", expand=True, padx=6, pady=6)
 
-        self.tree.configure(yscrollcommand=self.tree_scroll_y.set, xscrollcommand=self.tree_scroll_x.set)
-        self.tree_scroll_y.configure(command=self.tree.yview)
+        # у Treeview лише видиме вікно рядків; вертикальною смугою керує VirtualTable
+        # наступні сторінки з БД підтягуються, коли прокрутка наближається до кінця
+        self.table = VirtualTable(self.tree, self.tree_scroll_y, on_need_more=self._load_next_page)
+        self.tree.configure(xscrollcommand=self.tree_scroll_x.set)
         self.tree_scroll_x.configure(command=self.tree.xview)
 
         headings = {
@@ -175,21 +221,87 @@ class EmployeesTab(ctk.CTkFrame):
         self.tree.bind("<Double-1>", lambda e: self.edit_selected())
 
     # ---------- Дані ----------
-    def load_data(self):
-        """Читає з БД і готує self.all_rows (з id); застосовує пошук/фільтри/сортування і рендер."""
-        emps = db.get_employees()  # тут є e.id
-        self.all_rows = [{
-            "id": e.get("id"),
-            "full_name": e.get("full_name") or "",
-            "email": e.get("email") or "",
-            "phone": e.get("phone") or "",
-            "department": e.get("department") or "",
-            "birth_date": e.get("birth_date") or "",
-            "position": e.get("position") or "",
-            "hire_date": e.get("hire_date") or "",
-            "employment_status": e.get("employment_status") or "",
-        } for e in emps]
-        self.apply_filters()
+    def load_data(self, keep_loaded: bool = True):
+        """
+        Перечитує список з БД.
+        Невеликий штат завантажується повністю в локальний індекс (миттєвий пошук/фільтри);
+        великий — посторінково з першої сторінки з поточними пошуком/фільтрами/сортуванням.
+        keep_loaded — не губити прокрутку (перечитати стільки рядків, скільки вже підвантажено).
+        """
+        if db.count_employees_total() <= LOCAL_INDEX_LIMIT:
+            self._local = True
+            self.all_rows = {r["id"]: r for r in db.get_employees()}
+            self.index.build(self.all_rows.values())
+            self._set_cursor(None)
+            self._render_local(keep_position=keep_loaded)
+            return
+
+        self._local = False
+        self.all_rows = {}
+        self.index.clear()
+        limit = max(db.PAGE_SIZE, len(self.table)) if keep_loaded else db.PAGE_SIZE
+        rows, cursor = self._fetch_page(None, limit)
+        self._set_cursor(cursor)   # до set_rows: рендер може одразу попросити наступну сторінку
+        self.table.set_rows(self._table_rows(rows), keep_position=keep_loaded)
+
+    def refresh_employee(self, emp_id: int):
+        """Точкове оновлення одного працівника після редагування/створення."""
+        if not self._local:
+            self.load_data()
+            return
+        row = db.get_employee_row(emp_id)
+        if row:
+            self.all_rows[row["id"]] = row
+            self.index.upsert(row)
+        else:
+            self.all_rows.pop(emp_id, None)
+            self.index.remove(emp_id)
+        self._render_local(keep_position=True)
+
+    def on_data_changed(self, changes: dict):
+        """Колбек ChangeBus: працівники/довідники змінились (тут або на іншому ПК)."""
+        if "departments" in changes or "positions" in changes:
+            self.dep_menu.configure(values=["Усі"] + [d["name"] for d in db.get_departments()])
+            self.pos_menu.configure(values=["Усі"] + [p["name"] for p in db.get_positions()])
+            self.load_data()   # назви відділень/посад у рядках
+            return
+        ids = changes.get("employees", set())
+        if self._local and None not in ids and len(ids) <= 100:
+            for emp_id in ids:
+                self.refresh_employee(emp_id)
+        else:
+            self.load_data()
+
+    def on_employee_created(self, emp_id: int | None = None):
+        if emp_id is None:
+            self.load_data()
+        else:
+            self.refresh_employee(emp_id)
+
+    def _load_next_page(self):
+        """Підвантаження наступної сторінки, коли прокрутка дійшла до кінця (VirtualTable)."""
+        if self._cursor is None:
+            return
+        rows, cursor = self._fetch_page(self._cursor)
+        self._set_cursor(cursor)
+        self.table.append_rows(self._table_rows(rows))
+
+    def _set_cursor(self, cursor):
+        self._cursor = cursor
+        self.table.has_more = cursor is not None
+
+    def _fetch_page(self, after, limit: int = db.PAGE_SIZE):
+        q = (self.search_var.get() or "").strip()
+        dep = self.dep_var.get(); pos = self.pos_var.get(); status = self.status_var.get()
+        return db.get_employees_page(
+            search=q or None,
+            department=None if dep == "Усі" else dep,
+            position=None if pos == "Усі" else pos,
+            status=None if status == "Усі" else status,
+            sort=self.current_sort["col"],
+            descending=self.current_sort["direction"] == "desc",
+            after=after, limit=limit,
+        )
 
     # ---------- Пошук/фільтри ----------
     def _debounced_search(self):
@@ -198,51 +310,44 @@ class EmployeesTab(ctk.CTkFrame):
         self._search_after_id = self.after(300, self.apply_filters)
 
     def apply_filters(self):
-        q = (self.search_var.get() or "").strip().lower()
-        dep = self.dep_var.get(); pos = self.pos_var.get(); status = self.status_var.get()
-
-        # 1) пошук
-        if not q:
-            filtered = list(self.all_rows)
-        else:
-            def matches(r):
-                hay = " ".join([r["full_name"], r["email"], r["phone"], r["department"], r["position"], r["birth_date"]]).lower()
-                return q in hay
-            filtered = [r for r in self.all_rows if matches(r)]
-
-        # 2) фільтри
-        if dep != "Усі":     filtered = [r for r in filtered if r["department"] == dep]
-        if pos != "Усі":     filtered = [r for r in filtered if r["position"] == pos]
-        if status != "Усі":  filtered = [r for r in filtered if r["employment_status"] == status]
-
-        self.rows = filtered
-
-        # 3) сортування/рендер
-        if self.current_sort["col"]:
-            self.apply_sort()
+        if self._local:
+            self._render_local(keep_position=False)
         else:
-            self.render_rows()
+            # пошук, фільтри і сортування виконує БД — просто перечитуємо з першої сторінки
+            self.load_data(keep_loaded=False)
 
     def clear_filters(self):
         self.search_var.set("")
         self.dep_var.set("Усі"); self.pos_var.set("Усі"); self.status_var.set("Усі")
-        self.rows = list(self.all_rows)
-        if self.current_sort["col"]:
-            self.apply_sort()
-        else:
-            self.render_rows()
+        self.apply_filters()
+
+    def _render_local(self, keep_position: bool):
+        # пошук + три фільтри — перетин множин у self.index, без проходу по всіх рядках
+        dep = self.dep_var.get(); pos = self.pos_var.get(); status = self.status_var.get()
+        ids = self.index.query(
+            self.search_var.get() or "",
+            department=None if dep == "Усі" else dep,
+            position=None if pos == "Усі" else pos,
+            employment_status=None if status == "Усі" else status,
+        )
+        col = self.current_sort["col"] or "full_name"
+        rows = sorted((self.all_rows[i] for i in ids),
+                      key=lambda r: ((r.get(col) or "").lower(), r["id"]),
+                      reverse=self.current_sort["direction"] == "desc")
+        self.table.set_rows(self._table_rows(rows), keep_position=keep_position)
 
     # ---------- Рендер ----------
-    def render_rows(self):
-        for row_id in self.tree.get_children():
-            self.tree.delete(row_id)
-        for r in self.rows:
-            # ВАЖЛИВО: зберігаємо id у iid елемента
-            self.tree.insert("", "end", iid=str(r["id"]), values=(
-                r["full_name"], r["email"], r["phone"],
-                r["department"], r["position"], r["birth_date"], r["hire_date"], r["employment_status"]
+    @staticmethod
+    def _table_rows(rows):
+        # ВАЖЛИВО: id працівника — це ключ (iid) рядка; у Tk потрапляє лише видиме вікно
+        return [
+            (r["id"], (
+                r.get("full_name") or "", r.get("email") or "", r.get("phone") or "",
+                r.get("department") or "", r.get("position") or "", r.get("birth_date") or "",
+                r.get("hire_date") or "", r.get("employment_status") or "",
             ))
-
+            for r in rows
+        ]
 
     # ---------- Сортування ----------
     def sort_by(self, col: str):
@@ -250,25 +355,12 @@ class EmployeesTab(ctk.CTkFrame):
             self.current_sort["direction"] = "desc" if self.current_sort["direction"] == "asc" else "asc"
         else:
             self.current_sort = {"col": col, "direction": "asc"}
-        self.apply_sort()
-
-    def apply_sort(self):
-        col = self.current_sort["col"]; reverse = (self.current_sort["direction"] == "desc")
-
-        def key_func(r):
-            val = r.get(col, "")
-            if col in ("hire_date","birth_date") and val:
-                try: return datetime.fromisoformat(val)
-                except ValueError: return datetime.min
-            return (val or "").lower()
-
-        self.rows.sort(key=key_func, reverse=reverse)
-        self.render_rows(); self.update_heading_arrows()
+        self.apply_filters(); self.update_heading_arrows()
 
     def update_heading_arrows(self):
         headings = {
             "full_name": "ПІБ", "email": "Email", "phone": "Телефон",
-            "department": "Відділення", "position": "Посада",
+            "department": "Відділення", "position": "Посада", "birth_date": "Дата народження",
             "hire_date": "Дата прийняття", "employment_status": "Статус",
         }
         for col in self.columns:
@@ -279,7 +371,7 @@ class EmployeesTab(ctk.CTkFrame):
 
     # ---------- Дії ----------
     def edit_selected(self):
-        sel = self.tree.selection()
+        sel = self.table.selection()
         if not sel:
             messagebox.showwarning("Редагування", "Будь ласка, виберіть працівника у таблиці.")
             return
@@ -288,7 +380,7 @@ class EmployeesTab(ctk.CTkFrame):
         if not data:
             messagebox.showerror("Редагування", "Не вдалося отримати дані працівника.")
             return
-        EditEmployeeDialog(self, emp_id, data, on_saved=self.load_data)
+        EditEmployeeDialog(self, emp_id, data, on_saved=lambda: self.refresh_employee(emp_id))
 
 
 class EditEmployeeDialog(ctk.CTkToplevel):
@@ -460,6 +552,7 @@ class HRMainWindow(ctk.CTk):
         self.internships_tab = self.tabview.add("Стажування")
         self.directories_tab = self.tabview.add("Довідники")   # НОВЕ
         self.documents_tab = self.tabview.add("Документи")
+        self.leave_tab = self.tabview.add("Відпустки")
         
 
         # Головна
@@ -474,6 +567,8 @@ class HRMainWindow(ctk.CTk):
         # Стажування
         intern_tab = InternshipsTab(self.internships_tab)
         intern_tab.pack(fill="both", expand=True)
+        self.internships_view = intern_tab
+        intern_tab.on_urgency_counts = self._set_internships_badge
 
         # Довідники (нова split-view вкладка)
         dirs_tab = DirectoriesTab(self.directories_tab)
@@ -484,20 +579,57 @@ class HRMainWindow(ctk.CTk):
         docs_tab = DocumentsTab(self.documents_tab, current_user=self.current_user)
         docs_tab.pack(fill="both", expand=True)
         # 👉 колбек автооновлення вкладки "Працівники"
-        docs_tab.on_employee_created = self.employees_view.load_data
+        docs_tab.on_employee_created = self.employees_view.on_employee_created
+
+        # Відпустки: баланси щорічної відпустки (звіт)
+        leave_tab = LeaveBalancesTab(self.leave_tab)
+        leave_tab.pack(fill="both", expand=True)
+
+        # ---- шина змін: вкладки оновлюються лише коли змінились їхні таблиці ----
+        self.change_bus = ChangeBus(self)
+        self.change_bus.subscribe(("employees", "departments"), lambda ch: dash.reload_kpis())
+        # training_events тримають тригери на documents
+        self.change_bus.subscribe(("documents", "employees"), lambda ch: dash.reload_trainings())
+        self.change_bus.subscribe(("employees", "departments", "positions"), self.employees_view.on_data_changed)
+        self.change_bus.subscribe(("internships", "employees"), lambda ch: intern_tab.refresh())
+        self.change_bus.subscribe(("departments", "positions", "department_positions", "employees"),
+                                  lambda ch: dirs_tab.refresh_departments())
+        self.change_bus.subscribe(("documents", "employees"), lambda ch: docs_tab.refresh())
+        self.change_bus.subscribe(("leave_ledger", "employees"), lambda ch: leave_tab.refresh())
+        # бейдж стажувань рахується з того ж результату, що й таблиця (intern_tab.on_urgency_counts)
+        self.change_bus.subscribe(("documents",), lambda ch: self._refresh_docs_badge())
+        self.change_bus.start()
+        self.bind("<Destroy>", lambda e: self.change_bus.stop() if e.widget is self else None, add="+")
 
         # ---- бейдж-числа на вкладках ----
         self._install_badge_updaters()
 
 
-        # ---- АВТО-ЗАВЕРШЕННЯ ПРОСТРОЧЕНИХ СТАЖУВАНЬ ПРИ СТАРТІ ----
-        try:
-            import db_manager as db  # якщо вже є імпорт угорі, цю стрічку можна прибрати
-            db.auto_complete_overdue()   # переведе overdue → completed (за нашою політикою)
-            self.internships_view.refresh()  # оновимо таблицю після автозміни
-        except Exception:
-            pass
+        # ---- РЕГЛАМЕНТНІ ЗАДАЧІ (автозавершення прострочених стажувань тощо) ----
+        # не частіше ніж раз на maintenance.interval_hours; вкладки підхоплять зміни через change_bus.
+        # run_maintenance тримає BEGIN IMMEDIATE секундами (нарахування відпусток тощо) — лише у фоні
+        self.maintenance_service = RenderService(self, max_workers=1)
+        self._maintenance_job = None
+        self.bind("<Destroy>", lambda e: self.maintenance_service.shutdown() if e.widget is self else None, add="+")
+        self._schedule_maintenance()
+
 
+    def _schedule_maintenance(self):
+        if self._maintenance_job is None:   # попередній запуск ще триває — не дублюємо
+            self._maintenance_job = self.maintenance_service.submit(
+                lambda job: db.run_maintenance(),
+                on_done=self._maintenance_done,
+                on_error=self._maintenance_failed,
+                on_cancel=self._maintenance_done,
+            )
+        self.after(MAINTENANCE_CHECK_MS, self._schedule_maintenance)
+
+    def _maintenance_done(self, result=None):
+        self._maintenance_job = None
+
+    def _maintenance_failed(self, e):
+        self._maintenance_job = None
+        print("Помилка регламентних задач:", e)
 
      # для лічильників в назві вкладки       
     def _set_tab_text(self, tab_name: str, new_text: str):
@@ -509,22 +641,30 @@ class HRMainWindow(ctk.CTk):
 
     def refresh_tab_badges(self):
         try:
-            over = db.internships_overdue_count()
-            soon = db.internships_soon_count()
-            docs = db.docs_sent_count()
+            counts = db.internship_urgency_counts()
         except Exception:
-            over = soon = docs = 0
+            counts = {}
+        self._set_internships_badge(counts)
+        self._refresh_docs_badge()
 
-        total_intern_warn = (over or 0) + (soon or 0)
+    def _set_internships_badge(self, counts: dict):
+        # прострочені + ті, що завершуються протягом 14 днів (усі кошики терміновості)
+        total_intern_warn = sum((counts or {}).values())
         intern_label = "Стажування" + (f" • {total_intern_warn}" if total_intern_warn > 0 else "")
-        docs_label   = "Документи"  + (f" • {docs}"               if docs > 0               else "")
-
         self._set_tab_text("Стажування", intern_label)
+
+    def _refresh_docs_badge(self):
+        try:
+            docs = db.docs_sent_count()
+        except Exception:
+            docs = 0
+        docs_label   = "Документи"  + (f" • {docs}"               if docs > 0               else "")
         self._set_tab_text("Документи",  docs_label)
 
     def _install_badge_updaters(self):
+        # зміни в документах/стажуваннях приходять через change_bus; таймер — лише для переходу дат
         self.refresh_tab_badges()
-        self.after(60_000, self._install_badge_updaters)
+        self.after(BADGE_REFRESH_MS, self._install_badge_updaters)
 
 
 
@@ -571,11 +711,14 @@ class DirectoriesTab(ctk.CTkFrame):
         dep_table_frame = ctk.CTkFrame(body, corner_radius=6)
         dep_table_frame.grid(row=2, column=0, sticky="nsew", padx=(10,6), pady=(0,10))
 
-        self.dep_tree = ttk.Treeview(dep_table_frame, columns=("name","emp_count"), show="headings", height=18)
+        self.dep_tree = ttk.Treeview(dep_table_frame, columns=("name","emp_count","active_count"), show="headings", height=18)
+        self.dep_binding = TableBinding(self.dep_tree)
         self.dep_tree.heading("name", text="Назва")
         self.dep_tree.heading("emp_count", text="К-сть працівників")
+        self.dep_tree.heading("active_count", text="З них активних")
         self.dep_tree.column("name", width=320, anchor="w")
         self.dep_tree.column("emp_count", width=140, anchor="center")
+        self.dep_tree.column("active_count", width=120, anchor="center")
         self.dep_tree.pack(fill="both", expand=True, padx=6, pady=6)
 
         self.dep_tree.bind("<<TreeviewSelect>>", lambda e: self.refresh_positions())
@@ -602,11 +745,14 @@ class DirectoriesTab(ctk.CTkFrame):
         pos_table_frame = ctk.CTkFrame(body, corner_radius=6)
         pos_table_frame.grid(row=2, column=1, sticky="nsew", padx=(6,10), pady=(0,10))
 
-        self.pos_tree = ttk.Treeview(pos_table_frame, columns=("name","emp_count"), show="headings", height=18)
+        self.pos_tree = ttk.Treeview(pos_table_frame, columns=("name","emp_count","active_count"), show="headings", height=18)
+        self.pos_binding = TableBinding(self.pos_tree)
         self.pos_tree.heading("name", text="Назва")
         self.pos_tree.heading("emp_count", text="К-сть працівників")
+        self.pos_tree.heading("active_count", text="З них активних")
         self.pos_tree.column("name", width=320, anchor="w")
         self.pos_tree.column("emp_count", width=140, anchor="center")
+        self.pos_tree.column("active_count", width=120, anchor="center")
         self.pos_tree.pack(fill="both", expand=True, padx=6, pady=6)
 
         # Початкове наповнення
@@ -616,19 +762,10 @@ class DirectoriesTab(ctk.CTkFrame):
     # ===== Оновлення таблиць =====
     def refresh_departments(self):
         q = (self.dep_search_var.get() or "").strip().lower()
-        deps = db.get_departments()
-        # додаємо лічильники
-        data = []
-        for d in deps:
-            if q and q not in d["name"].lower():
-                continue
-            cnt = db.count_employees_in_department(d["id"])
-            data.append({"id": d["id"], "name": d["name"], "emp_count": cnt})
-
-        for iid in self.dep_tree.get_children():
-            self.dep_tree.delete(iid)
-        for d in data:
-            self.dep_tree.insert("", "end", iid=str(d["id"]), values=(d["name"], d["emp_count"]))
+        # відділення разом з лічильниками — один запит
+        data = [d for d in db.get_departments_with_counts() if not q or q in d["name"].lower()]
+
+        self.dep_binding.sync((d["id"], (d["name"], d["emp_count"], d["active_count"])) for d in data)
 
         # після оновлення відділень — оновимо й посади (бо фільтр залежить)
         self.refresh_positions()
@@ -637,23 +774,10 @@ class DirectoriesTab(ctk.CTkFrame):
         q = (self.pos_search_var.get() or "").strip().lower()
         # якщо вибране відділення — показуємо тільки дозволені посади
         sel = self.dep_tree.selection()
-        if sel:
-            dep_id = int(sel[0])
-            poss = db.get_positions_by_department(dep_id)
-        else:
-            poss = db.get_all_positions()
-
-        data = []
-        for p in poss:
-            if q and q not in p["name"].lower():
-                continue
-            cnt = db.count_employees_in_position(p["id"])
-            data.append({"id": p["id"], "name": p["name"], "emp_count": cnt})
-
-        for iid in self.pos_tree.get_children():
-            self.pos_tree.delete(iid)
-        for p in data:
-            self.pos_tree.insert("", "end", iid=str(p["id"]), values=(p["name"], p["emp_count"]))
+        poss = db.get_positions_with_counts(int(sel[0]) if sel else None)
+        data = [p for p in poss if not q or q in p["name"].lower()]
+
+        self.pos_binding.sync((p["id"], (p["name"], p["emp_count"], p["active_count"])) for p in data)
 
     # ===== Дії: Відділення =====
     def add_department(self):
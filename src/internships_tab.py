@@ -2,6 +2,7 @@
 from tkinter import ttk, simpledialog
 import customtkinter as ctk
 import db_manager as db
+from tree_sync import TableBinding
 from tkinter import messagebox
 
 class InternshipsTab(ctk.CTkFrame):
@@ -9,6 +10,7 @@ class InternshipsTab(ctk.CTkFrame):
     def __init__(self, master):
         super().__init__(master)
         self.pack_propagate(False)
+        self.on_urgency_counts = None   # колбек {overdue, critical, very_soon, due_soon} після кожного refresh
 
         # ---- Верхня панель ----
         bar = ctk.CTkFrame(self)
@@ -42,6 +44,7 @@ class InternshipsTab(ctk.CTkFrame):
         wrap.pack(fill="both", expand=True, padx=10, pady=(0,10))
 
         self.tree = ttk.Treeview(wrap, columns=("full_name","deptpos","start","planned","days_left","status"), show="headings", height=18, selectmode="extended")
+        self.tree_binding = TableBinding(self.tree)
         self.tree.heading("full_name", text="ПІБ")
         self.tree.heading("deptpos",   text="Відділення / Посада")
         self.tree.heading("start",     text="Початок")
@@ -101,65 +104,41 @@ class InternshipsTab(ctk.CTkFrame):
         except Exception:
             pass
 
-    def _colorize_row(self, iid, days_left, status):
-        if status != "active":
-            return
-        try:
-            d = int(days_left)
-        except Exception:
-            return
-
-        if d < 0:
-            self.tree.item(iid, tags=("overdue",))
-        elif d <= 1:
-            self.tree.item(iid, tags=("critical",))
-        elif d <= 6:
-            self.tree.item(iid, tags=("very_soon",))
-        elif d <= 14:
-            self.tree.item(iid, tags=("due_soon",))
-
-
-
     # ---- Data ----
     def refresh(self):
-        try:
-            db.auto_complete_overdue()
-        except Exception:
-            pass
-
-        for iid in self.tree.get_children():
-            self.tree.delete(iid)
-
-        rows = db.list_internships(status=self.status_var.get(), search=(self.search_var.get() or "").strip())
-
-        from datetime import date
-        today = date.today()
+        # лише читання: автозавершення прострочених робить db.run_maintenance()
+        status = self.status_var.get()
+        search = (self.search_var.get() or "").strip()
+        rows = db.list_internships(status=status, search=search)
 
+        data = []
+        counts = dict.fromkeys(db.URGENCY_BUCKETS, 0)
         for r in rows:
-            # days_left
-            left = ""
-            try:
-                y, m, d = map(int, (r["planned_end_date"] or "").split("-"))
-                from datetime import date as _d
-                dd = (_d(y, m, d) - today).days
-                left = str(dd)
-            except Exception:
-                pass
-
+            urgency = r.get("urgency")   # overdue / critical / very_soon / due_soon (лише active)
+            if urgency:
+                counts[urgency] += 1
             dep = r.get("department_name") or "—"
             pos = r.get("position_name") or "—"
-            iid = str(r["id"])
-            self.tree.insert(
-                "", "end", iid=iid, values=(
+            data.append((
+                r["id"], (
                     r.get("full_name",""),
                     f"{dep} / {pos}",
                     r.get("start_date",""),
                     r.get("planned_end_date",""),
-                    left,
+                    "" if r.get("days_left") is None else str(r["days_left"]),
                     r.get("status","")
-                )
-            )
-            self._colorize_row(iid, left, r.get("status",""))
+                ),
+                (urgency,) if urgency else ()
+            ))
+
+        # оновлюємо лише змінені рядки (виділення незмінених зберігається)
+        self.tree_binding.sync(data)
+
+        # лічильники для бейджа: без фільтрів у таблиці вже всі active — беремо з того ж результату
+        if callable(self.on_urgency_counts):
+            if status not in ("active", "усі") or search:
+                counts = db.internship_urgency_counts()
+            self.on_urgency_counts(counts)
 
     # ---- Actions ----
     def action_extend(self):
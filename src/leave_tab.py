@@ -0,0 +1,88 @@
+# src/leave_tab.py
+from tkinter import ttk
+import customtkinter as ctk
+import db_manager as db
+from virtual_table import VirtualTable
+
+class LeaveBalancesTab(ctk.CTkFrame):
+    """Вкладка 'Відпустки': залишок щорічної основної відпустки за поточний робочий рік (leave_balances)."""
+    def __init__(self, master):
+        super().__init__(master)
+        self.pack_propagate(False)
+
+        # ---- Верхня панель ----
+        bar = ctk.CTkFrame(self)
+        bar.pack(fill="x", padx=10, pady=(10,6))
+
+        ctk.CTkLabel(bar, text="Відділення:").pack(side="left", padx=(6,6))
+        self.dep_var = ctk.StringVar(value="усі")
+        self.dep_filter = ctk.CTkComboBox(
+            bar, values=["усі"] + [d["name"] for d in db.get_departments_list()],
+            variable=self.dep_var, width=260, command=lambda _=None: self.refresh()
+        )
+        self.dep_filter.pack(side="left")
+
+        ctk.CTkLabel(bar, text="   Пошук:").pack(side="left", padx=(12,6))
+        self.search_var = ctk.StringVar()
+        self.search_entry = ctk.CTkEntry(bar, textvariable=self.search_var, width=240, placeholder_text="ПІБ / Посада")
+        self.search_entry.pack(side="left")
+        self.search_entry.bind("<Return>", lambda e: self.refresh())
+        ctk.CTkButton(bar, text="Знайти", width=90, command=self.refresh).pack(side="left", padx=6)
+
+        ctk.CTkButton(bar, text="Оновити", width=110, command=self.refresh).pack(side="right", padx=6)
+
+        self.summary_lbl = ctk.CTkLabel(self, text="", anchor="w")
+        self.summary_lbl.pack(fill="x", padx=16, pady=(0,4))
+
+        # ---- Таблиця ----
+        wrap = ctk.CTkFrame(self, corner_radius=8)
+        wrap.pack(fill="both", expand=True, padx=10, pady=(0,10))
+
+        cols = ("full_name", "department", "position", "work_year", "accrued", "used", "remaining")
+        self.tree = ttk.Treeview(wrap, columns=cols, show="headings", height=18)
+        headings = {
+            "full_name": "ПІБ", "department": "Відділення", "position": "Посада",
+            "work_year": "Робочий рік", "accrued": "Нараховано", "used": "Використано", "remaining": "Залишок",
+        }
+        for k, v in headings.items():
+            self.tree.heading(k, text=v)
+            numeric = k in ("accrued", "used", "remaining")
+            self.tree.column(k, width=110 if numeric else 220, anchor="center" if numeric else "w", stretch=True)
+        self.tree.column("work_year", width=200, anchor="center")
+
+        yscroll = ttk.Scrollbar(wrap, orient="vertical")
+        self.tree.pack(side="left", fill="both", expand=True, padx=6, pady=6)
+        yscroll.pack(side="right", fill="y")
+
+        self.tree.tag_configure("exhausted", background="#FFB3B3")   # днів не лишилось / перевитрата
+        self.tree.tag_configure("no_balance", foreground="#888")     # рік ще не нараховано
+
+        # тисячі працівників — у Treeview лише видиме вікно рядків
+        self.table = VirtualTable(self.tree, yscroll)
+        self.refresh()
+
+    # ---- Data ----
+    def refresh(self):
+        dep = self.dep_var.get()
+        rows = db.list_leave_balances(
+            search=(self.search_var.get() or "").strip(),
+            department=None if dep == "усі" else dep,
+        )
+        data = []
+        total_remaining = 0
+        for r in rows:
+            if r["work_year_start"] is None:
+                values = (r["full_name"], r["department"] or "—", r["position"] or "—", "—", "—", "—", "—")
+                tags = ("no_balance",)
+            else:
+                total_remaining += r["remaining"]
+                values = (
+                    r["full_name"], r["department"] or "—", r["position"] or "—",
+                    f'{r["work_year_start"]} — {r["work_year_end"]}',
+                    r["accrued"], r["used"], r["remaining"],
+                )
+                tags = ("exhausted",) if r["remaining"] <= 0 else ()
+            data.append((r["id"], values, tags))
+        self.table.set_rows(data)
+        self.summary_lbl.configure(
+            text=f"Працівників: {len(rows)} • невикористаних днів щорічної основної: {total_remaining}")
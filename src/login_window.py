@@ -1,15 +1,13 @@
 # src/login_window.py
 
 import customtkinter as ctk
-import sqlite3
 from tkinter import messagebox
+import db_manager as db
 
 # === Налаштування теми ===
 ctk.set_appearance_mode("light")
 ctk.set_default_color_theme("blue")
 
-DB_PATH = r"D:/Projects/hr_is/data/hr_system.db"  # перевір, що шлях вірний для твоєї структури
-
 def authenticate(username: str, password: str):
     """
     Повертає кортеж (ok: bool, role: str | None, employee_id: int | None, err: str | None)
@@ -18,21 +16,17 @@ def authenticate(username: str, password: str):
         return False, None, None, "Введіть логін і пароль."
 
     try:
-        con = sqlite3.connect(DB_PATH)
-        cur = con.cursor()
-        cur.execute(
+        row = db.fetch_one(
             "SELECT role, employee_id, is_active FROM users WHERE username = ? AND password = ?",
             (username.strip(), password.strip())
         )
-        row = cur.fetchone()
-        con.close()
     except Exception as e:
         return False, None, None, f"Помилка БД: {e}"
 
     if row is None:
         return False, None, None, "Невірний логін або пароль."
 
-    role, employee_id, is_active = row[0], row[1], row[2]
+    role, employee_id, is_active = row["role"], row["employee_id"], row["is_active"]
     if is_active is not None and int(is_active) == 0:
         return False, None, None, "Обліковий запис деактивовано."
 
@@ -111,4 +105,7 @@ button_exit.pack()
 app.bind("<Return>", lambda e: button_login.invoke())  # Enter = натиснути "Увійти"
 
 # Запуск
-app.mainloop()
+if __name__ == "__main__":
+    # стартова перевірка профілю SQLite (WAL, synchronous, mmap...): друкує лише розбіжності
+    db.report_db_profile()
+    app.mainloop()
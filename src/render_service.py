@@ -0,0 +1,160 @@
+# src/render_service.py
+"""
+Фонове виконання довгих операцій (рендер DOCX, хешування, запис у БД),
+щоб головний потік Tk не блокувався.
+
+Функція задачі виконується у пулі потоків і отримує першим аргументом
+RenderJob — через нього вона повідомляє прогрес (job.progress) і
+перевіряє скасування (job.check). Колбеки on_done / on_error /
+on_progress / on_cancel викликаються в головному потоці через after().
+
+    service = RenderService(window)
+    job = service.submit(render_fn, doc_id,
+                         on_done=lambda path: ..., on_error=lambda e: ...)
+    job.cancel()
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import db_manager as db
+
+RENDER_WORKERS = 2     # паралельних задач рендеру
+POLL_MS = 50           # як часто головний потік забирає результати
+
+
+class JobCancelled(Exception):
+    """Задачу скасовано користувачем."""
+
+
+class RenderJob:
+    def __init__(self, service, on_done=None, on_error=None, on_progress=None, on_cancel=None):
+        self._service = service
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._committing = False
+        self.future = None
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_cancel = on_cancel
+        self.finished = False
+
+    # --- викликається з потоку задачі ---
+    def progress(self, percent: int, text: str = ""):
+        self._service._post(self, "progress", (percent, text))
+
+    def check(self):
+        """Перервати задачу, якщо її скасовано (викликати між кроками)."""
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def begin_commit(self):
+        """Точка неповернення: після неї (напр. запис у БД) задачу вже не скасувати."""
+        with self._lock:
+            self.check()
+            self._committing = True
+
+    # --- викликається з головного потоку ---
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self) -> bool:
+        """False — задача вже фіксує результат і буде доведена до кінця."""
+        with self._lock:
+            if self._committing:
+                return False
+            self._cancel_event.set()
+        if self.future is not None and self.future.cancel():
+            # задача ще не стартувала — повідомляємо одразу
+            self._service._post(self, "cancelled", None)
+        return True
+
+
+class RenderService:
+    def __init__(self, widget, max_workers: int = RENDER_WORKERS, poll_ms: int = POLL_MS):
+        self._widget = widget
+        self._poll_ms = poll_ms
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="render")
+        self._events = queue.Queue()
+        self._jobs = set()
+        self._polling = False
+        self._closed = False
+
+    def submit(self, fn, *args, on_done=None, on_error=None, on_progress=None, on_cancel=None, **kwargs) -> RenderJob:
+        """Ставить fn(job, *args, **kwargs) у чергу пулу. Викликати з головного потоку."""
+        if self._closed:
+            raise RuntimeError("Сервіс рендеру вже зупинено.")
+        job = RenderJob(self, on_done, on_error, on_progress, on_cancel)
+        self._jobs.add(job)
+        job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        self._schedule_poll()
+        return job
+
+    def busy(self) -> bool:
+        return bool(self._jobs)
+
+    def cancel_all(self):
+        for job in list(self._jobs):
+            job.cancel()
+
+    def shutdown(self):
+        """Скасувати всі задачі й зупинити пул (при закритті вікна)."""
+        self._closed = True
+        self.cancel_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ---------- потік задачі ----------
+    def _run(self, job, fn, args, kwargs):
+        try:
+            job.check()
+            # підключення з пулу db_manager, щоб не плодити нові на кожен потік
+            with db.checkout_connection():
+                result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            self._post(job, "cancelled", None)
+        except Exception as e:
+            self._post(job, "error", e)
+        else:
+            self._post(job, "done", result)
+
+    def _post(self, job, kind, payload):
+        self._events.put((job, kind, payload))
+
+    # ---------- головний потік ----------
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self._widget.after(self._poll_ms, self._poll)
+
+    def _poll(self):
+        self._polling = False
+        while True:
+            try:
+                job, kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if job.finished:
+                continue
+            if kind == "progress":
+                if job.on_progress and not job.cancelled:
+                    job.on_progress(*payload)
+                continue
+
+            job.finished = True
+            self._jobs.discard(job)
+            if kind == "cancelled" or (kind == "done" and job.cancelled):
+                callback, arg = job.on_cancel, ()
+            elif kind == "error":
+                callback, arg = job.on_error, (payload,)
+            else:
+                callback, arg = job.on_done, (payload,)
+            if callback and not self._closed:
+                try:
+                    callback(*arg)
+                except Exception as e:
+                    print("Помилка у колбеку фонової задачі:", e)
+
+        if self._jobs and not self._closed:
+            self._schedule_poll()
@@ -0,0 +1,136 @@
+# src/search_index.py
+"""
+In-memory індекс для миттєвого пошуку працівників на клієнті.
+
+Будується один раз зі списку рядків (як повертає db.get_employees) і далі
+оновлюється точково (upsert / remove) після редагування чи створення
+працівника. Запит = перетин множин id:
+  - текст ≥ 3 символів: posting-списки триграм (підрядок у будь-якому полі),
+    кандидати звіряються з самим текстом;
+  - текст з 1–2 символів: префікси слів (як у FTS-пошуку на сервері);
+  - фільтри відділення / посада / статус: готові множини id під кожне значення.
+
+    index = EmployeeSearchIndex()
+    index.build(rows)
+    ids = index.query("іван", department="Хірургія", status="активний")
+"""
+import re
+from collections import defaultdict
+
+TEXT_FIELDS = ("full_name", "email", "phone", "department", "position", "birth_date")
+FACETS = ("department", "position", "employment_status")
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+class EmployeeSearchIndex:
+    def __init__(self, text_fields=TEXT_FIELDS, facets=FACETS):
+        self.text_fields = tuple(text_fields)
+        self.facet_fields = tuple(facets)
+        self.clear()
+
+    def clear(self):
+        self._text = {}                                  # id -> текст для звірки (нижній регістр)
+        self._values = {}                                # id -> значення фасетів
+        self._trigrams = defaultdict(set)                # триграма -> {id}
+        self._prefixes = defaultdict(set)                # 1–2 перші символи слова -> {id}
+        self._facets = {f: defaultdict(set) for f in self.facet_fields}
+        self._all = set()
+
+    # ---------- наповнення ----------
+    def build(self, rows):
+        self.clear()
+        for row in rows:
+            self._add(row)
+
+    def upsert(self, row):
+        self.remove(row["id"])
+        self._add(row)
+
+    def remove(self, key) -> bool:
+        text = self._text.pop(key, None)
+        if text is None:
+            return False
+        for gram in _trigrams(text):
+            _discard(self._trigrams, gram, key)
+        for prefix in _prefixes(text):
+            _discard(self._prefixes, prefix, key)
+        for field, value in self._values.pop(key).items():
+            _discard(self._facets[field], value, key)
+        self._all.discard(key)
+        return True
+
+    def __len__(self):
+        return len(self._all)
+
+    def __contains__(self, key):
+        return key in self._all
+
+    def _add(self, row):
+        key = row["id"]
+        # \n між полями — щоб триграми не «склеювали» сусідні поля
+        text = "\n".join(str(row.get(f) or "") for f in self.text_fields).lower()
+        self._text[key] = text
+        for gram in _trigrams(text):
+            self._trigrams[gram].add(key)
+        for prefix in _prefixes(text):
+            self._prefixes[prefix].add(key)
+        values = {f: row.get(f) or "" for f in self.facet_fields}
+        self._values[key] = values
+        for field, value in values.items():
+            self._facets[field][value].add(key)
+        self._all.add(key)
+
+    # ---------- запит ----------
+    def query(self, text: str = "", **facets) -> set:
+        """
+        Множина id, що містять text (без урахування регістру) і мають задані
+        значення фасетів (department=..., position=..., employment_status=...).
+        None / "" у фасеті — без фільтра.
+        """
+        sets = []
+        for field, value in facets.items():
+            if value is None or value == "":
+                continue
+            sets.append(self._facets[field].get(value, set()))
+
+        q = (text or "").strip().lower()
+        verify = None
+        if len(q) >= 3:
+            sets.extend(self._trigrams.get(g, set()) for g in _trigrams(q))
+            verify = q
+        elif q:
+            sets.append(self._prefixes.get(q, set()))
+
+        if not sets:
+            return set(self._all)
+        sets.sort(key=len)                               # найменша множина — першою
+        result = set(sets[0])
+        for s in sets[1:]:
+            if not result:
+                break
+            result &= s
+        if verify is not None:
+            # триграми дають надмножину — лишаємо лише справжні входження підрядка
+            result = {k for k in result if verify in self._text[k]}
+        return result
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2) if "\n" not in text[i:i + 3]}
+
+
+def _prefixes(text: str) -> set:
+    out = set()
+    for word in _WORD_RE.findall(text):
+        out.add(word[:1])
+        out.add(word[:2])
+    return out
+
+
+def _discard(postings, key, value):
+    s = postings.get(key)
+    if s is not None:
+        s.discard(value)
+        if not s:
+            del postings[key]
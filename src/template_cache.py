@@ -0,0 +1,95 @@
+# src/template_cache.py
+"""
+Кеш розібраних шаблонів docxtpl.
+
+DocxTemplate(path) щоразу розпаковує .docx і парсить його XML. Кеш тримає
+«чистий» (ще не відрендерений) розібраний документ для кожного шаблону і
+на кожен запит віддає новий DocxTemplate з глибокою копією цього документа —
+рендер копії ніяк не зачіпає оригінал у кеші.
+
+Ключ — шлях до файлу; запис вважається актуальним, доки не змінились
+mtime/розмір файлу (шаблон перезаписали — наступний запит перечитає його).
+
+    from template_cache import get_template
+    tpl = get_template("data/templates/hire_order_P1.docx")
+    tpl.render(ctx)
+    tpl.save(out_path)
+"""
+import copy
+import os
+import threading
+from collections import OrderedDict
+
+from docxtpl import DocxTemplate
+
+TEMPLATE_CACHE_SIZE = 8   # шаблонів у застосунку п'ять — з запасом
+
+
+class TemplateCache:
+    """LRU-кеш розібраних шаблонів з лічильниками влучань/промахів."""
+
+    def __init__(self, max_size: int = TEMPLATE_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._items = OrderedDict()   # path -> (stamp, pristine docx.Document)
+
+    @staticmethod
+    def _stamp(path: str):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self, template_path) -> DocxTemplate:
+        """Новий DocxTemplate, готовий до render(), без повторного парсингу файлу."""
+        path = os.path.abspath(str(template_path))
+        stamp = self._stamp(path)
+
+        with self._lock:
+            item = self._items.get(path)
+            if item and item[0] == stamp:
+                self._items.move_to_end(path)
+                self.hits += 1
+                pristine = item[1]
+            else:
+                pristine = None
+                self.misses += 1
+
+        if pristine is None:
+            # парсимо поза блокуванням — інші шаблони тим часом віддаються з кешу
+            src = DocxTemplate(path)
+            src.init_docx()
+            pristine = src.docx
+            with self._lock:
+                self._items[path] = (stamp, pristine)
+                self._items.move_to_end(path)
+                while len(self._items) > self.max_size:
+                    self._items.popitem(last=False)
+
+        tpl = DocxTemplate(path)
+        tpl.docx = copy.deepcopy(pristine)   # init_docx() не перечитуватиме файл, поки is_rendered=False
+        return tpl
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._items), "max_size": self.max_size,
+                    "hits": self.hits, "misses": self.misses}
+
+
+_cache = TemplateCache()
+
+
+def get_template(template_path) -> DocxTemplate:
+    return _cache.get(template_path)
+
+
+def template_cache_stats() -> dict:
+    return _cache.stats()
+
+
+def clear_template_cache():
+    _cache.clear()
@@ -0,0 +1,118 @@
+# src/tree_sync.py
+"""
+Інкрементне оновлення ttk.Treeview.
+
+Замість «видалити все → вставити все» TableBinding порівнює новий набір
+рядків з тим, що вже показано (за первинним ключем = iid), і робить лише
+потрібні операції: delete для зниклих, insert для нових, item() для
+змінених, move() для переставлених. Оновлення, що зачепило один рядок,
+коштує O(змін) викликів Tk, а не O(n). Виділення незмінених рядків
+зберігається.
+
+    self.binding = TableBinding(self.tree)
+    self.binding.sync((r["id"], (r["name"], r["cnt"])) for r in rows)
+    # з тегами: (iid, values, tags)
+"""
+import bisect
+
+
+class TableBinding:
+    def __init__(self, tree, parent: str = ""):
+        self.tree = tree
+        self.parent = parent
+        self._shown = {}   # iid -> (values, tags), як зараз показано у Treeview
+        self._order = []   # iid у порядку показу
+
+    def sync(self, rows) -> dict:
+        """
+        rows — ітерабельне (key, values) або (key, values, tags) у потрібному порядку.
+        Повертає статистику {'inserted', 'updated', 'moved', 'deleted'}.
+        """
+        tree = self.tree
+        new = {}
+        order = []
+        for row in rows:
+            key, values = row[0], tuple(row[1])
+            tags = tuple(row[2]) if len(row) > 2 and row[2] else ()
+            iid = str(key)
+            if iid in new:
+                continue   # дубль ключа — лишаємо перший
+            new[iid] = (values, tags)
+            order.append(iid)
+
+        # рядки, додані в дерево в обхід binding (напр. до першого sync), вважаємо зниклими
+        if len(tree.get_children(self.parent)) != len(self._order):
+            self._reset_from_tree()
+
+        # 1) видалення — одним викликом
+        removed = [iid for iid in self._order if iid not in new]
+        if removed:
+            tree.delete(*removed)
+            removed_set = set(removed)
+            self._order = [iid for iid in self._order if iid not in removed_set]
+            for iid in removed:
+                self._shown.pop(iid, None)
+
+        # 2) які з уже показаних рядків лишаються на місці (найдовша зростаюча підпослідовність)
+        old_pos = {iid: i for i, iid in enumerate(self._order)}
+        stay = _lis_keys([iid for iid in order if iid in old_pos], old_pos)
+
+        inserted = updated = moved = 0
+        prev = None
+        for iid in order:
+            values, tags = new[iid]
+            if iid not in old_pos:
+                tree.insert(self.parent, self._index_after(prev), iid=iid, values=values, tags=tags)
+                inserted += 1
+            else:
+                if self._shown.get(iid) != (values, tags):
+                    tree.item(iid, values=values, tags=tags)
+                    updated += 1
+                if iid not in stay:
+                    index = self._index_after(prev)
+                    # move() рахує позицію без самого елемента — якщо він стоїть вище, зсуваємось на 1
+                    if tree.index(iid) < index:
+                        index -= 1
+                    tree.move(iid, self.parent, index)
+                    moved += 1
+            prev = iid
+
+        self._shown = new
+        self._order = order
+        return {"inserted": inserted, "updated": updated, "moved": moved, "deleted": len(removed)}
+
+    def _index_after(self, prev) -> int:
+        # індекс питаємо в Tk лише для вставок/переміщень — незмінені рядки не коштують викликів
+        return 0 if prev is None else self.tree.index(prev) + 1
+
+    def clear(self):
+        children = self.tree.get_children(self.parent)
+        if children:
+            self.tree.delete(*children)
+        self._shown = {}
+        self._order = []
+
+    def _reset_from_tree(self):
+        self._order = list(self.tree.get_children(self.parent))
+        # значення невідомі — при наступному порівнянні рядки буде оновлено
+        self._shown = {iid: None for iid in self._order}
+
+
+def _lis_keys(seq, pos) -> set:
+    """Множина елементів seq, що утворюють найдовшу зростаючу за pos підпослідовність."""
+    tails, tails_idx = [], []
+    parent = [None] * len(seq)
+    for i, key in enumerate(seq):
+        p = pos[key]
+        j = bisect.bisect_left(tails, p)
+        if j == len(tails):
+            tails.append(p); tails_idx.append(i)
+        else:
+            tails[j] = p; tails_idx[j] = i
+        parent[i] = tails_idx[j - 1] if j > 0 else None
+    out = set()
+    i = tails_idx[-1] if tails_idx else None
+    while i is not None:
+        out.add(seq[i])
+        i = parent[i]
+    return out
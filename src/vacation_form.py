@@ -70,6 +70,9 @@ class VacationForm(ctk.CTkToplevel):
         self.work_to   = ctk.CTkEntry(row_wp, placeholder_text='… по (YYYY-MM-DD)',             width=220); self.work_to.pack(side="left")
         self.work_from.configure(state="disabled")
         self.work_to.configure(state="disabled")
+        # залишок щорічної основної за цей робочий рік (з leave_balances)
+        self.balance_lbl = ctk.CTkLabel(row_wp, text="", text_color="#888")
+        self.balance_lbl.pack(side="left", padx=(16,0))
 
 
         row_vp = ctk.CTkFrame(root); row_vp.pack(fill="x", pady=4)
@@ -112,39 +115,9 @@ class VacationForm(ctk.CTkToplevel):
                 return _id
         return None
 
-    def _safe_anniversary(self, base: date, year: int) -> date:
-        """Річниця з урахуванням 29 лютого (переносимо на 28.02, якщо треба)."""
-        try:
-            return date(year, base.month, base.day)
-        except ValueError:
-            # якщо 29 лютого у невисокосний рік
-            return date(year, 2, 28)
-
     def _compute_work_year(self, hire_iso: str | None, anchor: date) -> tuple[str, str]:
-        """
-        Рахує робочий рік:
-        - якщо hire_date є: [річниця в рік anchor; річниця+1 рік - 1 день]
-        - якщо hire_date немає: календарний рік anchor
-        Повертає два ISO-рядки YYYY-MM-DD.
-        """
-        if hire_iso:
-            try:
-                y, m, d = map(int, hire_iso.split("-"))
-                hd = date(y, m, d)
-                start = self._safe_anniversary(hd, anchor.year)
-                if anchor < start:
-                    start = self._safe_anniversary(hd, anchor.year - 1)
-                # кінець = рік потому мінус 1 день
-                from datetime import timedelta
-                end = self._safe_anniversary(hd, start.year + 1) - timedelta(days=1)
-                return (start.isoformat(), end.isoformat())
-            except Exception:
-                pass  # впадемо у календарний рік
-
-        # fallback: календарний рік
-        start = date(anchor.year, 1, 1)
-        end   = date(anchor.year, 12, 31)
-        return (start.isoformat(), end.isoformat())
+        """Робочий рік (від річниці прийняття; без hire_date — календарний). Два ISO-рядки."""
+        return db.leave_work_year(hire_iso, anchor)
 
     def _set_ro_entry(self, entry: ctk.CTkEntry, text: str):
         """Акуратно записуємо в disabled-entry: тимчасово вмикаємо -> вставляємо -> знову вимикаємо."""
@@ -186,6 +159,14 @@ class VacationForm(ctk.CTkToplevel):
         self._set_ro_entry(self.work_from, w_from)
         self._set_ro_entry(self.work_to,   w_to)
 
+        try:
+            b = db.get_leave_balance(emp_id, anch)
+            self.balance_lbl.configure(
+                text=f"Залишок щорічної основної: {b['remaining']} з {b['accrued']} дн. (використано {b['used']})")
+        except Exception as e:
+            print("Баланс відпустки:", e)
+            self.balance_lbl.configure(text="")
+
     def _recalc_total_days(self):
         """Автоматично рахує 'К-сть календарних днів' = (end - start + 1), якщо обидві дати валідні."""
         try:
@@ -224,42 +205,16 @@ class VacationForm(ctk.CTkToplevel):
 
 
 
-    # --- Налаштування політики (за потреби поміняй 24 на 30) ---
-    MAX_ANNUAL_DAYS = 24
+    # --- Налаштування політики: db.ANNUAL_LEAVE_DAYS (за потреби поміняй 24 на 30) ---
+    MAX_ANNUAL_DAYS = db.ANNUAL_LEAVE_DAYS
 
     def _find_overlapping_signed_vacations(self, emp_id, start_date, end_date):
         """
         Повертає список перетинів підписаних відпусток для employee_id з інтервалом [start_date; end_date] (включно).
         Кожен елемент: (doc_id, start_iso, end_iso, days)
         """
-        rows = db.fetch_all("""
-            SELECT id, context_json
-            FROM documents
-            WHERE employee_id = ?
-              AND type = 'VACATION'
-              AND status = 'signed'
-        """, (emp_id,))
-
-        overlaps = []
-        from datetime import datetime
-        for r in rows or []:
-            try:
-                import json
-                ctx = json.loads(r.get("context_json") or "{}")
-                vac = (ctx.get("vacation") or {})
-                s = vac.get("start_date")
-                e = vac.get("end_date")
-                if not s or not e:
-                    continue
-                s_d = datetime.strptime(s, "%Y-%m-%d").date()
-                e_d = datetime.strptime(e, "%Y-%m-%d").date()
-                # інтервали перетинаються, якщо max(start) <= min(end)
-                if max(start_date, s_d) <= min(end_date, e_d):
-                    days = (e_d - s_d).days + 1
-                    overlaps.append((r.get("id"), s, e, days))
-            except Exception:
-                continue
-        return overlaps
+        rows = db.find_vacation_overlaps(emp_id, start_date, end_date)
+        return [(r["doc_id"], r["start_date"], r["end_date"], r["days"]) for r in rows]
 
 
     def _submit(self):
@@ -322,17 +277,24 @@ class VacationForm(ctk.CTkToplevel):
             )
             return
 
-        # 2) Попередження про ліміт для «щорічна основна»
+        # 2) Попередження про ліміт для «щорічна основна» — за залишком робочого року
         vac_type = (self.vac_type_var.get() or "").strip().lower()
-        if vac_type == "щорічна основна" and days_count > self.MAX_ANNUAL_DAYS:
-            from tkinter import messagebox as mb
-            if not mb.askyesno(
-                "Попередження",
-                f"Тривалість {days_count} дн. перевищує типові {self.MAX_ANNUAL_DAYS} днів для щорічної основної.\n"
-                "Продовжити оформлення?",
-                parent=self
-            ):
-                return
+        if vac_type == db.ANNUAL_LEAVE_TYPE:
+            try:
+                balance = db.get_leave_balance(emp_id, d1)
+                remaining, accrued = balance["remaining"], balance["accrued"]
+            except Exception:
+                remaining = accrued = self.MAX_ANNUAL_DAYS
+            if days_count > remaining:
+                from tkinter import messagebox as mb
+                if not mb.askyesno(
+                    "Попередження",
+                    f"Тривалість {days_count} дн. перевищує залишок {remaining} з {accrued} днів "
+                    f"щорічної основної за робочий рік.\n"
+                    "Продовжити оформлення?",
+                    parent=self
+                ):
+                    return
 
 
 
@@ -0,0 +1,210 @@
+# src/virtual_table.py
+"""
+Віртуалізована таблиця поверх ttk.Treeview.
+
+Усі рядки живуть у компактному списку кортежів (key, values[, tags]), а в
+Treeview матеріалізується лише видиме вікно + невеликий запас знизу
+(overscan). Прокрутка (смуга, коліщатко, клавіші) лише зсуває вікно —
+TableBinding робить O(зсуву) вставок/видалень, тож вартість не залежить
+від загальної кількості рядків.
+
+Виділення зберігається за ключами і переживає прокрутку; double-click,
+заголовки колонок тощо налаштовуються на самому tree як і раніше.
+
+    self.table = VirtualTable(self.tree, self.tree_scroll_y)
+    self.table.set_rows((r["id"], (r["name"], ...)) for r in rows)
+    keys = self.table.selection()
+
+on_need_more — колбек, який викликається, коли вікно наближається до кінця
+завантажених рядків (для підвантаження наступної сторінки з БД).
+"""
+from tkinter import ttk
+
+from tree_sync import TableBinding
+
+OVERSCAN = 10           # рядків, матеріалізованих нижче видимої області
+PREFETCH_ROWS = 50      # за скільки рядків до кінця просити наступну сторінку
+
+
+class VirtualTable:
+    def __init__(self, tree, yscroll=None, overscan: int = OVERSCAN, on_need_more=None):
+        self.tree = tree
+        self.yscroll = yscroll
+        self.overscan = overscan
+        self.on_need_more = on_need_more
+        self.has_more = False        # чи є ще рядки у джерелі (встановлює власник)
+
+        self._binding = TableBinding(tree)
+        self._rows = []              # [(iid, values, tags), ...]
+        self._index = {}             # iid -> позиція у _rows
+        self._top = 0
+        self._visible = int(tree.cget("height") or 20)
+        self._selected = set()
+        self._window_keys = set()
+        self._rendering = False
+        self._requesting = False
+
+        tree.configure(yscrollcommand=self._on_tree_yscroll)
+        if yscroll is not None:
+            yscroll.configure(command=self._on_scrollbar)
+        tree.bind("<Configure>", self._on_configure, add="+")
+        tree.bind("<<TreeviewSelect>>", self._on_select, add="+")
+        tree.bind("<MouseWheel>", self._on_wheel)                               # Windows / macOS
+        tree.bind("<Button-4>", lambda e: self._scroll_by(-3) or "break")       # Linux
+        tree.bind("<Button-5>", lambda e: self._scroll_by(3) or "break")
+        tree.bind("<Up>", self._on_key_up)
+        tree.bind("<Prior>", lambda e: self._scroll_by(-self._visible) or "break")
+        tree.bind("<Next>", lambda e: self._scroll_by(self._visible) or "break")
+        tree.bind("<Home>", lambda e: self.scroll_to(0) or "break")
+        tree.bind("<End>", lambda e: self.scroll_to(len(self._rows)) or "break")
+
+    # ---------- дані ----------
+    def set_rows(self, rows, keep_position: bool = True):
+        """Замінює всі рядки; rows — (key, values) або (key, values, tags)."""
+        self._rows = [self._norm(r) for r in rows]
+        self._reindex()
+        if not keep_position:
+            self._top = 0
+        self._render()
+
+    def append_rows(self, rows):
+        """Додає рядки в кінець (наступна сторінка з БД)."""
+        start = len(self._rows)
+        for r in rows:
+            row = self._norm(r)
+            if row[0] in self._index:
+                continue
+            self._index[row[0]] = len(self._rows)
+            self._rows.append(row)
+        if len(self._rows) != start:
+            self._render()
+
+    def update_row(self, key, values, tags=()):
+        """Оновлює один рядок на місці (без повного set_rows)."""
+        iid = str(key)
+        pos = self._index.get(iid)
+        if pos is None:
+            return False
+        self._rows[pos] = (iid, tuple(values), tuple(tags or ()))
+        if iid in self._window_keys:
+            self._render()
+        return True
+
+    def __len__(self):
+        return len(self._rows)
+
+    def keys(self):
+        return [r[0] for r in self._rows]
+
+    def selection(self) -> tuple:
+        """Виділені ключі (у т.ч. ті, що зараз прокручені за межі вікна)."""
+        return tuple(r[0] for r in self._rows if r[0] in self._selected)
+
+    def clear_selection(self):
+        self._selected.clear()
+        self._render()
+
+    # ---------- прокрутка ----------
+    def scroll_to(self, index: int):
+        self._top = index
+        self._render()
+
+    def _scroll_by(self, delta: int):
+        if delta:
+            self.scroll_to(self._top + delta)
+
+    def _on_scrollbar(self, *args):
+        n = len(self._rows)
+        if not args or not n:
+            return
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * n))
+        elif args[0] == "scroll":
+            step = int(float(args[1]))
+            if len(args) > 2 and args[2] == "pages":
+                step *= self._visible
+            self._scroll_by(step)
+
+    def _on_wheel(self, event):
+        self._scroll_by(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def _on_key_up(self, event):
+        # стрілка вгору з першого видимого рядка — зсуваємо вікно
+        children = self.tree.get_children()
+        if children and self.tree.focus() == children[0] and self._top > 0:
+            self._scroll_by(-1)
+            key = self._rows[self._top][0]
+            self.tree.focus(key)
+            self.tree.selection_set((key,))
+            return "break"
+        return None
+
+    def _on_tree_yscroll(self, first, last):
+        # Treeview сам прокрутився (напр. стрілкою вниз в overscan) — переносимо зсув у вікно
+        if self._rendering:
+            return
+        first = float(first)
+        shown = len(self._window_keys)
+        if first > 0 and shown:
+            self._scroll_by(max(1, round(first * shown)))
+
+    def _on_configure(self, event):
+        rowheight = 20
+        try:
+            rowheight = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        except (ValueError, TypeError):
+            pass
+        visible = max(1, event.height // rowheight - 1)   # мінус рядок заголовків
+        if visible != self._visible:
+            self._visible = visible
+            self._render()
+
+    def _on_select(self, event=None):
+        if self._rendering:
+            return
+        current = set(self.tree.selection())
+        if current == self._selected & self._window_keys:
+            return   # подія від нашого ж рендеру — виділення за межами вікна не чіпаємо
+        self._selected = current
+
+    # ---------- рендер вікна ----------
+    def _render(self):
+        n = len(self._rows)
+        self._top = max(0, min(self._top, n - self._visible))
+        window = self._rows[self._top:self._top + self._visible + self.overscan]
+
+        self._rendering = True
+        try:
+            self._binding.sync(window)
+            self._window_keys = {r[0] for r in window}
+            self.tree.yview_moveto(0)
+            sel = [r[0] for r in window if r[0] in self._selected]
+            if tuple(self.tree.selection()) != tuple(sel):
+                self.tree.selection_set(sel)
+        finally:
+            self._rendering = False
+
+        if self.yscroll is not None:
+            if n:
+                self.yscroll.set(self._top / n, min(1.0, (self._top + self._visible) / n))
+            else:
+                self.yscroll.set(0.0, 1.0)
+
+        if (self.on_need_more and self.has_more and not self._requesting
+                and self._top + self._visible + PREFETCH_ROWS >= n):
+            self._requesting = True
+            try:
+                self.on_need_more()
+            finally:
+                self._requesting = False
+
+    # ---------- службове ----------
+    @staticmethod
+    def _norm(row):
+        tags = tuple(row[2]) if len(row) > 2 and row[2] else ()
+        return (str(row[0]), tuple(row[1]), tags)
+
+    def _reindex(self):
+        self._index = {r[0]: i for i, r in enumerate(self._rows)}
+        self._selected &= set(self._index)